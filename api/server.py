@@ -1,10 +1,14 @@
 from __future__ import annotations
-import os, json
+import os, json, logging, asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import date
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 import sys
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 # --- project path + env ---
@@ -14,19 +18,105 @@ from dotenv import load_dotenv
 load_dotenv(ROOT / ".env")
 
 # --- project imports ---
-from rag.embedder import Embedder
-from rag.vector_store import get_client, get_or_create_collection
-from rag.clinical_extractor import extract_patient_summary
+from rag.embedder import get_embedder
+from rag.vector_store import get_client, get_or_create_collection, retrieve, retrieve_many
+from rag.retrieval_cache import RetrievalCache
+from rag.policy_metadata import NO_CANDIDATES, PolicyFilterIndex
+from rag.lexical_index import load_lexical_index
+from rag.clinical_extractor import extract_patient_summary, extract_patient_summaries, extraction_stats
+from rag.llm_client import LLMUnavailableError
+from app.compact import record_to_dict, to_record
 from app.validators import validate_and_normalize
-from app.eligibility import evaluate_icgm
+from app.eligibility import evaluate_eligibility
+from app.rule_engine import default_rule_engine
 from app.justification import build_justification_letter
+from app.batch import BatchAssessor, DEFAULT_QUESTION, DEFAULT_SERVICE, citation_dicts
 
-app = FastAPI(title="PA Assistant API", version="0.1.0")
+log = logging.getLogger("pa.api")
+
+# Per-stage budgets for the async /assess pipeline (seconds)
+EXTRACT_TIMEOUT_S = float(os.getenv("EXTRACT_TIMEOUT_S", "45"))
+RETRIEVE_TIMEOUT_S = float(os.getenv("RETRIEVE_TIMEOUT_S", "15"))
+# Upper bound on per-stage workers a /assess/batch caller may ask for
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "8"))
+
+# ---------- Shared resources ----------
+class PolicyResources:
+    """
+    Chroma client/collection and embedder, built once at startup and shared by
+    every request. Blocking SDK calls (Gemini, Chroma) run on `executor`, a
+    bounded pool sized by PA_IO_WORKERS; the embedder (and its cache) is
+    thread-safe, and Chroma's collection handles concurrent reads.
+    """
+    def __init__(self):
+        self.client = get_client()
+        self.embedder = get_embedder()  # EMBED_BACKEND: gemini (default) | local
+        self.collection = get_or_create_collection(self.client, name="policies", embedder=self.embedder)
+        self.retrieval_cache = RetrievalCache()
+        self.policy_filters = PolicyFilterIndex()  # per-service / per-payer candidate sources
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("PA_IO_WORKERS", "16")), thread_name_prefix="pa-io"
+        )
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def warmup(self) -> None:
+        """Embed the default question and run one query so the HNSW index is loaded before traffic."""
+        if self.collection.count() == 0:
+            log.warning("Policy collection is empty; run scripts/index_policies.py")
+            return
+        try:
+            # Also primes the retrieval cache for the /assess default question
+            _retrieve_policy(self, DEFAULT_QUESTION, top_k=5, filters={"service": DEFAULT_SERVICE})
+        except Exception as e:  # keep serving; the first real request will surface the error
+            log.warning("Warmup query failed: %s", e)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # A missing API key or unreachable store must not take /health down with it:
+    # start degraded, and answer 503 on the routes that need the resources
+    app.state.startup_error = None
+    try:
+        resources = PolicyResources()
+    except Exception as e:
+        log.error("Policy resources unavailable: %s", e)
+        resources = None
+        app.state.startup_error = f"{type(e).__name__}: {e}"
+    else:
+        resources.warmup()
+    app.state.resources = resources
+    yield
+    if resources is not None:
+        resources.close()
+
+def get_resources(request: Request) -> PolicyResources:
+    resources = request.app.state.resources
+    if resources is None:
+        raise HTTPException(status_code=503, detail=f"Policy resources unavailable: {request.app.state.startup_error}")
+    return resources
+
+app = FastAPI(title="PA Assistant API", version="0.1.0", lifespan=lifespan)
 
 # ---------- Pydantic IO models ----------
-class AssessRequest(BaseModel):
+class PolicyFilters(BaseModel):
+    """
+    Narrow policy retrieval. Unknown service / payer values are rejected with
+    400; known values that no indexed policy is tagged with are ignored.
+    """
+    payer: Optional[str] = Field(default=None, description="e.g. Medicare, Aetna.")
+    service: Optional[str] = Field(default=None, description="Service key from rag.policy_metadata.SERVICES, e.g. I-CGM.")
+    policy_id: Optional[str] = None
+    date_of_service: Optional[date] = Field(default=None, description="YYYY-MM-DD; selects the policy version in effect.")
+
+    def filters(self) -> Dict[str, Any]:
+        return {"service": self.service, "payer": self.payer, "policy_id": self.policy_id,
+                "effective_on": self.date_of_service}
+
+class AssessRequest(PolicyFilters):
     note_text: Optional[str] = Field(default=None, description="Full clinical note text.")
     summary_json: Optional[Dict[str, Any]] = Field(default=None, description="Provide pre-extracted patient summary instead of raw note.")
+    service: Optional[str] = DEFAULT_SERVICE
 
 class Citation(BaseModel):
     source: str
@@ -44,54 +134,100 @@ class AssessResponse(BaseModel):
     justification_letter: str
 
 # ---------- Helpers ----------
-def _retrieve_policy(question: str, top_k: int = 5) -> List[Dict[str, Any]]:
-    client = get_client()
-    col = get_or_create_collection(client, name="policies")
-    embedder = Embedder()  # Gemini embeddings (text-embedding-004)
-    q_emb = embedder.embed_texts([question])
-    res = col.query(query_embeddings=q_emb, n_results=top_k)
-
-    out: List[Dict[str, Any]] = []
-    for i in range(len(res["ids"][0])):
-        out.append({
-            "id": res["ids"][0][i],
-            "document": res["documents"][0][i],
-            "metadata": res["metadatas"][0][i],
-        })
-    return out
+def _policy_filters(resources: PolicyResources, req: PolicyFilters) -> Dict[str, Any]:
+    """The request's retrieval filters; 400 when a service or payer is unknown."""
+    filters = req.filters()
+    errors = resources.policy_filters.unknown_filters(**filters)
+    if errors:
+        raise HTTPException(status_code=400, detail="; ".join(errors))
+    return filters
+
+def _policy_where(resources: PolicyResources, filters: Optional[Dict[str, Any]]):
+    """Filters → where clause over the precomputed candidate sources (pushed down into the vector query)."""
+    return resources.policy_filters.where(**filters) if filters else None
+
+def _retrieve_policy(resources: PolicyResources, question: str, top_k: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    where = _policy_where(resources, filters)
+    if where is NO_CANDIDATES:
+        return []
+    return retrieve(resources.collection, resources.embedder, question, top_k, where=where,
+                    cache=resources.retrieval_cache, lexical=load_lexical_index())
+
+def _retrieve_policies(resources: PolicyResources, questions: List[str], top_k: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+    where = _policy_where(resources, filters)
+    if where is NO_CANDIDATES:
+        return [[] for _ in questions]
+    return retrieve_many(resources.collection, resources.embedder, questions, top_k, where=where,
+                         cache=resources.retrieval_cache, lexical=load_lexical_index())
 
 def _format_citations(hits: List[Dict[str, Any]]) -> List[Citation]:
-    cits: List[Citation] = []
-    for h in hits:
-        meta = h.get("metadata", {})
-        src = meta.get("source", "?")
-        pg = meta.get("page", 0)  # 0-indexed
-        excerpt = (h.get("document","")[:300].replace("\n"," ") + "…") if h.get("document") else ""
-        cits.append(Citation(source=src, page=int(pg) + 1, excerpt=excerpt))
-    return cits
+    return [Citation(**c) for c in citation_dicts(hits)]
+
+def _eligibility_service(service: Optional[str]) -> str:
+    """Service whose eligibility rules apply; 400 for one without rules in app/rules."""
+    service = service or DEFAULT_SERVICE
+    if service not in default_rule_engine().plans:
+        raise HTTPException(status_code=400, detail=f"No eligibility rules for service '{service}' "
+                                                    f"(known: {', '.join(default_rule_engine().services)})")
+    return service
+
+async def _run_stage(resources: PolicyResources, stage: str, timeout: float, fn, *args):
+    """
+    Run a blocking call on the shared I/O pool, failing the request with 504
+    after `timeout` and with 503 when the LLM client gives up.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(resources.executor, fn, *args), timeout)
+    except asyncio.TimeoutError:
+        # The worker thread cannot be interrupted; it finishes in the background
+        raise HTTPException(status_code=504, detail=f"{stage} stage timed out after {timeout:g}s")
+    except LLMUnavailableError as e:
+        # Backpressure: the model is rate limited or failing but not yet written off by the breaker
+        raise HTTPException(status_code=503, detail=f"{stage} stage: {e}", headers={"Retry-After": "30"})
 
 # ---------- Routes ----------
 @app.get("/health")
-def health():
-    return {"ok": True}
+def health(request: Request):
+    error = getattr(request.app.state, "startup_error", None)
+    if error:
+        return {"ok": False, "status": "degraded", "error": error}
+    return {"ok": True, "status": "ok"}
+
+@app.get("/metrics")
+def metrics(resources: PolicyResources = Depends(get_resources)):
+    emb_cache = resources.embedder.cache
+    lex = load_lexical_index()
+    return {
+        "retrieval_cache": resources.retrieval_cache.stats(),
+        "embedding_cache": emb_cache.stats() if emb_cache else None,
+        "policy_filters": resources.policy_filters.stats(),
+        "lexical_index": lex.stats() if lex else None,
+        "extraction_cache": extraction_stats(),
+    }
 
 @app.post("/assess", response_model=AssessResponse)
-def assess(req: AssessRequest):
-    # 1) Get the patient summary (either provided or extracted)
+async def assess(req: AssessRequest, resources: PolicyResources = Depends(get_resources)):
+    if not req.summary_json and not req.note_text:
+        raise HTTPException(status_code=400, detail="Provide either note_text or summary_json")
+    service = _eligibility_service(req.service)
+    filters = _policy_filters(resources, req)
+
+    # 1+2) Extraction (LLM) and policy retrieval (embedding + vector query) are
+    # independent, so run them concurrently on the I/O pool
+    retrieval = _run_stage(resources, "retrieval", RETRIEVE_TIMEOUT_S, _retrieve_policy, resources, DEFAULT_QUESTION, 5, filters)
     if req.summary_json:
         raw_summary = req.summary_json
+        hits = await retrieval
     else:
-        if not req.note_text:
-            return {"detail": "Provide either note_text or summary_json"}  # FastAPI will 500 if we don't return right shape; raise instead:
-        raw_summary = extract_patient_summary(req.note_text)
-
-    summary, _errors = validate_and_normalize(raw_summary)
+        extraction = _run_stage(resources, "extraction", EXTRACT_TIMEOUT_S, extract_patient_summary, req.note_text)
+        raw_summary, hits = await asyncio.gather(extraction, retrieval)
 
-    # 2) Retrieve relevant policy chunks
-    hits = _retrieve_policy("I-CGM coverage medical necessity criteria and documentation requirements", top_k=5)
+    # Compact record through validation, rules and letter; dict only for the response
+    summary, _errors = validate_and_normalize(to_record(raw_summary))
 
     # 3) Evaluate eligibility
-    meets, missing = evaluate_icgm(summary)
+    meets, missing = evaluate_eligibility(summary, service)
 
     # 4) Build letter
     letter = build_justification_letter(summary, meets, missing, hits)
@@ -101,20 +237,69 @@ def assess(req: AssessRequest):
     citations = _format_citations(hits)
 
     return AssessResponse(
-        summary=summary,
+        summary=record_to_dict(summary),
         decision=decision,
         citations=citations,
         justification_letter=letter
     )
 
+# Batch assessment: streams one JSON line per case, then a stats line
+class BatchCase(BaseModel):
+    case_id: Optional[str] = None
+    question: Optional[str] = None  # overrides the request-level question for this case
+    note_text: Optional[str] = None
+    summary_json: Optional[Dict[str, Any]] = None
+
+class BatchAssessRequest(PolicyFilters):
+    cases: List[BatchCase]
+    service: Optional[str] = DEFAULT_SERVICE
+    question: str = DEFAULT_QUESTION
+    extract_workers: int = Field(default=4, ge=1)
+    assess_workers: int = Field(default=2, ge=1)
+    pack_notes: bool = True  # several notes per LLM request
+
+@app.post("/assess/batch")
+def assess_batch(req: BatchAssessRequest, resources: PolicyResources = Depends(get_resources)):
+    extract_workers = min(req.extract_workers, BATCH_MAX_WORKERS)
+    service = _eligibility_service(req.service)
+    filters = _policy_filters(resources, req)
+    runner = BatchAssessor(
+        lambda q, k: _retrieve_policy(resources, q, k, filters),
+        retrieve_many=lambda qs, k: _retrieve_policies(resources, qs, k, filters),
+        question=req.question,
+        service=service,
+        extract_many=(lambda notes: extract_patient_summaries(notes, workers=extract_workers, return_exceptions=True))
+        if req.pack_notes else None,
+        extract_workers=extract_workers,
+        assess_workers=min(req.assess_workers, BATCH_MAX_WORKERS),
+    )
+    cases = (
+        {**c.model_dump(), "case_id": c.case_id or str(i)}
+        for i, c in enumerate(req.cases, start=1)
+    )
+
+    def lines():
+        results = runner.run(cases)
+        try:
+            for res in results:
+                yield json.dumps(res) + "\n"
+            yield json.dumps({"stats": runner.stage_report(), "wall_s": round(runner.wall_s, 3)}) + "\n"
+        finally:
+            # On client disconnect the response stops iterating; close the
+            # runner so its pipeline threads stop instead of blocking on full queues
+            results.close()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 # Optional: simple policy query endpoint
-class QueryReq(BaseModel):
+class QueryReq(PolicyFilters):
     question: str
 
 class QueryResp(BaseModel):
     citations: List[Citation]
 
 @app.post("/query-policies", response_model=QueryResp)
-def query_policies(req: QueryReq):
-    hits = _retrieve_policy(req.question, top_k=5)
+async def query_policies(req: QueryReq, resources: PolicyResources = Depends(get_resources)):
+    filters = _policy_filters(resources, req)
+    hits = await _run_stage(resources, "retrieval", RETRIEVE_TIMEOUT_S, _retrieve_policy, resources, req.question, 5, filters)
     return QueryResp(citations=_format_citations(hits))
@@ -0,0 +1,224 @@
+from __future__ import annotations
+import json, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from rag.pipeline import Stage, StageFailure, StageStats, batched, run_pipeline
+from rag.llm_client import LLMUnavailableError
+from app.compact import record_to_dict, to_record
+from app.validators import validate_and_normalize
+from app.eligibility import evaluate_eligibility
+from app.justification import build_justification_letter
+
+DEFAULT_SERVICE = "I-CGM"
+DEFAULT_QUESTION = f"{DEFAULT_SERVICE} coverage medical necessity criteria and documentation requirements"
+
+# ---------- Case sources ----------
+def iter_cases_from_dir(input_dir: str | Path, pattern: str = "*.txt") -> Iterator[Dict[str, Any]]:
+    """One case per note file; case_id is the file stem."""
+    for p in sorted(Path(input_dir).glob(pattern)):
+        yield {"case_id": p.stem, "note_text": p.read_text()}
+
+def iter_cases_from_jsonl(path: str | Path) -> Iterator[Dict[str, Any]]:
+    """
+    One case per line: {"case_id": ..., "note_text": ...} or {"case_id": ..., "summary_json": {...}}.
+    Missing case_ids default to the line number. A line that is not a JSON
+    object becomes a case whose result is an "input" failure.
+    """
+    with open(path) as f:
+        for n, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                case = json.loads(line)
+                if not isinstance(case, dict):
+                    raise ValueError(f"expected a JSON object, got {type(case).__name__}")
+            except ValueError as e:  # JSONDecodeError too; report this line and keep reading
+                yield {"case_id": str(n), "_input_error": f"{type(e).__name__}: line {n}: {e}"}
+                continue
+            case.setdefault("case_id", str(n))
+            yield case
+
+def citation_dicts(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    out = []
+    for h in hits:
+        meta = h.get("metadata", {})
+        excerpt = (h.get("document","")[:300].replace("\n"," ") + "…") if h.get("document") else ""
+        out.append({"source": meta.get("source", "?"), "page": int(meta.get("page", 0)) + 1, "excerpt": excerpt})
+    return out
+
+# ---------- Batch runner ----------
+class BatchAssessor:
+    """
+    Streams cases through extract → retrieve → assess (validate, eligibility,
+    letter), each stage with its own worker count. A failing case is reported
+    as {"ok": false, "stage": ..., "error": ...} and does not stop the batch.
+
+    `retrieve(question, top_k)` returns policy hits; results are memoized per
+    question for the lifetime of the assessor, since a batch usually asks the
+    same one. With `retrieve_many(questions, top_k)`, the distinct questions
+    of every `prefetch_size` incoming cases are resolved in one batched call
+    before those cases enter the pipeline. Likewise `extract_many(notes)`
+    (e.g. rag.clinical_extractor.extract_patient_summaries) extracts the
+    notes of each window in packed requests, up to `pack_windows` windows at
+    a time in the background; the extract stage waits for its case's pack,
+    and cases it could not handle fall through to per-case `extract`. When
+    the pack failed because the model is unavailable (LLMUnavailableError),
+    its cases fail instead of each retrying against the exhausted quota.
+    """
+    def __init__(
+        self,
+        retrieve: Optional[Callable[[str, int], List[Dict[str, Any]]]] = None,
+        *,
+        retrieve_many: Optional[Callable[[List[str], int], List[List[Dict[str, Any]]]]] = None,
+        prefetch_size: int = 64,
+        extract: Optional[Callable[[str], Dict[str, Any]]] = None,
+        extract_many: Optional[Callable[[List[str]], List[Any]]] = None,
+        pack_windows: int = 2,
+        question: str = DEFAULT_QUESTION,
+        service: str = DEFAULT_SERVICE,
+        top_k: int = 5,
+        extract_workers: int = 4,
+        retrieve_workers: int = 1,
+        assess_workers: int = 2,
+        queue_size: int = 64,
+    ):
+        if extract is None:
+            from rag.clinical_extractor import extract_patient_summary as extract
+        if retrieve is None:
+            if retrieve_many is None:
+                raise ValueError("Provide retrieve and/or retrieve_many")
+            retrieve = lambda q, k: retrieve_many([q], k)[0]
+        self.retrieve = retrieve
+        self.retrieve_many = retrieve_many
+        self.prefetch_size = max(1, prefetch_size)
+        self.extract = extract
+        self.extract_many = extract_many
+        self.pack_windows = max(1, pack_windows)
+        self.question = question
+        self.service = service  # whose eligibility rules (app/rules) decide each case
+        self.top_k = top_k
+        self.stages = [
+            Stage("extract", self._extract_stage, extract_workers),
+            Stage("retrieve", self._retrieve_stage, retrieve_workers),
+            Stage("assess", self._assess_stage, assess_workers),
+        ]
+        self.queue_size = queue_size
+        self.stats: Dict[str, StageStats] = {}
+        self.wall_s = 0.0
+        self._hits: Dict[tuple, List[Dict[str, Any]]] = {}
+
+    # --- stages: each takes and returns the case dict ---
+    # Past extraction a case carries its summary as a compact SummaryRecord
+    # (app/compact.py) instead of the note / summary dict, so the cases queued
+    # between stages stay small; the output dict is built in _assess_stage.
+    def _extract_stage(self, case: Dict[str, Any]) -> Dict[str, Any]:
+        if "_input_error" in case:
+            raise ValueError(case["_input_error"])
+        if case.get("summary_json"):
+            case["_summary"] = to_record(case.pop("summary_json"))
+        elif case.get("note_text"):
+            summary = self._packed_summary(case.pop("_packed", None))
+            case["_summary"] = to_record(summary if summary is not None else self.extract(case["note_text"]))
+        else:
+            raise ValueError("Provide either note_text or summary_json")
+        case.pop("note_text", None)
+        return case
+
+    def _retrieve_stage(self, case: Dict[str, Any]) -> Dict[str, Any]:
+        key = (case.get("question") or self.question, self.top_k)
+        hits = self._hits.get(key)
+        if hits is None:
+            hits = self._hits[key] = self.retrieve(*key)
+        case["_hits"] = hits
+        return case
+
+    def _assess_stage(self, case: Dict[str, Any]) -> Dict[str, Any]:
+        summary, errors = validate_and_normalize(case["_summary"])
+        meets, missing = evaluate_eligibility(summary, self.service)
+        hits = case["_hits"]
+        return {
+            "case_id": case.get("case_id"),
+            "ok": True,
+            "summary": record_to_dict(summary),
+            "validation_errors": errors,
+            "decision": {"meets_criteria": meets, "missing_information": missing},
+            "citations": citation_dicts(hits),
+            "justification_letter": build_justification_letter(summary, meets, missing, hits),
+        }
+
+    def _prefetch(self, cases: Iterable[Dict[str, Any]], packer: Optional[ThreadPoolExecutor]) -> Iterator[Dict[str, Any]]:
+        for window in batched(cases, self.prefetch_size):
+            if packer is not None:
+                self._dispatch_window(window, packer)
+            if self.retrieve_many is None:
+                yield from window
+                continue
+            todo = [q for q in dict.fromkeys(c.get("question") or self.question for c in window)
+                    if (q, self.top_k) not in self._hits]
+            if todo:
+                try:
+                    for q, hits in zip(todo, self.retrieve_many(todo, self.top_k)):
+                        self._hits[(q, self.top_k)] = hits
+                except Exception:
+                    pass  # the retrieve stage retries per case and reports the error there
+            yield from window
+
+    def _dispatch_window(self, window: List[Dict[str, Any]], packer: ThreadPoolExecutor) -> None:
+        """Start packed extraction of the window's notes; each case carries (future, position) to the extract stage."""
+        todo = [c for c in window if not c.get("summary_json") and c.get("note_text")]
+        if not todo:
+            return
+        future = packer.submit(self.extract_many, [c["note_text"] for c in todo])
+        for i, case in enumerate(todo):
+            case["_packed"] = (future, i)
+
+    @staticmethod
+    def _packed_summary(packed) -> Optional[Dict[str, Any]]:
+        if packed is None:
+            return None
+        future, i = packed
+        try:
+            summary = future.result()[i]
+        except LLMUnavailableError:
+            raise
+        except Exception:
+            return None  # the extract stage retries per case and reports the error there
+        if isinstance(summary, LLMUnavailableError):
+            raise summary
+        return None if isinstance(summary, Exception) else summary
+
+    def run(self, cases: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Yield one result dict per case, in completion order. Closing the generator early cancels the rest."""
+        self.stats = {}
+        packer = (ThreadPoolExecutor(max_workers=self.pack_windows, thread_name_prefix="batch-pack")
+                  if self.extract_many is not None else None)
+        if self.retrieve_many is not None or packer is not None:
+            cases = self._prefetch(cases, packer)
+        t0 = time.perf_counter()
+        results = run_pipeline(cases, self.stages, queue_size=self.queue_size, stats=self.stats)
+        try:
+            for out in results:
+                if isinstance(out, StageFailure):
+                    case = out.item if isinstance(out.item, dict) else {}
+                    if "_input_error" in case:
+                        yield {"case_id": case.get("case_id"), "ok": False, "stage": "input", "error": case["_input_error"]}
+                        continue
+                    yield {
+                        "case_id": case.get("case_id"),
+                        "ok": False,
+                        "stage": out.stage,
+                        "error": f"{type(out.error).__name__}: {out.error}",
+                    }
+                else:
+                    yield out
+        finally:
+            results.close()  # stops the pipeline threads when our caller stops early
+            if packer is not None:
+                packer.shutdown(wait=False, cancel_futures=True)
+            self.wall_s = time.perf_counter() - t0
+
+    def stage_report(self) -> List[Dict[str, Any]]:
+        return [self.stats[s.name].as_dict(self.wall_s) for s in self.stages if s.name in self.stats]
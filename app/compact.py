@@ -0,0 +1,121 @@
+from __future__ import annotations
+import sys
+from typing import Any, Dict, NamedTuple, Optional, Tuple, Union
+
+from app.schemas import PatientSummary
+
+# Compact internal form of a PatientSummary for the assess path: immutable
+# tuples instead of nested dicts, with code-like strings (ICD codes, lab
+# names, units, statuses) interned so a batch holds one copy of each. Stages
+# share records instead of copying them; dicts / the Pydantic model are only
+# built at the edges (API response, batch output).
+#
+# Each record has a dict-style get(), so code written against summary dicts
+# (the justification letter, rule facts) reads records unchanged. Keys
+# outside the schema ride along in `extra` as (key, value) pairs and come
+# back out of record_to_dict.
+
+def _intern(s: Any) -> Any:
+    return sys.intern(s) if type(s) is str else s
+
+def _get(self, key: str, default: Any = None) -> Any:
+    """Like dict.get on the sparse summaries the extractor returns: a None field reads as missing."""
+    v = getattr(self, key) if key in self._fields else next((v for k, v in self.extra if k == key), None)
+    return default if v is None else v
+
+def _extra(d: Dict[str, Any], fields: frozenset) -> Tuple[Tuple[str, Any], ...]:
+    """(key, value) pairs of `d` outside the record's fields; () in the usual case, which is shared."""
+    return tuple((k, v) for k, v in d.items() if k not in fields)
+
+class DxRecord(NamedTuple):
+    code_system: Optional[str] = None
+    code: Optional[str] = None
+    description: Optional[str] = None
+    extra: Tuple[Tuple[str, Any], ...] = ()
+    get = _get
+
+class LabRecord(NamedTuple):
+    name: str = ""
+    value: Any = None
+    unit: Optional[str] = None
+    collected_date: Optional[str] = None
+    extra: Tuple[Tuple[str, Any], ...] = ()
+    get = _get
+
+class MedRecord(NamedTuple):
+    name: str = ""
+    dose: Optional[str] = None
+    route: Optional[str] = None
+    frequency: Optional[str] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    status: Optional[str] = None
+    extra: Tuple[Tuple[str, Any], ...] = ()
+    get = _get
+
+class VitalRecord(NamedTuple):
+    name: str = ""
+    value: Any = None
+    unit: Optional[str] = None
+    measured_date: Optional[str] = None
+    extra: Tuple[Tuple[str, Any], ...] = ()
+    get = _get
+
+class SummaryRecord(NamedTuple):
+    patient_id: Optional[str] = None
+    age: Optional[int] = None
+    sex: Optional[str] = None
+    diagnoses: Tuple[DxRecord, ...] = ()
+    labs: Tuple[LabRecord, ...] = ()
+    meds: Tuple[MedRecord, ...] = ()
+    vitals: Tuple[VitalRecord, ...] = ()
+    note_date: Optional[str] = None
+    extra: Tuple[Tuple[str, Any], ...] = ()
+    get = _get
+
+_FIELDS = {cls: frozenset(cls._fields) - {"extra"} for cls in (DxRecord, LabRecord, MedRecord, VitalRecord, SummaryRecord)}
+
+def _from_dict(d: Dict[str, Any]) -> SummaryRecord:
+    g = d.get
+    dx_f, lab_f, med_f, vital_f = _FIELDS[DxRecord], _FIELDS[LabRecord], _FIELDS[MedRecord], _FIELDS[VitalRecord]
+    return SummaryRecord(
+        g("patient_id"), g("age"), _intern(g("sex")),
+        tuple(DxRecord(_intern(x.get("code_system")), _intern(x.get("code")), x.get("description"), _extra(x, dx_f))
+              for x in g("diagnoses") or ()),
+        tuple(LabRecord(_intern(x.get("name") or ""), x.get("value"), _intern(x.get("unit")), x.get("collected_date"),
+                        _extra(x, lab_f))
+              for x in g("labs") or ()),
+        tuple(MedRecord(x.get("name") or "", x.get("dose"), _intern(x.get("route")), _intern(x.get("frequency")),
+                        x.get("start_date"), x.get("end_date"), _intern(x.get("status")), _extra(x, med_f))
+              for x in g("meds") or ()),
+        tuple(VitalRecord(_intern(x.get("name") or ""), x.get("value"), _intern(x.get("unit")), x.get("measured_date"),
+                          _extra(x, vital_f))
+              for x in g("vitals") or ()),
+        g("note_date"),
+        _extra(d, _FIELDS[SummaryRecord]),
+    )
+
+def to_record(summary: Union[Dict[str, Any], PatientSummary, SummaryRecord]) -> SummaryRecord:
+    """SummaryRecord from a summary dict (fields outside the schema are kept in `extra`), a PatientSummary, or a record."""
+    if isinstance(summary, SummaryRecord):
+        return summary
+    if isinstance(summary, PatientSummary):
+        # model_dump() is a plain-dict walk; cheaper than reading each model attribute
+        return _from_dict(summary.model_dump())
+    return _from_dict(summary)
+
+def record_to_dict(rec: SummaryRecord) -> Dict[str, Any]:
+    """Plain dict in the PatientSummary JSON shape (for responses / batch output), plus any extra keys."""
+    return {
+        "patient_id": rec.patient_id, "age": rec.age, "sex": rec.sex,
+        "diagnoses": [{"code_system": cs, "code": c, "description": desc, **dict(ex)} for cs, c, desc, ex in rec.diagnoses],
+        "labs": [{"name": n, "value": v, "unit": u, "collected_date": dt, **dict(ex)} for n, v, u, dt, ex in rec.labs],
+        "meds": [{"name": n, "dose": d, "route": r, "frequency": f, "start_date": sd, "end_date": ed, "status": st, **dict(ex)}
+                 for n, d, r, f, sd, ed, st, ex in rec.meds],
+        "vitals": [{"name": n, "value": v, "unit": u, "measured_date": dt, **dict(ex)} for n, v, u, dt, ex in rec.vitals],
+        "note_date": rec.note_date,
+        **dict(rec.extra),
+    }
+
+def record_to_model(rec: SummaryRecord) -> PatientSummary:
+    return PatientSummary.model_validate(record_to_dict(rec))
@@ -7,9 +7,11 @@ def build_justification_letter(
     missing: List[str],
     retrieved: List[Dict[str, Any]],
 ) -> str:
-    patient = summary.get("patient_id", "Patient")
-    sex = summary.get("sex", "unknown")
-    age = summary.get("age", "unknown")
+    # A key that is present but None (model_dump(), records) reads as missing too
+    patient = summary.get("patient_id") or "Patient"
+    sex = summary.get("sex") or "unknown"
+    age = summary.get("age")
+    age = "unknown" if age is None else age
 
     dx = ", ".join(
         f"{(d.get('code') or '')} {(d.get('description') or '')}".strip()
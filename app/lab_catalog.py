@@ -0,0 +1,171 @@
+from __future__ import annotations
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# Canonical lab → synonyms, canonical unit, other units as (factor, offset)
+# with canonical = value * factor + offset, and a safe (plausibility) range in
+# the canonical unit. "default_unit" is assumed when a lab arrives without one
+# and its value lies in "default_range" (lo exclusive, hi inclusive).
+# Demo values, not a clinical reference.
+LAB_CATALOG: Dict[str, Dict[str, Any]] = {
+    "HbA1c": {
+        "synonyms": ["A1C", "Hemoglobin A1c", "Haemoglobin A1c", "Hgb A1c", "Hb A1c", "Glycated hemoglobin",
+                     "Glycosylated hemoglobin"],
+        "unit": "%",
+        "units": {"mmol/mol": (0.09148, 2.152)},  # IFCC → NGSP master equation
+        "range": (3.0, 20.0),
+        "default_unit": "%",
+        "default_range": (0.0, 20.0),  # a unitless 53 is more likely mmol/mol than percent
+    },
+    "Glucose": {
+        "synonyms": ["Blood glucose", "Fasting glucose", "Fasting blood glucose", "FBG", "Random glucose",
+                     "Plasma glucose", "Serum glucose", "BG"],
+        "unit": "mg/dL",
+        "units": {"mmol/L": (18.016, 0.0)},
+        "range": (10.0, 2000.0),
+    },
+    "LDL": {
+        "synonyms": ["LDL cholesterol", "LDL-C", "Low-density lipoprotein"],
+        "unit": "mg/dL",
+        "units": {"mmol/L": (38.67, 0.0)},
+        "range": (0.0, 1000.0),
+    },
+    "Creatinine": {
+        "synonyms": ["Serum creatinine", "Cr", "SCr"],
+        "unit": "mg/dL",
+        "units": {"umol/L": (1 / 88.42, 0.0), "µmol/L": (1 / 88.42, 0.0)},
+        "range": (0.05, 30.0),
+    },
+    "eGFR": {
+        "synonyms": ["GFR", "Estimated GFR"],
+        "unit": "mL/min/1.73m2",
+        "units": {"mL/min": (1.0, 0.0), "mL/min/1.73 m2": (1.0, 0.0), "mL/min/1.73m²": (1.0, 0.0)},
+        "range": (0.0, 250.0),
+    },
+    "Hemoglobin": {
+        "synonyms": ["Hgb", "Hb", "Haemoglobin"],
+        "unit": "g/dL",
+        "units": {"g/L": (0.1, 0.0), "mmol/L": (1.611, 0.0)},
+        "range": (2.0, 25.0),
+    },
+    "Potassium": {
+        "synonyms": ["K", "Serum potassium"],
+        "unit": "mmol/L",
+        "units": {"mEq/L": (1.0, 0.0)},
+        "range": (1.0, 10.0),
+    },
+    "BMI": {
+        "synonyms": ["Body mass index"],
+        "unit": "kg/m2",
+        "units": {"kg/m²": (1.0, 0.0)},
+        "range": (8.0, 150.0),
+    },
+}
+
+# Unit spellings treated as the same unit before lookup
+UNIT_ALIASES: Dict[str, str] = {"percent": "%", "pct": "%", "mcmol/l": "umol/l"}
+
+def to_number(value: Any) -> Optional[float]:
+    """Value as a float; None when missing, unparseable or NaN."""
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if v != v else v
+
+MAX_RESOLVED = 4096  # distinct (name, unit) spellings remembered
+
+_NAME_KEY_RE = re.compile(r"[^a-z0-9]+")
+
+def name_key(name: str) -> str:
+    """Lookup key for a lab name: lowercase alphanumerics only ("Hb A1c" → "hba1c")."""
+    return _NAME_KEY_RE.sub("", name.lower())
+
+def unit_key(unit: str) -> str:
+    u = unit.strip().lower().replace(" ", "")
+    return UNIT_ALIASES.get(u, u)
+
+class LabSpec(NamedTuple):
+    canonical: str
+    unit: str
+    lo: float
+    hi: float
+
+class LabCatalog:
+    """
+    LAB_CATALOG compiled into two hash tables: normalized name → LabSpec, and
+    (canonical, unit key) → (factor, offset). Resolving a lab is two dict
+    lookups, whatever the catalog size.
+    """
+    def __init__(self, catalog: Dict[str, Dict[str, Any]]):
+        self.specs: Dict[str, LabSpec] = {}
+        self.conversions: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        self.defaults: Dict[str, str] = {}
+        self.default_ranges: Dict[str, Tuple[float, float]] = {}
+        self.synonyms: Dict[str, List[str]] = {}
+        self._resolved: Dict[Tuple[str, Optional[str]], Tuple[Optional[LabSpec], Optional[str], Optional[Tuple[float, float]]]] = {}
+        for canonical, entry in catalog.items():
+            lo, hi = entry["range"]
+            spec = LabSpec(canonical, entry["unit"], float(lo), float(hi))
+            for n in [canonical, *entry.get("synonyms", [])]:
+                self.specs[name_key(n)] = spec
+            self.conversions[(canonical, unit_key(entry["unit"]))] = (1.0, 0.0)
+            for u, conv in entry.get("units", {}).items():
+                self.conversions[(canonical, unit_key(u))] = conv
+            self.synonyms[canonical.lower()] = [n.lower() for n in entry.get("synonyms", [])]
+            if entry.get("default_unit"):
+                self.defaults[canonical] = entry["default_unit"]
+                lo, hi = entry.get("default_range", (float("-inf"), float("inf")))
+                self.default_ranges[canonical] = (float(lo), float(hi))
+
+    def spec(self, name: str) -> Optional[LabSpec]:
+        return self.specs.get(name_key(name))
+
+    def _resolve(self, name: str, unit: Optional[str]) -> Tuple[Optional[LabSpec], Optional[str], Optional[Tuple[float, float]]]:
+        """(spec, unit to look up, conversion or None), memoized per raw (name, unit) spelling."""
+        hit = self._resolved.get((name, unit))
+        if hit is None:
+            spec = self.spec(name)
+            look = unit or (self.defaults.get(spec.canonical) if spec else None)
+            conv = self.conversions.get((spec.canonical, unit_key(look))) if spec and look else None
+            hit = (spec, look, conv)
+            if len(self._resolved) < MAX_RESOLVED:
+                self._resolved[(name, unit)] = hit
+        return hit
+
+    def aliases(self) -> Dict[str, List[str]]:
+        """Canonical (lowercased) → synonyms (lowercased), in the rule files' lab_aliases shape."""
+        return {k: list(v) for k, v in self.synonyms.items()}
+
+    def normalize(self, name: str, value: Any, unit: Optional[str]) -> Tuple[Any, Optional[str], Optional[LabSpec], bool]:
+        """
+        (value, unit) converted to the catalog's canonical unit, the lab's spec
+        (None for labs not in the catalog) and whether the value is now in that
+        unit. Labs not in the catalog, without a unit (and no default_unit, or
+        a value outside its default_range), in an unknown unit, or with a
+        non-numeric value come back unchanged.
+        """
+        spec, look, conv = self._resolve(name, unit)
+        if spec is None:
+            return value, unit, None, False
+        v = to_number(value)
+        if value is not None and v is None:
+            return value, unit, spec, False
+        if not unit and look and v is not None:
+            lo, hi = self.default_ranges[spec.canonical]
+            if not lo < v <= hi:
+                return value, unit, spec, False
+        if conv is None:
+            return value, look or unit, spec, False
+        factor, offset = conv
+        if (factor, offset) != (1.0, 0.0) and v is not None:
+            value = round(v * factor + offset, 2)
+        return value, spec.unit, spec, True
+
+_default: Optional[LabCatalog] = None
+
+def default_lab_catalog() -> LabCatalog:
+    global _default
+    if _default is None:
+        _default = LabCatalog(LAB_CATALOG)
+    return _default
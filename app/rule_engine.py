@@ -0,0 +1,438 @@
+from __future__ import annotations
+import os, re, json, operator
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.compact import SummaryRecord
+from app.lab_catalog import default_lab_catalog, name_key, to_number as _number
+from app.schemas import PatientSummary
+
+RULES_DIR = Path(__file__).resolve().parent / "rules"
+ACTIVE_STATUSES = frozenset({"active", "current", "ongoing"})
+
+_OPS: Dict[str, Callable[[Any, Any], bool]] = {
+    ">=": operator.ge, ">": operator.gt, "<=": operator.le, "<": operator.lt, "==": operator.eq, "!=": operator.ne,
+}
+
+# ---------- Index structures ----------
+class PrefixTrie:
+    """Code prefixes → fact bits; match() ORs the bits of every prefix of the code."""
+    def __init__(self):
+        self.root: Dict[str, Any] = {}
+
+    def add(self, prefix: str, bits: int) -> None:
+        node = self.root
+        for ch in prefix:
+            node = node.setdefault(ch, {})
+        node[""] = node.get("", 0) | bits
+
+    def match(self, code: str) -> int:
+        bits = 0
+        node = self.root
+        for ch in code:
+            node = node.get(ch)
+            if node is None:
+                break
+            bits |= node.get("", 0)
+        return bits
+
+MAX_MEMO = 8192  # distinct diagnosis / med / lab spellings remembered by facts()
+SMALL_KEYWORD_SET = 24  # up to this many keywords, `in` tests beat a regex scan
+
+class KeywordMatcher:
+    """
+    Keyword → fact bits; search() ORs the bits of every keyword occurring in
+    the text. Small sets test each keyword with `in`; larger ones use one
+    precompiled alternation, tried at every position through a lookahead
+    (longest keyword first). A keyword's bits include those of every keyword
+    it contains, so the longest match at a position stands for all of them.
+    """
+    def __init__(self, keywords: Dict[str, int]):
+        folded = {kw: bits for kw, bits in keywords.items() if kw}
+        for kw in folded:
+            for other, bits in keywords.items():
+                if other and other != kw and other in kw:
+                    folded[kw] |= bits
+        self.keywords = folded
+        self._pairs = tuple(folded.items())
+        self._re = None
+        if len(folded) > SMALL_KEYWORD_SET:
+            alts = "|".join(re.escape(k) for k in sorted(folded, key=len, reverse=True))
+            self._re = re.compile(f"(?=({alts}))")
+            self.search = self._search_re
+
+    def search(self, text: str) -> int:
+        bits = 0
+        for kw, b in self._pairs:
+            if kw in text:
+                bits |= b
+        return bits
+
+    def _search_re(self, text: str) -> int:
+        bits = 0
+        keywords = self.keywords
+        for kw in self._re.findall(text):
+            bits |= keywords[kw]
+        return bits
+
+# ---------- Rule loading ----------
+def load_rule_file(path: str | Path) -> Dict[str, Any]:
+    """One service policy from .json, or .yaml/.yml when PyYAML is installed."""
+    path = Path(path)
+    text = path.read_text()
+    if path.suffix in (".yaml", ".yml"):
+        import yaml  # optional dependency, only needed for YAML rule files
+        return yaml.safe_load(text)
+    return json.loads(text)
+
+def load_rules(rules_dir: str | Path | None = None) -> List[Dict[str, Any]]:
+    rules_dir = Path(rules_dir or os.getenv("ELIGIBILITY_RULES_DIR") or RULES_DIR)
+    paths = sorted(p for p in rules_dir.iterdir() if p.suffix in (".json", ".yaml", ".yml"))
+    return [load_rule_file(p) for p in paths]
+
+# ---------- Compiled engine ----------
+Predicate = Callable[[int, Dict[str, float], Dict[str, Any]], bool]
+VectorPredicate = Callable[[Dict[str, Any]], np.ndarray]
+
+class RuleEngine:
+    """
+    Service policies (rule dicts, see app/rules/*.json) compiled once into
+    predicate plans over a shared fact index:
+
+    - every leaf condition (an ICD prefix set, a diagnosis phrase set, a med
+      keyword set) gets one bit;
+    - ICD prefixes go in a trie, diagnosis phrases and med keywords in
+      keyword matchers, lab names in an alias map;
+    - facts() makes one pass over a summary's diagnoses, meds and labs and
+      returns the bitmask plus the first value of each lab;
+    - each criterion is a closure testing bits / lab values, so evaluating
+      any number of services reuses the same facts.
+
+    For bulk re-scoring, columns() flattens many summaries into NumPy arrays
+    (fact-bit matrix, lab and age columns) and evaluate_bulk() runs the same
+    criteria as vectorized masks.
+
+    Rule leaves: {"dx_code_prefix": [...]}, {"dx_text": [...]},
+    {"med": [...], "active": true}, {"lab_present": name},
+    {"lab": {"name", "op", "value"}}, {"age": {"op", "value"}}; combined
+    with {"all": [...]}, {"any": [...]}, {"not": ...} and {"ref": name} for
+    the policy's "definitions". A criterion may carry a "when" condition;
+    it is only checked (and can only be missing) when that holds.
+    """
+    def __init__(self, policies: Iterable[Dict[str, Any]]):
+        self._bits: Dict[str, int] = {}
+        self._dx_prefixes: Dict[str, int] = {}
+        self._dx_phrases: Dict[str, int] = {}
+        self._med_keywords: Dict[str, int] = {}
+        self._active_only = 0  # med bits that ignore inactive meds
+        self._bit_tests: Dict[Predicate, int] = {}  # predicates that are a plain "any of these bits" test
+        self.lab_aliases: Dict[str, str] = {}
+        self._lab_keys: Dict[str, str] = {}  # name_key(policy alias) → canonical
+        self._lab_memo: Dict[str, str] = {}
+        self.plans: Dict[str, List[Tuple[str, Optional[Predicate], Predicate, str]]] = {}
+        self.vector_plans: Dict[str, List[Tuple[Optional[VectorPredicate], VectorPredicate]]] = {}
+        self._lab_names: set = set()
+        self._dx_memo: Dict[Tuple[Optional[str], Optional[str]], int] = {}
+        self._med_memo: Dict[str, int] = {}
+        policies = list(policies)
+        # Lab synonyms from the catalog, then any the policies add
+        for canon, aliases in default_lab_catalog().aliases().items():
+            for a in [canon, *aliases]:
+                self.lab_aliases[a] = canon
+        for policy in policies:
+            for canon, aliases in (policy.get("lab_aliases") or {}).items():
+                for a in [canon, *aliases]:
+                    self.lab_aliases[a.lower().strip()] = canon.lower()
+                    self._lab_keys[name_key(a)] = canon.lower()
+        for policy in policies:
+            defs = policy.get("definitions") or {}
+            plan, vplan = [], []
+            for c in policy["criteria"]:
+                when = self._compile(c["when"], defs) if c.get("when") else None
+                plan.append((c.get("id", ""), when, self._compile(c["check"], defs), c["missing"]))
+                vwhen = self._vectorize(c["when"], defs) if c.get("when") else None
+                vplan.append((vwhen, self._vectorize(c["check"], defs)))
+            self.plans[policy["service"]] = plan
+            self.vector_plans[policy["service"]] = vplan
+        self._trie = PrefixTrie()
+        for prefix, bits in self._dx_prefixes.items():
+            self._trie.add(prefix, bits)
+        self._dx_kw = KeywordMatcher(self._dx_phrases)
+        self._med_kw = KeywordMatcher(self._med_keywords)
+
+    @classmethod
+    def from_dir(cls, rules_dir: str | Path | None = None) -> "RuleEngine":
+        return cls(load_rules(rules_dir))
+
+    @property
+    def services(self) -> List[str]:
+        return list(self.plans)
+
+    def lab_name(self, raw: str) -> str:
+        """
+        Lowercased canonical name for a lab spelling, matched like the
+        validator does: the lab catalog first, then the policies' lab_aliases
+        (both on name_key, so "Hgb-A1c" and "HbA1c (%)" are "hba1c").
+        """
+        name = self._lab_memo.get(raw)
+        if name is None:
+            spec = default_lab_catalog().spec(raw)
+            name = spec.canonical.lower() if spec else self._lab_keys.get(name_key(raw), raw.lower().strip())
+            if len(self._lab_memo) < MAX_MEMO:
+                self._lab_memo[raw] = name
+        return name
+
+    def keywords(self) -> List[str]:
+        """Every diagnosis phrase, med keyword and lab alias the rules look for (lowercased)."""
+        return sorted({*self._dx_phrases, *self._med_keywords, *self.lab_aliases})
+
+    # --- compilation ---
+    def _bit(self, key: str) -> int:
+        bit = self._bits.get(key)
+        if bit is None:
+            bit = self._bits[key] = 1 << len(self._bits)
+        return bit
+
+    def _leaf_bit(self, node: Dict[str, Any]) -> int:
+        """Fact bit of a diagnosis / med leaf (registering its keys in the matcher tables), or 0 for other nodes."""
+        if "dx_code_prefix" in node:
+            prefixes = sorted(p.upper() for p in node["dx_code_prefix"])
+            bit = self._bit("dx_code_prefix:" + ",".join(prefixes))
+            for p in prefixes:
+                self._dx_prefixes[p] = self._dx_prefixes.get(p, 0) | bit
+            return bit
+        if "dx_text" in node:
+            phrases = sorted(p.lower() for p in node["dx_text"])
+            bit = self._bit("dx_text:" + ",".join(phrases))
+            for p in phrases:
+                self._dx_phrases[p] = self._dx_phrases.get(p, 0) | bit
+            return bit
+        if "med" in node:
+            active = node.get("active", True)
+            words = sorted(k.lower() for k in node["med"])
+            bit = self._bit(f"med:{int(active)}:" + ",".join(words))
+            for k in words:
+                self._med_keywords[k] = self._med_keywords.get(k, 0) | bit
+            if active:
+                self._active_only |= bit
+            return bit
+        return 0
+
+    def _bit_test(self, mask: int) -> Predicate:
+        pred = lambda bits, labs, s: bool(bits & mask)
+        self._bit_tests[pred] = mask
+        return pred
+
+    def _compile(self, node: Dict[str, Any], defs: Dict[str, Any], seen: Tuple[str, ...] = ()) -> Predicate:
+        if "ref" in node:
+            name = node["ref"]
+            if name in seen or name not in defs:
+                raise ValueError(f"Undefined or recursive rule reference '{name}'")
+            return self._compile(defs[name], defs, seen + (name,))
+        if "all" in node:
+            parts = [self._compile(n, defs, seen) for n in node["all"]]
+            return lambda bits, labs, s: all(p(bits, labs, s) for p in parts)
+        if "any" in node:
+            parts = [self._compile(n, defs, seen) for n in node["any"]]
+            # Fold the bit tests among the alternatives into one mask test
+            mask = 0
+            for p in parts:
+                mask |= self._bit_tests.get(p, 0)
+            rest = [p for p in parts if p not in self._bit_tests]
+            if not rest:
+                return self._bit_test(mask)
+            if len(rest) == 1:  # the common "bits or one lab test" shape, without a generator
+                only = rest[0]
+                return lambda bits, labs, s: bool(bits & mask) or only(bits, labs, s)
+            if not mask:
+                return lambda bits, labs, s: any(p(bits, labs, s) for p in rest)
+            return lambda bits, labs, s: bool(bits & mask) or any(p(bits, labs, s) for p in rest)
+        if "not" in node:
+            inner = self._compile(node["not"], defs, seen)
+            return lambda bits, labs, s: not inner(bits, labs, s)
+        bit = self._leaf_bit(node)
+        if bit:
+            return self._bit_test(bit)
+        if "lab_present" in node:
+            name = self.lab_name(node["lab_present"])
+            self._lab_names.add(name)
+            return lambda bits, labs, s: name in labs
+        if "lab" in node:
+            spec = node["lab"]
+            name, op, value = self.lab_name(spec["name"]), _OPS[spec["op"]], spec["value"]
+            self._lab_names.add(name)
+            return lambda bits, labs, s: name in labs and op(labs[name], value)
+        if "age" in node:
+            op, value = _OPS[node["age"]["op"]], node["age"]["value"]
+            return lambda bits, labs, s: (age := _number(s.get("age"))) is not None and op(age, value)
+        raise ValueError(f"Unknown rule node: {sorted(node)}")
+
+    def _vectorize(self, node: Dict[str, Any], defs: Dict[str, Any]) -> VectorPredicate:
+        """Column-wise twin of _compile (run after it, so references are already validated)."""
+        if "ref" in node:
+            return self._vectorize(defs[node["ref"]], defs)
+        if "all" in node or "any" in node:
+            parts = [self._vectorize(n, defs) for n in node.get("all") or node["any"]]
+            ufunc = np.logical_and if "all" in node else np.logical_or
+            def combine(cols):
+                out = np.full(cols["n"], "all" in node)
+                for p in parts:
+                    out = ufunc(out, p(cols))
+                return out
+            return combine
+        if "not" in node:
+            inner = self._vectorize(node["not"], defs)
+            return lambda cols: ~inner(cols)
+        bit = self._leaf_bit(node)
+        if bit:
+            i = bit.bit_length() - 1
+            return lambda cols: cols["facts"][:, i]
+        if "lab_present" in node:
+            name = self.lab_name(node["lab_present"])
+            return lambda cols: cols["lab_present"][name]
+        if "lab" in node:
+            spec = node["lab"]
+            name, op, value = self.lab_name(spec["name"]), _OPS[spec["op"]], spec["value"]
+            return lambda cols: cols["lab_present"][name] & op(cols["labs"][name], value)
+        if "age" in node:
+            op, value = _OPS[node["age"]["op"]], node["age"]["value"]
+            return lambda cols: cols["age_present"] & op(cols["age"], value)
+        raise ValueError(f"Unknown rule node: {sorted(node)}")
+
+    # --- evaluation ---
+    def _dx_bits(self, code: Optional[str], desc: Optional[str]) -> int:
+        bits = (self._trie.match(code.upper()) if code else 0) | (self._dx_kw.search(desc.lower()) if desc else 0)
+        if len(self._dx_memo) < MAX_MEMO:
+            self._dx_memo[(code, desc)] = bits
+        return bits
+
+    def _med_bits(self, name: str) -> int:
+        bits = self._med_kw.search(name.lower())
+        if len(self._med_memo) < MAX_MEMO:
+            self._med_memo[name] = bits
+        return bits
+
+    def facts(self, summary: Dict[str, Any] | SummaryRecord) -> Tuple[int, Dict[str, float]]:
+        """
+        One pass over the summary: leaf-condition bitmask and first numeric
+        value per lab. Diagnosis and med matches are memoized per raw
+        spelling, since the same few recur across a batch.
+        """
+        if type(summary) is SummaryRecord:
+            dx = [(d.code, d.description) for d in summary.diagnoses]
+            meds = [(m.name, m.status) for m in summary.meds]
+            lab_values = [(x.name, x.value) for x in summary.labs]
+        else:
+            dx = [(d.get("code"), d.get("description")) for d in summary.get("diagnoses") or ()]
+            meds = [(m.get("name"), m.get("status")) for m in summary.get("meds") or ()]
+            lab_values = [(x.get("name"), x.get("value")) for x in summary.get("labs") or ()]
+        bits = 0
+        dx_memo, med_memo = self._dx_memo, self._med_memo
+        for key in dx:
+            hit = dx_memo.get(key)
+            bits |= self._dx_bits(*key) if hit is None else hit
+        active_only = self._active_only
+        for name, status in meds:
+            if not name:
+                continue
+            hit = med_memo.get(name)
+            if hit is None:
+                hit = self._med_bits(name)
+            if hit & active_only and (status or "active").lower() not in ACTIVE_STATUSES:
+                hit &= ~active_only
+            bits |= hit
+        labs: Dict[str, float] = {}
+        lab_memo = self._lab_memo
+        for raw, value in lab_values:
+            name = lab_memo.get(raw)
+            if name is None:
+                name = self.lab_name(raw or "")
+            if name in labs:
+                continue
+            v = _number(value)
+            if v is not None:
+                labs[name] = v
+        return bits, labs
+
+    def evaluate(self, summary: Dict[str, Any], service: str,
+                 facts: Optional[Tuple[int, Dict[str, float]]] = None) -> Tuple[bool, List[str]]:
+        """(meets criteria, missing items) for one service; pass precomputed facts() to reuse them."""
+        plan = self.plans.get(service)
+        if plan is None:
+            raise ValueError(f"No eligibility rules for service '{service}' (known: {', '.join(self.services)})")
+        bits, labs = facts if facts is not None else self.facts(summary)
+        missing = [msg for _, when, check, msg in plan
+                   if (when is None or when(bits, labs, summary)) and not check(bits, labs, summary)]
+        return not missing, missing
+
+    def evaluate_all(self, summary: Dict[str, Any], services: Optional[Iterable[str]] = None) -> Dict[str, Tuple[bool, List[str]]]:
+        f = self.facts(summary)
+        return {svc: self.evaluate(summary, svc, f) for svc in (services or self.plans)}
+
+    # --- bulk evaluation ---
+    def columns(self, summaries: Iterable[Any]) -> Dict[str, Any]:
+        """
+        Flatten summaries (dicts, SummaryRecords or PatientSummary models) into columns:
+        "facts" (n x leaf-bit bool matrix), "labs" / "lab_present" (one
+        float / bool array per lab the rules use), "age" / "age_present".
+        """
+        rows = [s.model_dump() if isinstance(s, PatientSummary) else s for s in summaries]
+        n = len(rows)
+        nbytes = max(1, (len(self._bits) + 7) // 8)
+        packed = bytearray()
+        labs = {name: np.full(n, np.nan) for name in self._lab_names}
+        lab_present = {name: np.zeros(n, dtype=bool) for name in self._lab_names}
+        age = np.full(n, np.nan)
+        for i, s in enumerate(rows):
+            bits, row_labs = self.facts(s)
+            packed += bits.to_bytes(nbytes, "little")
+            for name, v in row_labs.items():
+                if name in labs:
+                    labs[name][i] = v
+                    lab_present[name][i] = True
+            a = _number(s.get("age"))
+            if a is not None:
+                age[i] = a
+        facts = np.unpackbits(np.frombuffer(bytes(packed), dtype=np.uint8).reshape(n, nbytes), axis=1, bitorder="little")
+        return {"n": n, "facts": facts[:, :len(self._bits)].astype(bool), "labs": labs, "lab_present": lab_present,
+                "age": age, "age_present": ~np.isnan(age)}
+
+    def evaluate_bulk(self, summaries: Iterable[Any] | Dict[str, Any],
+                      services: Optional[Iterable[str]] = None) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        service → (meets criteria: bool[n], missing: uint64[n]) where bit i of
+        missing is set when criterion i of the policy is missing; decode with
+        missing_items(). Takes summaries or precomputed columns(); matches
+        evaluate() row for row.
+        """
+        cols = summaries if isinstance(summaries, dict) and "facts" in summaries else self.columns(summaries)
+        out: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for svc in services or self.vector_plans:
+            vplan = self.vector_plans.get(svc)
+            if vplan is None:
+                raise ValueError(f"No eligibility rules for service '{svc}' (known: {', '.join(self.services)})")
+            if len(vplan) > 64:
+                raise ValueError(f"Service '{svc}' has {len(vplan)} criteria; bulk evaluation supports at most 64")
+            missing = np.zeros(cols["n"], dtype=np.uint64)
+            for i, (when, check) in enumerate(vplan):
+                miss = ~check(cols)
+                if when is not None:
+                    miss &= when(cols)
+                missing |= miss.astype(np.uint64) << np.uint64(i)
+            out[svc] = (missing == 0, missing)
+        return out
+
+    def missing_items(self, service: str, missing: int) -> List[str]:
+        """Messages for a missing-criteria bitset from evaluate_bulk(), in policy order."""
+        return [msg for i, (_, _, _, msg) in enumerate(self.plans[service]) if int(missing) >> i & 1]
+
+_default: Optional[RuleEngine] = None
+
+def default_rule_engine() -> RuleEngine:
+    """Engine over app/rules (or ELIGIBILITY_RULES_DIR), compiled on first use."""
+    global _default
+    if _default is None:
+        _default = RuleEngine.from_dir()
+    return _default
@@ -1,45 +1,95 @@
 from __future__ import annotations
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple, Union
 
-SAFE_RANGES = {
-    "HbA1c": (3.0, 20.0),   # percent
-    "A1C": (3.0, 20.0),
-    "Hemoglobin A1c": (3.0, 20.0),
-}
+from app.compact import SummaryRecord
+from app.lab_catalog import default_lab_catalog, to_number
+from app.schemas import Lab, PatientSummary
 
-UNIT_NORMALIZE = {
-    "hba1c": "%",
-    "a1c": "%",
-    "hemoglobin a1c": "%",
-}
+def _check_lab(name: str, value: Any, unit: Optional[str], errors: List[str]) -> Tuple[Any, Optional[str]]:
+    """(value, unit) in the catalog's canonical unit, appending any range / unit error."""
+    new_value, new_unit, spec, canonical = default_lab_catalog().normalize(name, value, unit)
+    if spec is None:
+        return value, unit
+    if value is not None and to_number(value) is None:
+        errors.append(f"Lab '{name}': non-numeric value {value!r}; not converted or range-checked.")
+        return value, unit
+    if canonical:
+        if new_value is not None and not (spec.lo <= to_number(new_value) <= spec.hi):
+            errors.append(f"Lab '{name}' value {new_value} out of safe range [{spec.lo}, {spec.hi}].")
+    elif unit:
+        errors.append(f"Lab '{name}' unit '{unit}' not recognised for {spec.canonical}; range not checked.")
+    return new_value, new_unit
 
-def normalize_units(summary: Dict[str, Any]) -> Dict[str, Any]:
+def _normalize_dict(summary: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    errors: List[str] = []
+    if not summary.get("diagnoses"):
+        errors.append("At least one diagnosis should be present.")
+    labs = []
+    for lab in summary.get("labs", []):
+        value, unit = lab.get("value"), lab.get("unit")
+        new_value, new_unit = _check_lab((lab.get("name") or "").strip(), value, unit, errors)
+        changed = new_unit != unit or new_value != value
+        labs.append({**lab, "value": new_value, "unit": new_unit} if changed else lab)
     out = dict(summary)
-    labs = out.get("labs", [])
-    for lab in labs:
-        name = (lab.get("name") or "").strip()
-        unit = lab.get("unit")
-        low_name = name.lower()
-        if unit in (None, "", "percent", "Percent", "%"):
-            if low_name in UNIT_NORMALIZE:
-                lab["unit"] = "%"
-        # If no unit but value looks like percent range, assume %
-        if not lab.get("unit") and 0.0 < float(lab.get("value", 0)) <= 20.0:
-            if any(k.lower() == low_name for k in UNIT_NORMALIZE.keys()):
-                lab["unit"] = "%"
-    return out
+    if "labs" in summary:
+        out["labs"] = labs
+    return out, errors
+
+def _normalize_model(summary: PatientSummary) -> Tuple[PatientSummary, List[str]]:
+    errors: List[str] = []
+    if not summary.diagnoses:
+        errors.append("At least one diagnosis should be present.")
+    labs: List[Lab] = []
+    changed = False
+    for lab in summary.labs:
+        value, unit = _check_lab(lab.name.strip(), lab.value, lab.unit, errors)
+        if unit != lab.unit or value != lab.value:
+            lab = lab.model_copy(update={"value": value, "unit": unit})
+            changed = True
+        labs.append(lab)
+    if changed:
+        summary = summary.model_copy(update={"labs": labs})
+    return summary, errors
+
+def _normalize_record(summary: SummaryRecord) -> Tuple[SummaryRecord, List[str]]:
+    errors: List[str] = []
+    if not summary.diagnoses:
+        errors.append("At least one diagnosis should be present.")
+    labs = []
+    changed = False
+    for lab in summary.labs:
+        value, unit = _check_lab(lab.name.strip(), lab.value, lab.unit, errors)
+        if unit != lab.unit or value != lab.value:
+            lab = lab._replace(value=value, unit=unit)
+            changed = True
+        labs.append(lab)
+    if changed:
+        summary = summary._replace(labs=tuple(labs))
+    return summary, errors
+
+Summary = Union[Dict[str, Any], PatientSummary, SummaryRecord]
+
+def validate_and_normalize(summary: Summary) -> Tuple[Summary, List[str]]:
+    """
+    One pass over the summary: convert catalogued labs (app/lab_catalog.py)
+    to their canonical unit, check safe ranges and required fields. Returns
+    (normalized summary, errors) of the same type as the input (dict,
+    PatientSummary or SummaryRecord) without modifying the input; labs that
+    change are copied, the rest are shared.
+    """
+    if isinstance(summary, SummaryRecord):
+        return _normalize_record(summary)
+    if isinstance(summary, PatientSummary):
+        return _normalize_model(summary)
+    return _normalize_dict(summary)
+
+def normalize_units(summary: Dict[str, Any]) -> Dict[str, Any]:
+    return validate_and_normalize(summary)[0]
 
 def validate_ranges(summary: Dict[str, Any]) -> List[str]:
     errors: List[str] = []
     for lab in summary.get("labs", []):
-        name = (lab.get("name") or "").strip()
-        value = lab.get("value")
-        if value is None:
-            continue
-        if name in SAFE_RANGES:
-            lo, hi = SAFE_RANGES[name]
-            if not (lo <= float(value) <= hi):
-                errors.append(f"Lab '{name}' value {value} out of safe range [{lo}, {hi}].")
+        _check_lab((lab.get("name") or "").strip(), lab.get("value"), lab.get("unit"), errors)
     return errors
 
 def required_fields(summary: Dict[str, Any]) -> List[str]:
@@ -47,10 +97,3 @@ def required_fields(summary: Dict[str, Any]) -> List[str]:
     if not summary.get("diagnoses"):
         errs.append("At least one diagnosis should be present.")
     return errs
-
-def validate_and_normalize(summary: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
-    s2 = normalize_units(summary)
-    errors = []
-    errors += required_fields(s2)
-    errors += validate_ranges(s2)
-    return s2, errors
@@ -1,7 +1,9 @@
 from __future__ import annotations
-from typing import List, Dict
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Tuple
 
-def _split_text(text: str, max_tokens: int = 600, overlap: int = 100) -> List[str]:
+def _iter_split(text: str, max_tokens: int = 600, overlap: int = 100) -> Iterator[str]:
     """
     Very simple splitter by characters (proxy for tokens). 
     We’ll refine later with token-aware splitting if needed.
@@ -10,36 +12,261 @@ def _split_text(text: str, max_tokens: int = 600, overlap: int = 100) -> List[st
     max_len = max_tokens * 4
     ov_len = overlap * 4
 
-    chunks = []
     start = 0
     n = len(text)
     while start < n:
         end = min(start + max_len, n)
-        chunk = text[start:end]
-        chunks.append(chunk.strip())
+        chunk = text[start:end].strip()
+        if chunk:
+            yield chunk
         if end == n:
             break
         start = max(0, end - ov_len)
-    return [c for c in chunks if c]
 
-def chunk_pages(pages: List[Dict], max_tokens: int = 600, overlap: int = 100) -> List[Dict]:
+def _split_text(text: str, max_tokens: int = 600, overlap: int = 100) -> List[str]:
+    return list(_iter_split(text, max_tokens=max_tokens, overlap=overlap))
+
+def iter_chunks(pages: Iterable[Dict], max_tokens: int = 600, overlap: int = 100,
+                extra_metadata: Dict | None = None) -> Iterator[Dict]:
     """
-    Input: list of {text, page, source}
-    Output: list of chunks {id, text, metadata}
+    Lazy variant of chunk_pages: consumes pages one at a time and yields
+    chunks {id, text, metadata} as they are cut.
     """
-    out = []
-    idx = 0
     for p in pages:
-        parts = _split_text(p["text"], max_tokens=max_tokens, overlap=overlap)
-        for j, part in enumerate(parts):
-            out.append({
+        for j, part in enumerate(_iter_split(p["text"], max_tokens=max_tokens, overlap=overlap)):
+            yield {
                 "id": f"{p['source']}::p{p['page']}::c{j}",
                 "text": part,
                 "metadata": {
+                    **(extra_metadata or {}),
                     "source": p["source"],
                     "page": p["page"],
                     "chunk_index": j
                 }
-            })
-            idx += 1
-    return out
+            }
+
+def chunk_pages(pages: List[Dict], max_tokens: int = 600, overlap: int = 100,
+                extra_metadata: Dict | None = None) -> List[Dict]:
+    """
+    Input: list of {text, page, source}
+    Output: list of chunks {id, text, metadata}
+    `extra_metadata` (e.g. payer / policy_id / effective_date / services from
+    rag.policy_metadata.chunk_metadata) is copied into every chunk's metadata.
+    """
+    return list(iter_chunks(pages, max_tokens=max_tokens, overlap=overlap, extra_metadata=extra_metadata))
+
+# ---------- Structure-aware, token-aware chunking ----------
+_TOKENIZER = None
+
+def _get_tokenizer():
+    """tiktoken's cl100k_base when available (and its BPE file can be loaded), else None."""
+    global _TOKENIZER
+    if _TOKENIZER is None:
+        try:
+            import tiktoken
+            _TOKENIZER = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _TOKENIZER = False
+    return _TOKENIZER or None
+
+# Offline fallback: words, numbers and individual symbols ≈ BPE tokens for policy prose
+_APPROX_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+@lru_cache(maxsize=65536)
+def count_tokens(text: str) -> int:
+    enc = _get_tokenizer()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return len(_APPROX_TOKEN_RE.findall(text))
+
+def _token_starts(text: str, start: int, end: int) -> List[int]:
+    """Offsets in `text` where the tokens of text[start:end] begin (same tokenizer as count_tokens)."""
+    enc = _get_tokenizer()
+    if enc is not None:
+        _, offsets = enc.decode_with_offsets(enc.encode(text[start:end], disallowed_special=()))
+        return [start + o for o in offsets]
+    return [m.start() for m in _APPROX_TOKEN_RE.finditer(text, start, end)]
+
+def _split_by_tokens(text: str, start: int, end: int, max_tokens: int, overlap: int) -> List[Tuple[int, int]]:
+    """Windows of at most max_tokens measured tokens over text[start:end], overlapping by `overlap` tokens."""
+    starts = _token_starts(text, start, end)
+    spans: List[Tuple[int, int]] = []
+    i, n = 0, len(starts)
+    while i < n:
+        j = min(i + max_tokens, n)
+        s, e = _trim(text, starts[i], starts[j] if j < n else end)
+        # Re-tokenizing a slice can merge differently at its edges; shrink until it fits
+        while j > i + 1 and count_tokens(text[s:e]) > max_tokens:
+            j -= 1
+            s, e = _trim(text, starts[i], starts[j])
+        if e > s:
+            spans.append((s, e))
+        if j >= n:
+            break
+        i = max(i + 1, j - overlap)
+    return spans
+
+_NUMBERED_HEADING_RE = re.compile(r"^(?:\d+(?:\.\d+)*\.?|[IVXLC]+\.|[A-Z]\.|Section\s+\d+)\s+\S")
+_TABLE_GAP_RE = re.compile(r"\S(?: {2,}|\t)\S")
+_SENT_END_RE = re.compile(r"[.!?](?=\s)")
+
+def _line_kind(line: str) -> str:
+    s = line.strip()
+    if not s:
+        return "blank"
+    if "|" in s or len(_TABLE_GAP_RE.findall(s)) >= 2:
+        return "table"
+    if len(s) <= 80 and not s.endswith((".", ",", ";")):
+        letters = [c for c in s if c.isalpha()]
+        if _NUMBERED_HEADING_RE.match(s) or s.endswith(":") or (letters and all(c.isupper() for c in letters)):
+            return "heading"
+    return "prose"
+
+def _units(text: str) -> Iterator[Tuple[int, int, str]]:
+    """
+    One pass over `text` → (start, end, kind) units, kind ∈ heading | table |
+    sentence. Consecutive table rows stay one unit; prose lines are joined
+    into paragraphs and split at sentence ends. A "para" unit (start == end)
+    marks a paragraph break.
+    """
+    pos, n = 0, len(text)
+    block_start, block_kind = -1, None   # open prose paragraph / table block
+
+    def close_block(end):
+        if block_kind == "table":
+            yield block_start, end, "table"
+        elif block_kind == "prose":
+            s = block_start
+            for m in _SENT_END_RE.finditer(text, block_start, end):
+                yield s, m.end(), "sentence"
+                s = m.end()
+            if text[s:end].strip():
+                yield s, end, "sentence"
+
+    while pos < n:
+        nl = text.find("\n", pos)
+        eol = n if nl == -1 else nl
+        kind = _line_kind(text[pos:eol])
+        if kind in ("prose", "table") and kind == block_kind:
+            pass  # extend the open block
+        else:
+            if block_kind is not None:
+                yield from close_block(prev_eol)
+                block_kind = None
+            if kind == "heading":
+                yield pos, eol, "heading"
+            elif kind == "blank":
+                yield pos, pos, "para"
+            else:
+                block_start, block_kind = pos, kind
+        prev_eol = eol
+        pos = eol + 1
+    if block_kind is not None:
+        yield from close_block(n)
+
+def _trim(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+def split_spans(text: str, max_tokens: int = 400, overlap: int = 50) -> List[Tuple[int, int]]:
+    """
+    Structure-aware splitter returning (start, end) offsets into `text`.
+    Chunks break at headings, paragraphs and sentence ends (never inside a
+    table unless the table alone exceeds max_tokens), hold at most
+    ~max_tokens tokens, and repeat up to `overlap` tokens of trailing
+    sentences when a chunk is cut for size. A heading starts a new chunk once
+    the current one is a quarter full, so headings stay with their section.
+    """
+    spans: List[Tuple[int, int]] = []
+    cur: List[Tuple[int, int, int, str]] = []   # (start, end, tokens, kind)
+    cur_tokens = 0
+    min_tokens = max_tokens // 4
+
+    def emit():
+        s, e = _trim(text, cur[0][0], cur[-1][1])
+        if e > s and (not spans or spans[-1] != (s, e)):
+            spans.append((s, e))
+
+    for start, end, kind in _units(text):
+        if kind == "para":
+            continue
+        start, end = _trim(text, start, end)
+        if end <= start:
+            continue
+        toks = count_tokens(text[start:end])
+        if toks > max_tokens:
+            # Oversized unit (giant table / run-on sentence): flush, then hard-split by measured tokens
+            if cur:
+                emit()
+                cur, cur_tokens = [], 0
+            spans.extend(_split_by_tokens(text, start, end, max_tokens, overlap))
+            continue
+        if cur and kind == "heading" and cur_tokens >= min_tokens:
+            emit()
+            cur, cur_tokens = [], 0
+        elif cur and cur_tokens + toks > max_tokens:
+            emit()
+            # Carry trailing sentences (not headings/tables) as overlap
+            carry, carry_tokens = [], 0
+            for u in reversed(cur):
+                if u[3] != "sentence" or carry_tokens + u[2] > overlap or carry_tokens + u[2] + toks > max_tokens:
+                    break
+                carry.insert(0, u)
+                carry_tokens += u[2]
+            cur, cur_tokens = carry, carry_tokens
+        cur.append((start, end, toks, kind))
+        cur_tokens += toks
+    if cur:
+        emit()
+    return spans
+
+class ChunkSpan:
+    """
+    A chunk stored as offsets into its page's text. Behaves like the chunk
+    dicts of iter_chunks (c["id"], c["text"], c["metadata"]); the text is
+    only sliced out when asked for.
+    """
+    __slots__ = ("source", "page", "index", "start", "end", "_page_text", "_extra")
+
+    def __init__(self, source: str, page: int, index: int, start: int, end: int, page_text: str,
+                 extra: Dict | None = None):
+        self.source = source
+        self.page = page
+        self.index = index
+        self.start = start
+        self.end = end
+        self._page_text = page_text
+        self._extra = extra  # shared per-document metadata, not copied per chunk
+
+    @property
+    def id(self) -> str:
+        return f"{self.source}::p{self.page}::c{self.index}"
+
+    @property
+    def text(self) -> str:
+        return self._page_text[self.start:self.end]
+
+    @property
+    def metadata(self) -> Dict:
+        return {**(self._extra or {}), "source": self.source, "page": self.page, "chunk_index": self.index,
+                "char_start": self.start, "char_end": self.end}
+
+    def __getitem__(self, key: str):
+        if key in ("id", "text", "metadata"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+def iter_chunk_spans(pages: Iterable[Dict], max_tokens: int = 400, overlap: int = 50,
+                     extra_metadata: Dict | None = None) -> Iterator[ChunkSpan]:
+    for p in pages:
+        text = p["text"]
+        for j, (s, e) in enumerate(split_spans(text, max_tokens=max_tokens, overlap=overlap)):
+            yield ChunkSpan(p["source"], p["page"], j, s, e, text, extra_metadata)
+
+CHUNKERS = {
+    "chars": iter_chunks,
+    "structured": iter_chunk_spans,
+}
@@ -1,8 +1,13 @@
 from __future__ import annotations
-import os, json, re
+import os, json, threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List
-import google.generativeai as genai
-from google.api_core.exceptions import ResourceExhausted
+
+from rag.kv_cache import SingleFlight
+from rag.llm_client import CircuitOpenError, LLMClient, LLMUnavailableError, client_from_env, estimate_tokens
+from rag.extraction_cache import ExtractionCache, copy_summary, default_extraction_cache, extraction_key
+from rag.regex_extractor import default_regex_extractor
+from rag.note_sections import NOTE_TOKEN_BUDGET, NOTE_TRIM_NARRATIVE, trim_note
 
 # Optional import - avoid circular dependency for Streamlit
 try:
@@ -35,121 +40,289 @@ Rules:
 - Output ONLY JSON. No explanations.
 """
 
-# ---------- LLM CONFIG ----------
-def _configure_genai():
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise RuntimeError("GEMINI_API_KEY missing. Add it to .env")
-    genai.configure(api_key=api_key)
+BATCH_INSTRUCTIONS = """
+You will receive several clinical notes. Each one starts with a line
+"=== NOTE <id> ===" and runs until the next such line.
+Extract each note independently with the schema and rules above; never mix
+information between notes. Instead of a single object, return a JSON array
+with exactly one entry per note:
+
+[{"note_id": "<id>", "summary": { ...schema above... }}]
+"""
+BATCH_PROMPT = SYSTEM_PROMPT + BATCH_INSTRUCTIONS
 
+# Packing budget per request: prompt + notes + expected replies (estimated tokens)
+EXTRACT_BATCH_TOKENS = int(os.getenv("EXTRACT_BATCH_TOKENS", "12000"))
+EXTRACT_BATCH_MAX_NOTES = int(os.getenv("EXTRACT_BATCH_MAX_NOTES", "16"))
+OUTPUT_TOKENS_PER_NOTE = 400  # a filled-in summary is ~250-400 tokens
+NOTE_HEADER_TOKENS = 8
+
+# ---------- LLM CONFIG ----------
 def _get_model_name() -> str:
     # Allow override via env; default to a light, widely available model.
     return os.getenv("GEMINI_MODEL_GEN", "models/gemini-1.5-flash")
 
-def _get_model():
-    _configure_genai()
-    return genai.GenerativeModel(_get_model_name())
+def _model_key() -> str:
+    """Backend + model, so cached results from the fake backend never pass for Gemini's."""
+    return f"{os.getenv('LLM_BACKEND', 'gemini').lower()}:{_get_model_name()}"
+
+_client: LLMClient | None = None
+_client_lock = threading.Lock()
+
+def _get_client() -> LLMClient:
+    """Process-wide LLM client, so every request shares one rate limit and circuit breaker."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = client_from_env(_get_model_name())
+        return _client
 
 # ---------- FALLBACK (no-LLM) REGEX EXTRACTOR ----------
 def _regex_extract(note_text: str) -> Dict[str, Any]:
-    """Very simple, deterministic parser to unblock the pipeline when LLM quota is 0."""
-    # patient_id
-    m_id = re.search(r"\bMRN\s*([A-Za-z0-9\-]+)", note_text)
-    patient_id = m_id.group(1) if m_id else None
-    # sex
-    m_sex = re.search(r"\bSex:\s*([A-Za-z])", note_text, re.I)
-    sex = {"m":"male","f":"female"}.get((m_sex.group(1).lower() if m_sex else ""), None)
-    # age: not always present; skip
-    age = None
-    # diagnoses: pull ICD-10 like E11.65
-    diags = []
-    for m in re.finditer(r"\b([A-TV-Z][0-9][0-9AB](?:\.[0-9A-Za-z]{1,4})?)\b", note_text):
-        code = m.group(1)
-        diags.append({"code_system":"ICD-10","code":code,"description":None})
-    if not diags:
-        # crude text match
-        if re.search(r"type\s*2\s*diabetes", note_text, re.I):
-            diags.append({"code_system":None,"code":None,"description":"Type 2 diabetes mellitus"})
-    # labs: HbA1c and fasting glucose examples
-    labs: List[Dict[str, Any]] = []
-    m_a1c = re.search(r"(HbA1c|A1C|Hemoglobin A1c)[:\s]*([0-9]+(?:\.[0-9]+)?)\s*%?(?:.*?(\d{4}-\d{2}-\d{2}))?", note_text, re.I)
-    if m_a1c:
-        labs.append({"name":"HbA1c","value":float(m_a1c.group(2)),"unit":"%","collected_date":(m_a1c.group(3) or None)})
-    m_glu = re.search(r"(Fasting glucose)[:\s]*([0-9]+(?:\.[0-9]+)?)\s*(mg/dL)?(?:.*?(\d{4}-\d{2}-\d{2}))?", note_text, re.I)
-    if m_glu:
-        labs.append({"name":"Fasting glucose","value":float(m_glu.group(2)),"unit":(m_glu.group(3) or "mg/dL"),"collected_date":(m_glu.group(4) or None)})
-    # meds: look for insulin / metformin lines
-    meds: List[Dict[str, Any]] = []
-    for line in note_text.splitlines():
-        if re.search(r"\bmetformin\b", line, re.I) or re.search(r"\binsulin\b|\bglargine\b|\baspart\b|\blispro\b", line, re.I):
-            meds.append({"name":line.strip(), "dose":None,"route":None,"frequency":None,"start_date":None,"end_date":None,"status":"active"})
-    # vitals: optional
-    vitals: List[Dict[str, Any]] = []
-    m_bp = re.search(r"\bBP\s*([0-9]{2,3})/([0-9]{2,3})", note_text)
-    if m_bp:
-        vitals.append({"name":"BP_systolic","value":float(m_bp.group(1)),"unit":"mmHg"})
-        vitals.append({"name":"BP_diastolic","value":float(m_bp.group(2)),"unit":"mmHg"})
-    m_wt = re.search(r"\bweight\s*([0-9]+(?:\.[0-9]+)?)\s*kg", note_text, re.I)
-    if m_wt:
-        vitals.append({"name":"Weight","value":float(m_wt.group(1)),"unit":"kg"})
-    m_ht = re.search(r"\bheight\s*([0-9]+(?:\.[0-9]+)?)\s*cm", note_text, re.I)
-    if m_ht:
-        vitals.append({"name":"Height","value":float(m_ht.group(1)),"unit":"cm"})
-
-    # note date
-    m_nd = re.search(r"Date of service:\s*(\d{4}-\d{2}-\d{2})", note_text)
-    note_date = m_nd.group(1) if m_nd else None
-
-    data = {
-        "patient_id": patient_id,
-        "age": age,
-        "sex": sex,
-        "diagnoses": diags,
-        "labs": labs,
-        "meds": meds,
-        "vitals": vitals,
-        "note_date": note_date,
-    }
-    
+    """Deterministic single-pass parser (rag.regex_extractor) to unblock the pipeline when LLM quota is 0."""
+    return _validate(default_regex_extractor().extract(note_text))
+
+# Counters reported by extraction_stats()
+_counts_lock = threading.Lock()
+
+def _bump(counts: Dict[str, int], name: str, n: int = 1) -> None:
+    with _counts_lock:
+        counts[name] += n
+
+# ---------- NOTE TRIMMING ----------
+_trim_counts = {"notes": 0, "tokens_in": 0, "tokens_out": 0}
+
+def _trim_enabled() -> bool:
+    return os.getenv("NOTE_TRIM", "1").lower() not in ("0", "false", "no")
+
+def _prompt_signature(prompt: str) -> str:
+    """Prompt plus the trimming settings, since both shape what the model sees (cache versioning)."""
+    return prompt + (f"\n[trim budget={NOTE_TOKEN_BUDGET} narrative={NOTE_TRIM_NARRATIVE}]" if _trim_enabled() else "")
+
+def _cache_key(note_text: str) -> str:
+    """
+    Extraction cache key. Packed and single requests share it: BATCH_PROMPT only
+    wraps SYSTEM_PROMPT's schema and rules, so either result serves the other.
+    """
+    return extraction_key(_model_key(), _prompt_signature(SYSTEM_PROMPT), note_text)
+
+def _prepare(note_text: str) -> str:
+    """The text actually sent to the model: relevant sections only (rag.note_sections), unless NOTE_TRIM=0."""
+    if not _trim_enabled():
+        return note_text
+    t = trim_note(note_text)
+    _bump(_trim_counts, "notes")
+    _bump(_trim_counts, "tokens_in", t["tokens_in"])
+    _bump(_trim_counts, "tokens_out", t["tokens_out"])
+    return t["text"]
+
+# ---------- LLM EXTRACTION ----------
+def _llm_extract(note_text: str) -> Dict[str, Any]:
+    """LLM extraction through the shared client, validated; raises on client, parse or validation errors."""
+    text = _get_client().generate(
+        SYSTEM_PROMPT + "\n\nCLINICAL NOTE:\n" + _prepare(note_text),
+        generation_config={"response_mime_type": "application/json"},
+    ) or "{}"
+    return _validate(_parse_json(text, "{}"))
+
+def _parse_json(text: str, brackets: str) -> Any:
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        start = text.find(brackets[0]); end = text.rfind(brackets[1])
+        if start != -1 and end != -1:
+            return json.loads(text[start:end+1])
+        raise
+
+def _validate(data: Dict[str, Any]) -> Dict[str, Any]:
     # Validate with pydantic if available, otherwise return as-is
     if HAS_SCHEMAS and PatientSummary:
-        summary = PatientSummary.model_validate(data)
-        return json.loads(summary.model_dump_json())
+        # model_dump() yields the same plain types as a JSON round-trip (the
+        # schema has no dates or other non-JSON fields) at a fraction of the cost
+        return PatientSummary.model_validate(data).model_dump()
     else:
         return data
 
+# Concurrent requests for the same note share one LLM call
+_inflight = SingleFlight()
+_fallbacks = {"circuit_open": 0, "error": 0}
+
+def _extract_uncached(note_text: str, key: str | None, cache: ExtractionCache | None) -> Dict[str, Any]:
+    if cache is not None and key is not None:
+        hit = cache.get(key, record=False)  # another flight may have filled it since our miss
+        if hit is not None:
+            return hit
+    try:
+        data = _llm_extract(note_text)
+    except CircuitOpenError:
+        # Model is down → degrade to regex until the breaker lets a probe through
+        _bump(_fallbacks, "circuit_open")
+        return _regex_extract(note_text)
+    except LLMUnavailableError:
+        # Retries or the rate-limit queue ran out while the circuit is closed: surface it
+        # (the API answers 503) rather than silently degrading a burst of traffic
+        raise
+    except Exception:
+        # No API key, unparseable or invalid model output → regex
+        _bump(_fallbacks, "error")
+        return _regex_extract(note_text)
+    # Only LLM results are cached, so a note that fell back is retried next time
+    if cache is not None and key is not None:
+        cache.put(key, data)
+    return data
+
 # ---------- PUBLIC API ----------
 def extract_patient_summary(note_text: str) -> Dict[str, Any]:
     """
-    Try LLM extraction (Gemini). If quota is exhausted or unavailable, fall back to
-    a deterministic regex extractor so the pipeline keeps moving.
+    Try LLM extraction (Gemini) through the shared rate-limited client. While its
+    circuit breaker is open (or there is no API key / the output is unusable),
+    fall back to a deterministic regex extractor so the pipeline keeps moving.
+    Raises LLMUnavailableError when the model stays unreachable after retries.
+
+    Successful LLM results are cached by note content, model and prompt, and
+    identical notes in flight at the same time are extracted once.
+    """
+    cache = default_extraction_cache()
+    key = _cache_key(note_text)
+    if cache is not None:
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+    # Callers may mutate the summary, so merged waiters get their own copy
+    return _inflight.do(key, lambda: _extract_uncached(note_text, key, cache), share=copy_summary)
+
+# ---------- BATCHED EXTRACTION ----------
+_batch_counts = {"packs": 0, "packed_notes": 0, "pack_splits": 0, "single_retries": 0}
+
+def pack_notes(notes: List[str], token_budget: int = EXTRACT_BATCH_TOKENS,
+               max_notes: int = EXTRACT_BATCH_MAX_NOTES) -> List[List[int]]:
+    """
+    Group note indices into requests whose estimated size (batch prompt, the
+    notes, and their expected replies) stays within token_budget. A note that
+    alone exceeds the budget gets a request of its own.
     """
+    base = estimate_tokens(BATCH_PROMPT)
+    packs: List[List[int]] = []
+    cur: List[int] = []
+    used = base
+    for i, text in enumerate(notes):
+        cost = estimate_tokens(text) + NOTE_HEADER_TOKENS + OUTPUT_TOKENS_PER_NOTE
+        if cur and (used + cost > token_budget or len(cur) >= max_notes):
+            packs.append(cur)
+            cur, used = [], base
+        cur.append(i)
+        used += cost
+    if cur:
+        packs.append(cur)
+    return packs
+
+def _llm_extract_packed(notes: List[str]) -> Dict[int, Dict[str, Any]]:
+    """
+    One request for several notes. Returns validated summaries by position;
+    notes the reply omits or gets wrong are simply absent. Raises when the
+    request or the reply as a whole fails.
+    """
+    prompt = BATCH_PROMPT + "".join(f"\n=== NOTE {i} ===\n{text.strip()}\n" for i, text in enumerate(notes))
+    text = _get_client().generate(
+        prompt,
+        generation_config={"response_mime_type": "application/json"},
+        output_tokens=OUTPUT_TOKENS_PER_NOTE * len(notes),
+    ) or "[]"
+    items = _parse_json(text, "[]")
+    if isinstance(items, dict):  # tolerate {"results": [...]} or {"0": {...}, ...}
+        items = items.get("results") or [{"note_id": k, "summary": v} for k, v in items.items()]
+    out: Dict[int, Dict[str, Any]] = {}
+    for item in items:
+        try:
+            i = int(str(item["note_id"]).strip())
+            if 0 <= i < len(notes) and i not in out:
+                out[i] = _validate(item["summary"])
+        except Exception:
+            continue  # that note gets retried on its own
+    return out
+
+def _extract_pack(notes: List[str], sent: List[str], keys: List[str], cache: ExtractionCache | None) -> List[Dict[str, Any]]:
     try:
-        model = _get_model()
-        resp = model.generate_content(
-            SYSTEM_PROMPT + "\n\nCLINICAL NOTE:\n" + note_text,
-            generation_config={"response_mime_type": "application/json"},
-        )
-        text = resp.text or "{}"
+        got = _llm_extract_packed(sent)
+        _bump(_batch_counts, "packs")
+        _bump(_batch_counts, "packed_notes", len(got))
+    except CircuitOpenError:
+        got = {}  # the single path degrades each note to regex
+    except LLMUnavailableError:
+        raise
+    except Exception:
+        # The whole reply was unusable (e.g. truncated JSON): halve and try again
+        if len(notes) > 1:
+            _bump(_batch_counts, "pack_splits")
+            mid = len(notes) // 2
+            return (_extract_pack(notes[:mid], sent[:mid], keys[:mid], cache)
+                    + _extract_pack(notes[mid:], sent[mid:], keys[mid:], cache))
+        got = {}
+    out = []
+    for i, text in enumerate(notes):
+        if i in got:
+            if cache is not None:
+                cache.put(keys[i], got[i])
+            out.append(got[i])
+        else:
+            _bump(_batch_counts, "single_retries")
+            out.append(extract_patient_summary(text))
+    return out
+
+def extract_patient_summaries(notes: List[str], *, token_budget: int | None = None, max_notes: int | None = None,
+                              workers: int = 4, return_exceptions: bool = False) -> List[Any]:
+    """
+    Batch counterpart of extract_patient_summary: one summary per note, in
+    order. Cached (by either path) and duplicate notes are resolved first; the rest are packed
+    into as few requests as the token budget allows (sent `workers` at a
+    time through the shared rate-limited client). Notes a packed reply drops
+    or garbles are extracted on their own, with the usual regex fallback.
+
+    With return_exceptions=True a note whose extraction raised (e.g.
+    LLMUnavailableError) gets the exception in its slot instead of failing
+    the whole batch.
+    """
+    cache = default_extraction_cache()
+    keys = [_cache_key(n) for n in notes]
+    results: List[Any] = [None] * len(notes)
+    todo: Dict[str, List[int]] = {}  # key -> positions sharing that note
+    for pos, key in enumerate(keys):
+        hit = cache.get(key) if cache is not None and key not in todo else None
+        if hit is not None:
+            results[pos] = hit
+        else:
+            todo.setdefault(key, []).append(pos)
+    uniq = list(todo)
+    texts = [notes[todo[k][0]] for k in uniq]
+    sent = [_prepare(t) for t in texts]
+    packs = pack_notes(sent, token_budget or EXTRACT_BATCH_TOKENS, max_notes or EXTRACT_BATCH_MAX_NOTES)
+
+    def run(pack: List[int]):
         try:
-            data = json.loads(text)
-        except json.JSONDecodeError:
-            start = text.find("{"); end = text.rfind("}")
-            if start != -1 and end != -1:
-                data = json.loads(text[start:end+1])
-            else:
+            return _extract_pack([texts[j] for j in pack], [sent[j] for j in pack], [uniq[j] for j in pack], cache)
+        except Exception as e:
+            if not return_exceptions:
                 raise
-        
-        # Validate with pydantic if available, otherwise return as-is
-        if HAS_SCHEMAS and PatientSummary:
-            summary = PatientSummary.model_validate(data)
-            return json.loads(summary.model_dump_json())
-        else:
-            return data
-            
-    except ResourceExhausted:
-        # Quota exhausted → fallback to regex
-        return _regex_extract(note_text)
-    except Exception:
-        # Any other transient issue → fallback too (you can log if desired)
-        return _regex_extract(note_text)
\ No newline at end of file
+            return [e] * len(pack)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(packs) or 1))) as pool:
+        for pack, outs in zip(packs, pool.map(run, packs)):
+            for j, res in zip(pack, outs):
+                positions = todo[uniq[j]]
+                for n, pos in enumerate(positions):
+                    # Duplicates get their own copy, since callers mutate summaries
+                    results[pos] = res if n == 0 or isinstance(res, Exception) else copy_summary(res)
+    return results
+
+def extraction_stats() -> Dict[str, Any]:
+    cache = default_extraction_cache()
+    out: Dict[str, Any] = cache.stats() if cache is not None else {"enabled": False}
+    out["merged_in_flight"] = _inflight.merged
+    out["in_flight"] = _inflight.in_flight()
+    out["regex_fallbacks"] = dict(_fallbacks)
+    out["batch"] = dict(_batch_counts)
+    t = dict(_trim_counts)
+    t["saved_pct"] = round(100.0 * (1 - t["tokens_out"] / t["tokens_in"]), 1) if t["tokens_in"] else 0.0
+    out["note_trim"] = t
+    out["llm"] = _client.stats() if _client is not None else None
+    return out
@@ -1,28 +1,248 @@
 from __future__ import annotations
-import os
-from typing import List
+import os, random, time, itertools, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 import google.generativeai as genai
+from google.api_core.exceptions import ResourceExhausted
 
-class Embedder:
-    """
-    Gemini-based embedder (free tier friendly).
-    Uses models/text-embedding-004 by default.
-    Reads GEMINI_API_KEY from .env or environment.
-    """
-    def __init__(self, model: str | None = None):
+from rag.embedding_cache import EmbeddingCache, cache_key, default_embedding_cache
+
+DEFAULT_EMBED_MODEL = "models/text-embedding-004"
+DEFAULT_LOCAL_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# ---------- Backends ----------
+# A backend is a callable (model, texts, task_type) -> one vector per text, in
+# order (lists or a 2-D float32 array), plus a few class attributes the
+# Embedder reads: `kind`, default `model`, `max_batch`, `concurrent` (whether
+# several requests may be in flight at once) and `cache_by_default`.
+
+def _gemini_embed_batch(model: str, texts: List[str], task_type: str) -> List[List[float]]:
+    # embed_content accepts a list and returns {"embedding": [[...], ...]}
+    resp = genai.embed_content(model=model, content=texts, task_type=task_type)
+    return resp["embedding"]
+
+class GeminiBackend:
+    """Remote Gemini embeddings. Reads GEMINI_API_KEY from .env or environment."""
+    kind = "gemini"
+    model = DEFAULT_EMBED_MODEL
+    max_batch = 100          # Gemini caps batch embedding requests at 100 texts
+    concurrent = True
+    cache_by_default = True
+    known_dims = {"models/text-embedding-004": 768, "models/embedding-001": 768}
+
+    def __init__(self):
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY not set in .env (or environment)")
         genai.configure(api_key=api_key)
-        self.model = model or "models/text-embedding-004"
+
+    def __call__(self, model: str, texts: List[str], task_type: str) -> List[List[float]]:
+        return _gemini_embed_batch(model, texts, task_type)
+
+class SentenceTransformerBackend:
+    """
+    In-process CPU embeddings with sentence-transformers. The model is loaded
+    once per process (on first use) and shared by every backend instance;
+    `threads` (or EMBED_THREADS) caps torch's intra-op thread pool.
+    Vectors come back L2-normalized as a float32 array.
+    """
+    kind = "local"
+    model = DEFAULT_LOCAL_MODEL
+    max_batch = 64
+    concurrent = False       # torch already parallelizes one batch across cores
+    cache_by_default = True
+
+    _models: Dict[str, Any] = {}
+    _load_lock = threading.Lock()
+
+    def __init__(self, threads: int | None = None, device: str = "cpu"):
+        self.threads = threads or (int(os.getenv("EMBED_THREADS")) if os.getenv("EMBED_THREADS") else None)
+        self.device = device
+
+    def load(self, model: str):
+        with self._load_lock:
+            st = self._models.get(model)
+            if st is None:
+                import torch
+                from sentence_transformers import SentenceTransformer
+                if self.threads:
+                    torch.set_num_threads(self.threads)
+                st = self._models[model] = SentenceTransformer(model, device=self.device)
+            return st
+
+    def dimension(self, model: str) -> int:
+        return int(self.load(model).get_sentence_embedding_dimension())
+
+    def __call__(self, model: str, texts: List[str], task_type: str):
+        import numpy as np
+        st = self.load(model)
+        embs = st.encode(texts, batch_size=self.max_batch, convert_to_numpy=True,
+                         normalize_embeddings=True, show_progress_bar=False)
+        return embs.astype(np.float32, copy=False)
+
+class FakeEmbedBackend:
+    """
+    Deterministic local stand-in for the embedding service (tests / benchmarks).
+    Simulates per-request + per-text latency and, optionally, a quota error on
+    every `exhaust_every`-th request.
+    """
+    kind = "fake"
+    model = "fake"
+    max_batch = 100
+    concurrent = True
+    cache_by_default = False
+
+    def __init__(self, dim: int = 768, latency_s: float = 0.0, per_text_s: float = 0.0, exhaust_every: int = 0):
+        self.dim = dim
+        self.latency_s = latency_s
+        self.per_text_s = per_text_s
+        self.exhaust_every = exhaust_every
+        self._counter = itertools.count(1)
+        self.calls = 0
+
+    def dimension(self, model: str) -> int:
+        return self.dim
+
+    def _vector(self, text: str) -> List[float]:
+        rng = random.Random(text)
+        return [rng.uniform(-1.0, 1.0) for _ in range(self.dim)]
+
+    def __call__(self, model: str, texts: List[str], task_type: str) -> List[List[float]]:
+        self.calls = n = next(self._counter)  # atomic under concurrent callers
+        if self.exhaust_every and n % self.exhaust_every == 0:
+            raise ResourceExhausted("fake quota exhausted")
+        time.sleep(self.latency_s + self.per_text_s * len(texts))
+        return [self._vector(t) for t in texts]
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "local": SentenceTransformerBackend,
+    "fake": FakeEmbedBackend,
+}
+
+def configured_backend() -> Tuple[str, str]:
+    """(backend kind, model) selected by EMBED_BACKEND / EMBED_MODEL, without constructing anything."""
+    kind = os.getenv("EMBED_BACKEND", "gemini").lower()
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown EMBED_BACKEND '{kind}' (expected one of {sorted(BACKENDS)})")
+    return kind, os.getenv("EMBED_MODEL") or BACKENDS[kind].model
+
+# ---------- Embedder ----------
+class Embedder:
+    """
+    Batched, cached front end over a pluggable embedding backend.
+    Defaults to Gemini (models/text-embedding-004); see get_embedder() for
+    the EMBED_BACKEND-driven factory.
+
+    Texts are sent in batches of `batch_size` per request, with up to
+    `max_workers` requests in flight for backends that allow it. Batches that
+    hit ResourceExhausted are retried with exponential backoff.
+
+    Gemini and local embedders share the process-wide EmbeddingCache by
+    default, so texts already embedded (by this or an earlier run) are not
+    re-computed; fakes stay uncached unless a cache is passed explicitly.
+    """
+    def __init__(
+        self,
+        model: str | None = None,
+        *,
+        task_type: str = "retrieval_document",
+        batch_size: int | None = None,
+        max_workers: int | None = None,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backend=None,
+        cache: Optional[EmbeddingCache] | bool = True,
+    ):
+        if backend is None:
+            backend = GeminiBackend()
+        if cache is True:
+            cache = default_embedding_cache() if getattr(backend, "cache_by_default", False) else None
+        self.cache: Optional[EmbeddingCache] = cache or None
+        self._backend = backend
+        self.kind = getattr(backend, "kind", "custom")
+        self.model = model or getattr(backend, "model", None) or DEFAULT_EMBED_MODEL
+        self.task_type = task_type
+        self.batch_size = max(1, batch_size or int(os.getenv("EMBED_BATCH_SIZE", str(getattr(backend, "max_batch", 100)))))
+        if not getattr(backend, "concurrent", True):
+            max_workers = 1
+        self.max_workers = max(1, max_workers or int(os.getenv("EMBED_CONCURRENCY", "4")))
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._dim: Optional[int] = None
+
+    @property
+    def dim(self) -> int:
+        """Embedding dimension; asks the backend, or embeds a probe string once if it cannot say."""
+        if self._dim is None:
+            known = getattr(self._backend, "known_dims", {}).get(self.model)
+            if known:
+                self._dim = known
+            elif hasattr(self._backend, "dimension"):
+                self._dim = int(self._backend.dimension(self.model))
+            else:
+                self._dim = len(self.embed_texts(["dimension probe"])[0])
+        return self._dim
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                embs = self._backend(self.model, texts, self.task_type)
+            except ResourceExhausted:
+                if attempt >= self.max_retries:
+                    raise
+                # Exponential backoff with full jitter
+                time.sleep(random.uniform(0, self.backoff_base * (2 ** attempt)))
+                attempt += 1
+                continue
+            if len(embs) != len(texts):
+                raise RuntimeError(f"Embedding backend returned {len(embs)} vectors for {len(texts)} texts")
+            if hasattr(embs, "tolist"):  # float32 ndarray from local backends
+                return embs.tolist()
+            return [list(e) for e in embs]
 
     def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        if self.cache is None:
+            return self._embed_uncached(texts)
+
+        keys = [cache_key(self.model, self.task_type, t) for t in texts]
+        out = self.cache.get_many(keys)
+        # Embed each distinct missing text once
+        missing: Dict[str, str] = {}
+        for k, t, v in zip(keys, texts, out):
+            if v is None:
+                missing.setdefault(k, t)
+        if missing:
+            fresh = dict(zip(missing, self._embed_uncached(list(missing.values()))))
+            self.cache.put_many(fresh)
+            out = [v if v is not None else fresh[k] for k, v in zip(keys, out)]
+        return out
+
+    def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1 or self.max_workers == 1:
+            results = [self._embed_batch(b) for b in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+                # map() preserves input order regardless of completion order
+                results = list(pool.map(self._embed_batch, batches))
         embeddings: List[List[float]] = []
-        for text in texts:
-            resp = genai.embed_content(
-                model=self.model,
-                content=text,
-                task_type="retrieval_document",
-            )
-            embeddings.append(resp["embedding"])
+        for r in results:
+            embeddings.extend(r)
         return embeddings
+
+def get_embedder(kind: str | None = None, model: str | None = None, **kwargs) -> Embedder:
+    """
+    Build the configured Embedder: EMBED_BACKEND = gemini (default) | local | fake,
+    EMBED_MODEL overrides the backend's default model.
+    """
+    env_kind, env_model = configured_backend()
+    kind = (kind or env_kind).lower()
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{kind}' (expected one of {sorted(BACKENDS)})")
+    if model is None:
+        model = env_model if kind == env_kind else BACKENDS[kind].model
+    return Embedder(model, backend=BACKENDS[kind](), **kwargs)
@@ -0,0 +1,94 @@
+from __future__ import annotations
+import os, hashlib, threading
+from array import array
+from typing import Dict, List, Optional
+
+from rag.kv_cache import LRUDict, SqliteLRUStore
+
+def cache_key(model: str, task_type: str, text: str) -> str:
+    h = hashlib.sha256()
+    h.update(model.encode("utf-8")); h.update(b"\x00")
+    h.update(task_type.encode("utf-8")); h.update(b"\x00")
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+def _pack(vec: List[float]) -> bytes:
+    return array("f", vec).tobytes()
+
+def _unpack(blob: bytes) -> List[float]:
+    a = array("f")
+    a.frombytes(blob)
+    return a.tolist()
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed on (model, task_type, sha256(text)).
+    Two tiers: an in-process LRU of decoded vectors, backed by a SQLite file
+    of float32 blobs with size-based LRU eviction. Vectors are stored as
+    float32, so cached values round to single precision.
+    """
+    def __init__(self, path: Optional[str] = None, *, max_memory_items: int = 20_000, max_disk_bytes: Optional[int] = None):
+        path = path or os.getenv("EMBED_CACHE_PATH", os.path.join(".cache", "embeddings.sqlite"))
+        max_disk_bytes = max_disk_bytes or int(os.getenv("EMBED_CACHE_MAX_MB", "512")) * 1024 * 1024
+        self.memory = LRUDict(max_items=max_memory_items)
+        self.disk = SqliteLRUStore(path, table="embeddings", max_bytes=max_disk_bytes)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        out: List[Optional[List[float]]] = [None] * len(keys)
+        pending: Dict[str, List[int]] = {}
+        mem_hits = 0
+        for i, k in enumerate(keys):
+            v = self.memory.get(k)
+            if v is not None:
+                out[i] = v
+                mem_hits += 1
+            else:
+                pending.setdefault(k, []).append(i)
+        disk_hits = 0
+        if pending:
+            for k, blob in self.disk.get_many(list(pending)).items():
+                vec = _unpack(blob)
+                self.memory.put(k, vec)
+                for i in pending[k]:
+                    out[i] = vec
+                    disk_hits += 1
+        with self._lock:
+            self.memory_hits += mem_hits
+            self.disk_hits += disk_hits
+            self.misses += len(keys) - mem_hits - disk_hits
+        return out
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        for k, v in items.items():
+            self.memory.put(k, v)
+        self.disk.put_many((k, _pack(v)) for k, v in items.items())
+
+    def stats(self) -> Dict[str, float]:
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (hits / total) if total else 0.0,
+            "memory_items": len(self.memory),
+            "disk_bytes": self.disk.nbytes,
+            "disk_evictions": self.disk.evictions,
+        }
+
+_default_cache: Optional[EmbeddingCache] = None
+_default_lock = threading.Lock()
+
+def default_embedding_cache() -> Optional[EmbeddingCache]:
+    """Process-wide cache shared by every Embedder; EMBED_CACHE=0 disables it."""
+    global _default_cache
+    if os.getenv("EMBED_CACHE", "1").lower() in ("0", "false", "no"):
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache()
+        return _default_cache
@@ -0,0 +1,99 @@
+from __future__ import annotations
+import os, json, hashlib, threading
+from typing import Any, Dict, Optional
+
+from rag.kv_cache import LRUDict, SqliteLRUStore
+
+# Bump when the stored summary shape changes (e.g. PatientSummary fields)
+EXTRACTION_CACHE_VERSION = 1
+
+def normalize_note(note_text: str) -> str:
+    """Resubmissions often differ only in line endings or surrounding whitespace."""
+    return note_text.replace("\r\n", "\n").strip()
+
+def extraction_key(model: str, prompt: str, note_text: str) -> str:
+    h = hashlib.sha256()
+    h.update(f"v{EXTRACTION_CACHE_VERSION}".encode()); h.update(b"\x00")
+    h.update(model.encode("utf-8")); h.update(b"\x00")
+    h.update(hashlib.sha256(prompt.encode("utf-8")).digest()); h.update(b"\x00")
+    h.update(normalize_note(note_text).encode("utf-8"))
+    return h.hexdigest()
+
+def copy_summary(summary: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Independent copy of a summary dict in the PatientSummary shape (scalars
+    and lists of flat dicts): two levels deep, several times cheaper than
+    copy.deepcopy or a JSON round-trip.
+    """
+    return {k: [dict(x) if type(x) is dict else x for x in v] if type(v) is list else v for k, v in summary.items()}
+
+class ExtractionCache:
+    """
+    Validated patient summaries keyed on (model, prompt hash, note content).
+    Two tiers like EmbeddingCache: an in-process LRU of summary dicts and a
+    SQLite file of JSON blobs with size-based LRU eviction. get() returns a
+    copy_summary() of the stored dict, so callers may mutate what they
+    receive; only disk hits are decoded.
+    """
+    def __init__(self, path: Optional[str] = None, *, max_memory_items: int = 2_000, max_disk_bytes: Optional[int] = None):
+        path = path or os.getenv("EXTRACT_CACHE_PATH", os.path.join(".cache", "extractions.sqlite"))
+        max_disk_bytes = max_disk_bytes or int(os.getenv("EXTRACT_CACHE_MAX_MB", "64")) * 1024 * 1024
+        self.memory = LRUDict(max_items=max_memory_items)
+        self.disk = SqliteLRUStore(path, table="extractions", max_bytes=max_disk_bytes)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str, record: bool = True) -> Optional[Dict[str, Any]]:
+        summary = self.memory.get(key)
+        tier = "memory"
+        if summary is None:
+            blob = self.disk.get_many([key]).get(key)
+            tier = "disk"
+            if blob is not None:
+                summary = json.loads(blob)
+                self.memory.put(key, summary)
+        if record:
+            self._record(summary, tier)
+        return copy_summary(summary) if summary is not None else None
+
+    def _record(self, summary: Optional[Dict[str, Any]], tier: str) -> None:
+        with self._lock:
+            if summary is None:
+                self.misses += 1
+            elif tier == "memory":
+                self.memory_hits += 1
+            else:
+                self.disk_hits += 1
+
+    def put(self, key: str, summary: Dict[str, Any]) -> None:
+        blob = json.dumps(summary, separators=(",", ":")).encode("utf-8")
+        self.memory.put(key, copy_summary(summary))  # the caller keeps (and may mutate) its own
+        self.disk.put_many([(key, blob)])
+
+    def stats(self) -> Dict[str, float]:
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (hits / total) if total else 0.0,
+            "memory_items": len(self.memory),
+            "disk_bytes": self.disk.nbytes,
+            "disk_evictions": self.disk.evictions,
+        }
+
+_default_cache: Optional[ExtractionCache] = None
+_default_lock = threading.Lock()
+
+def default_extraction_cache() -> Optional[ExtractionCache]:
+    """Process-wide cache used by extract_patient_summary; EXTRACT_CACHE=0 disables it."""
+    global _default_cache
+    if os.getenv("EXTRACT_CACHE", "1").lower() in ("0", "false", "no"):
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ExtractionCache()
+        return _default_cache
@@ -0,0 +1,70 @@
+from __future__ import annotations
+import os, json, hashlib
+from typing import Any, Dict, List
+
+MANIFEST_VERSION = 1
+
+def file_sha256(path: str, bufsize: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            b = f.read(bufsize)
+            if not b:
+                break
+            h.update(b)
+    return h.hexdigest()
+
+def manifest_path(persist_dir: str | None = None) -> str:
+    return os.path.join(persist_dir or os.getenv("CHROMA_DIR", ".chroma"), "index_manifest.json")
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    """
+    {"version": 1, "files": {source: {"sha256", "size", "mtime_ns", "params", "chunk_ids"}}}
+    `params` holds whatever affects the stored chunks (chunker settings,
+    embedding model); a change there forces a re-index of that file.
+    """
+    if not os.path.exists(path):
+        return {"version": MANIFEST_VERSION, "files": {}}
+    with open(path) as f:
+        data = json.load(f)
+    data.setdefault("files", {})
+    return data
+
+def save_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def file_entry(path: str, params: Dict[str, Any], chunk_ids: List[str]) -> Dict[str, Any]:
+    st = os.stat(path)
+    return {
+        "sha256": file_sha256(path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "params": params,
+        "chunk_ids": chunk_ids,
+    }
+
+def diff_manifest(manifest: Dict[str, Any], sources: List[str], params: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Classify sources against the manifest: new / changed / unchanged, plus manifest entries whose file is gone."""
+    files = manifest.get("files", {})
+    out: Dict[str, List[str]] = {"new": [], "changed": [], "unchanged": [], "deleted": []}
+    for src in sources:
+        entry = files.get(src)
+        if entry is None:
+            out["new"].append(src)
+            continue
+        if entry.get("params") != params:
+            out["changed"].append(src)
+            continue
+        st = os.stat(src)
+        # Same size + mtime → trust the recorded hash; otherwise re-hash (a touch alone is not a change)
+        if (entry.get("size"), entry.get("mtime_ns")) == (st.st_size, st.st_mtime_ns) or entry.get("sha256") == file_sha256(src):
+            out["unchanged"].append(src)
+        else:
+            out["changed"].append(src)
+    present = set(sources)
+    out["deleted"] = sorted(s for s in files if s not in present)
+    return out
@@ -0,0 +1,94 @@
+from __future__ import annotations
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+from rag.pipeline import Stage, StageStats, batched, run_pipeline
+from rag.policy_loader import iter_page_ranges
+
+def ingest_pdfs(
+    paths: List[str],
+    *,
+    chunk_fn: Callable[[Iterable[Dict]], Iterable[Dict]],
+    embedder,
+    write_fn: Callable[[str, List[Dict], List[List[float]]], None],
+    finish_fn: Callable[[str, int, List[str]], Any],
+    parse_workers: int = 4,
+    embed_workers: int = 2,
+    pages_per_task: int = 32,
+    batch_size: int = 256,
+    queue_size: int = 4,
+    stats: Dict[str, StageStats] | None = None,
+) -> Iterator[Any]:
+    """
+    parse → chunk → embed → write, connected by bounded queues so CPU-bound
+    PDF parsing (process pool when parse_workers > 1) overlaps with
+    network-bound embedding.
+
+    Pages and chunks are streamed: chunk_fn consumes an iterable of pages
+    (e.g. rag.chunker.iter_chunks) and its chunks travel in batches of
+    `batch_size`, so peak memory depends on batch_size / pages_per_task /
+    queue_size, not on document length.
+
+    write_fn(path, chunks, embeddings) stores one batch. finish_fn(path,
+    n_pages, chunk_ids) runs once all of a file's batches are written; its
+    return value is yielded. Both run on a single thread, so they may update
+    shared state (collection, manifest) freely. Failed batches come back as
+    StageFailure; their file is never finished.
+    """
+    parse_stats = StageStats("parse", parse_workers)
+
+    def source():
+        sent: Dict[str, int] = {}
+        n_pages: Dict[str, int] = {}
+        it = iter_page_ranges(paths, workers=parse_workers, pages_per_task=pages_per_task)
+        while True:
+            t0 = time.perf_counter()
+            nxt = next(it, None)
+            if nxt is None:
+                return
+            # Time the feeder spent waiting on parsing (parallel when parse_workers > 1)
+            parse_stats.record(time.perf_counter() - t0, True)
+            path, pages = nxt
+            if pages is None:
+                yield {"path": path, "eof": True, "batches": sent.pop(path, 0), "pages": n_pages.pop(path, 0)}
+                continue
+            n_pages[path] = n_pages.get(path, 0) + len(pages)
+            for batch in batched(chunk_fn(pages), batch_size):
+                sent[path] = sent.get(path, 0) + 1
+                yield {"path": path, "chunks": batch}
+
+    def embed(rec):
+        if not rec.get("eof"):
+            rec["embeddings"] = embedder.embed_texts([c["text"] for c in rec["chunks"]])
+        return rec
+
+    # Batches of one file can reach the writer out of order (several embed
+    # workers), so a file is finished once its eof marker and all of its
+    # announced batches have been seen.
+    written: Dict[str, List[str]] = {}
+    received: Dict[str, int] = {}
+    expected: Dict[str, tuple] = {}
+
+    def write(rec):
+        path = rec["path"]
+        if rec.get("eof"):
+            expected[path] = (rec["batches"], rec["pages"])
+        else:
+            write_fn(path, rec["chunks"], rec["embeddings"])
+            written.setdefault(path, []).extend(c["id"] for c in rec["chunks"])
+            received[path] = received.get(path, 0) + 1
+        if path in expected and received.get(path, 0) == expected[path][0]:
+            n_pages = expected.pop(path)[1]
+            received.pop(path, None)
+            return finish_fn(path, n_pages, written.pop(path, []))
+        return None
+
+    stages = [
+        Stage("embed", embed, embed_workers),
+        Stage("write", write, 1),
+    ]
+    if stats is not None:
+        stats["parse"] = parse_stats
+    for out in run_pipeline(source(), stages, queue_size=queue_size, stats=stats):
+        if out is not None:
+            yield out
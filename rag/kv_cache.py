@@ -0,0 +1,160 @@
+from __future__ import annotations
+import os, sqlite3, threading, time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+class LRUDict:
+    """Small thread-safe in-process LRU map with an item cap."""
+    def __init__(self, max_items: int = 10_000):
+        self.max_items = max_items
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class SqliteLRUStore:
+    """
+    On-disk key -> bytes store backed by one SQLite table.
+    Tracks last access time and evicts least-recently-used rows once the
+    stored payload exceeds `max_bytes` (down to ~90% of the cap).
+    """
+    def __init__(self, path: str, table: str = "kv", max_bytes: int = 512 * 1024 * 1024):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self.table = table
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, nbytes INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_used ON {table}(last_used)")
+        row = self._conn.execute(f"SELECT COALESCE(SUM(nbytes), 0) FROM {table}").fetchone()
+        self._bytes = int(row[0])
+        self.evictions = 0
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        if not keys:
+            return {}
+        found: Dict[str, bytes] = {}
+        now = time.time()
+        with self._lock:
+            # SQLite's default variable limit is 999; stay well under it
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                marks = ",".join("?" * len(part))
+                for k, v in self._conn.execute(f"SELECT key, value FROM {self.table} WHERE key IN ({marks})", part):
+                    found[k] = v
+            if found:
+                self._conn.executemany(
+                    f"UPDATE {self.table} SET last_used=? WHERE key=?", [(now, k) for k in found]
+                )
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, bytes]]) -> None:
+        rows = [(k, v, len(v), time.time()) for k, v in items]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for k, _, _, _ in rows:
+                old = self._conn.execute(f"SELECT nbytes FROM {self.table} WHERE key=?", (k,)).fetchone()
+                if old:
+                    self._bytes -= int(old[0])
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table}(key, value, nbytes, last_used) VALUES (?,?,?,?)", rows
+            )
+            self._conn.execute("COMMIT")
+            self._bytes += sum(r[2] for r in rows)
+            if self._bytes > self.max_bytes:
+                self._evict_locked(int(self.max_bytes * 0.9))
+
+    def _evict_locked(self, target: int) -> None:
+        cur = self._conn.execute(f"SELECT key, nbytes FROM {self.table} ORDER BY last_used ASC")
+        doomed: List[str] = []
+        freed = 0
+        for k, n in cur:
+            if self._bytes - freed <= target:
+                break
+            doomed.append(k)
+            freed += int(n)
+        cur.close()
+        self._conn.executemany(f"DELETE FROM {self.table} WHERE key=?", [(k,) for k in doomed])
+        self._bytes -= freed
+        self.evictions += len(doomed)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0])
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class SingleFlight:
+    """
+    Merge concurrent calls for the same key: the first caller runs `fn`, the
+    others block and receive its result (or its exception), passed through
+    `share` when given (e.g. a copy, for mutable results). Nothing is kept
+    once the call finishes; pair it with a cache for that.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self.merged = 0
+
+    def do(self, key: str, fn: Callable[[], Any], share: Optional[Callable[[Any], Any]] = None) -> Any:
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[key] = Future()
+            else:
+                self.merged += 1
+        if not leader:
+            res = fut.result()
+            return share(res) if share is not None else res
+        try:
+            res = fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(res)
+            return res
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,219 @@
+from __future__ import annotations
+import os, re, json, threading, time
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+from rag.numpy_store import pack_strings, unpack_strings, pack_columns, unpack_columns, where_mask
+
+# Keeps codes and thresholds intact: "HbA1c ≥ 8.5%" → hba1c, 8.5 ; "HCPCS E2103" → hcpcs, e2103
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+STOPWORDS = frozenset(
+    "a an and are as at be been by for from has have if in is it its of on or that the their this to was were which will with".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+class LexicalIndex:
+    """
+    BM25 over chunk texts, stored as a CSR inverted index: per term, the
+    chunks containing it (int32) and their precomputed BM25 term weights
+    (float16), so a query is one vectorized add per query term into a score
+    array, then argpartition. Chunk metadata is kept as dictionary-encoded
+    columns so the same `where` filters as the vector query apply.
+    """
+    def __init__(self, ids: List[str], terms: List[str], indptr: np.ndarray, postings: np.ndarray,
+                 weights: np.ndarray, idf: np.ndarray, columns: Dict[str, Tuple[np.ndarray, List[Any]]]):
+        self.ids = ids
+        self.term_ids = {t: i for i, t in enumerate(terms)}
+        self.indptr = indptr
+        self.postings = postings
+        self.weights = weights
+        self.idf = idf
+        self.columns = columns
+        self._masks: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]],
+              k1: float = 1.2, b: float = 0.75) -> "LexicalIndex":
+        return cls.build_from([(ids, texts, metadatas)], k1, b)
+
+    @classmethod
+    def build_from(cls, pages: Iterable[Tuple[List[str], List[str], List[Dict[str, Any]]]],
+                   k1: float = 1.2, b: float = 0.75) -> "LexicalIndex":
+        """
+        Build from (ids, texts, metadatas) pages, e.g. a collection read with
+        limit/offset. Each page's texts are reduced to term counts and dropped,
+        so only the postings (not the corpus text) are held in memory.
+        """
+        vocab: Dict[str, int] = {}
+        term_col = array("i")
+        doc_col = array("i")
+        tf_col = array("i")
+        lens = array("f")
+        ids: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+        for page_ids, texts, metas in pages:
+            for text in texts:
+                d = len(lens)
+                toks = tokenize(text or "")
+                lens.append(len(toks))
+                for t, c in Counter(toks).items():
+                    term_col.append(vocab.setdefault(t, len(vocab)))
+                    doc_col.append(d)
+                    tf_col.append(c)
+            ids.extend(page_ids)
+            metadatas.extend(metas)
+        doc_len = np.frombuffer(lens, dtype=np.float32) if lens else np.zeros(0, dtype=np.float32)
+        term = np.frombuffer(term_col, dtype=np.int32) if term_col else np.zeros(0, dtype=np.int32)
+        order = np.argsort(term, kind="stable")  # group postings by term; docs stay ascending within a term
+        term = term[order]
+        doc = np.frombuffer(doc_col, dtype=np.int32)[order] if doc_col else term
+        tf = (np.frombuffer(tf_col, dtype=np.int32)[order] if tf_col else term).astype(np.float32)
+        df = np.bincount(term, minlength=len(vocab))
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(df)
+        avgdl = float(doc_len.mean()) if len(ids) and doc_len.mean() > 0 else 1.0
+        weights = tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len[doc] / avgdl))
+        idf = np.log1p((len(ids) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        columns = unpack_columns(pack_columns([m or {} for m in metadatas]))
+        return cls(list(ids), list(vocab), indptr, doc, weights.astype(np.float16), idf, columns)
+
+    # ---------- persistence ----------
+    def save(self, path: str) -> None:
+        arrays = {"indptr": self.indptr, "postings": self.postings, "weights": self.weights, "idf": self.idf}
+        arrays["id_blob"], arrays["id_off"] = pack_strings(self.ids)
+        arrays["term_blob"], arrays["term_off"] = pack_strings(list(self.term_ids))
+        arrays.update(pack_columns(self._metadatas()))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp.npz"  # np.savez insists on the .npz suffix
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with np.load(path) as z:
+            return cls(
+                unpack_strings(z["id_blob"], z["id_off"]),
+                unpack_strings(z["term_blob"], z["term_off"]),
+                z["indptr"], z["postings"], z["weights"], z["idf"],
+                unpack_columns(z),
+            )
+
+    def _metadatas(self) -> List[Dict[str, Any]]:
+        return [{k: vals[codes[i]] for k, (codes, vals) in self.columns.items() if codes[i] >= 0} for i in range(len(self))]
+
+    # ---------- search ----------
+    def _mask(self, where: Dict[str, Any]) -> np.ndarray:
+        key = json.dumps(where, sort_keys=True)
+        mask = self._masks.get(key)
+        if mask is None:
+            if len(self._masks) >= 64:
+                self._masks.pop(next(iter(self._masks)), None)
+            mask = self._masks[key] = where_mask(self.columns, len(self), where)
+        return mask
+
+    def search(self, query: str, k: int = 20, where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """Top-k (chunk id, BM25 score), best first; only chunks sharing a term with the query."""
+        t0 = time.perf_counter()
+        tids = [self.term_ids[t] for t in dict.fromkeys(tokenize(query)) if t in self.term_ids]
+        out: List[Tuple[str, float]] = []
+        if tids and len(self):
+            scores = np.zeros(len(self), dtype=np.float32)
+            for t in tids:
+                s, e = self.indptr[t], self.indptr[t + 1]
+                # Doc ids are unique within a posting list, so fancy-index += is exact
+                scores[self.postings[s:e]] += self.idf[t] * self.weights[s:e]
+            if where:
+                scores[~self._mask(where)] = 0.0
+            cand = np.flatnonzero(scores)
+            if len(cand) > k:
+                cand = cand[np.argpartition(-scores[cand], k - 1)[:k]]
+            cand = cand[np.argsort(-scores[cand])]
+            out = [(self.ids[i], float(scores[i])) for i in cand]
+        ms = (time.perf_counter() - t0) * 1000
+        with self._lock:
+            self.searches += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chunks": len(self),
+            "terms": len(self.term_ids),
+            "postings": int(len(self.postings)),
+            "searches": self.searches,
+            "avg_ms": round(self.total_ms / self.searches, 4) if self.searches else 0.0,
+            "max_ms": round(self.max_ms, 4),
+        }
+
+def rrf_fuse(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Reciprocal-rank fusion: sum of 1 / (k + rank) over the rankings an id appears in, best first."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking, start=1):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda kv: -kv[1])
+
+# ---------- On-disk index next to the vector store ----------
+def lexical_index_path(persist_dir: str | None = None) -> str:
+    return os.path.join(persist_dir or os.getenv("CHROMA_DIR", ".chroma"), "lexical_index.npz")
+
+LEXICAL_PAGE_SIZE = int(os.getenv("LEXICAL_PAGE_SIZE", "2000"))  # chunks read from the collection at a time
+
+def _collection_pages(collection, page_size: int):
+    offset = 0
+    while True:
+        res = collection.get(limit=page_size, offset=offset, include=["documents", "metadatas"])
+        if not res["ids"]:
+            return
+        yield res["ids"], res["documents"], res["metadatas"]
+        if len(res["ids"]) < page_size:
+            return
+        offset += len(res["ids"])
+
+def build_lexical_index(collection, persist_dir: str | None = None, page_size: int = LEXICAL_PAGE_SIZE) -> LexicalIndex:
+    """
+    (Re)build the BM25 index from every chunk in the collection and save it.
+    The collection is read page by page, so peak memory is one page of chunk
+    text plus the postings rather than the whole corpus.
+    """
+    idx = LexicalIndex.build_from(_collection_pages(collection, page_size))
+    idx.save(lexical_index_path(persist_dir))
+    return idx
+
+_loaded: Dict[str, tuple] = {}
+_load_lock = threading.Lock()
+
+def load_lexical_index(persist_dir: str | None = None) -> Optional[LexicalIndex]:
+    """
+    Shared LexicalIndex for the store, reloaded when its file changes (one
+    stat() per call otherwise). None when it has not been built or when
+    LEXICAL_INDEX=0, in which case retrieval is vector-only.
+    """
+    if os.getenv("LEXICAL_INDEX", "1") == "0":
+        return None
+    path = lexical_index_path(persist_dir)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _loaded.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    with _load_lock:
+        cached = _loaded.get(path)
+        if not cached or cached[0] != stamp:
+            _loaded[path] = cached = (stamp, LexicalIndex.load(path))
+    return cached[1]
@@ -0,0 +1,310 @@
+from __future__ import annotations
+import os, re, json, random, time, threading, itertools
+from typing import Any, Callable, Dict, Optional
+from google.api_core import exceptions as gexc
+
+# Errors worth retrying: quota / rate limits and transient server or network trouble
+TRANSIENT_ERRORS = (
+    gexc.ResourceExhausted, gexc.TooManyRequests, gexc.ServiceUnavailable, gexc.InternalServerError,
+    gexc.DeadlineExceeded, gexc.GatewayTimeout, ConnectionError, TimeoutError,
+)
+
+class LLMUnavailableError(RuntimeError):
+    """The model could not be reached (retries exhausted or the rate-limit queue wait was too long)."""
+
+class CircuitOpenError(LLMUnavailableError):
+    """The circuit breaker is open; callers should degrade instead of waiting."""
+
+# ---------- Backends ----------
+# A backend is a callable (prompt, generation_config) -> response text, with a
+# `kind` and default `model`, like the embedding backends in rag.embedder.
+
+class GeminiGenBackend:
+    """Gemini text generation. Reads GEMINI_API_KEY from .env or environment."""
+    kind = "gemini"
+    model = "models/gemini-1.5-flash"
+
+    def __init__(self, model: str | None = None):
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError("GEMINI_API_KEY missing. Add it to .env")
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.model = model or self.model
+        self._model = genai.GenerativeModel(self.model)
+
+    def __call__(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+        return self._model.generate_content(prompt, generation_config=generation_config).text or ""
+
+_NOTE_HEADER_RE = re.compile(r"^=== NOTE (\S+) ===$", re.M)
+
+class FakeLLMBackend:
+    """
+    Deterministic local stand-in for the generation API (tests / benchmarks).
+    By default it answers extraction prompts with the regex extractor's JSON
+    for the text after "CLINICAL NOTE:" (or, for packed prompts, an array
+    with one entry per "=== NOTE <id> ===" section). Simulates latency and,
+    optionally, a quota error on every `exhaust_every`-th call or for
+    `outage_s` seconds after construction.
+    """
+    kind = "fake"
+    model = "fake"
+
+    def __init__(self, model: str | None = None, latency_s: float = 0.0, exhaust_every: int = 0, outage_s: float = 0.0,
+                 respond: Optional[Callable[[str], str]] = None):
+        self.model = model or self.model
+        self.latency_s = latency_s
+        self.exhaust_every = exhaust_every
+        self.outage_until = time.monotonic() + outage_s
+        self.respond = respond or self._extract_note
+        self._counter = itertools.count(1)
+        self.calls = 0
+
+    @staticmethod
+    def _extract_note(prompt: str) -> str:
+        from rag.regex_extractor import default_regex_extractor
+        ex = default_regex_extractor()
+        parts = _NOTE_HEADER_RE.split(prompt)
+        if len(parts) > 1:  # packed prompt: [preamble, id1, note1, id2, note2, ...]
+            return json.dumps([{"note_id": i, "summary": ex.extract(t)} for i, t in zip(parts[1::2], parts[2::2])])
+        note = prompt.rsplit("CLINICAL NOTE:", 1)[-1]
+        return json.dumps(ex.extract(note))
+
+    def __call__(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+        self.calls = n = next(self._counter)  # atomic under concurrent callers
+        if time.monotonic() < self.outage_until or (self.exhaust_every and n % self.exhaust_every == 0):
+            raise gexc.ResourceExhausted("fake quota exhausted")
+        time.sleep(self.latency_s)
+        return self.respond(prompt)
+
+GEN_BACKENDS = {
+    GeminiGenBackend.kind: GeminiGenBackend,
+    FakeLLMBackend.kind: FakeLLMBackend,
+}
+
+# ---------- Rate limiting ----------
+class TokenBucket:
+    """
+    Refills `per_minute` units per minute up to a burst of `per_minute`.
+    Callers reserve first and then sleep off any deficit, so waiters are
+    served in arrival order and the bucket may briefly go negative.
+    """
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float, max_wait_s: float) -> float:
+        """Seconds the caller must wait for `amount`; raises if that exceeds max_wait_s (nothing reserved)."""
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            wait = max(0.0, (amount - self._tokens) / self.rate)
+            if wait > max_wait_s:
+                raise LLMUnavailableError(f"rate limit queue wait {wait:.1f}s exceeds {max_wait_s:g}s")
+            self._tokens -= amount
+            return wait
+
+    def refund(self, amount: float) -> None:
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + min(float(amount), self.capacity))
+
+# ---------- Circuit breaker ----------
+class CircuitBreaker:
+    """
+    closed → open after `threshold` consecutive transient failures; open
+    rejects calls for `cooldown_s`, then half-open lets one probe through:
+    success closes the circuit, a transient failure re-opens it, and any
+    other outcome (non-transient error, rate-limit queue timeout) releases
+    the probe slot so the next caller probes instead.
+    """
+    def __init__(self, threshold: int = 5, cooldown_s: float = 30.0):
+        self.threshold = threshold
+        self.cooldown_s = cooldown_s
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown_s:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def release(self) -> None:
+        """The probe ended without telling us whether the model is back."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                if self.state != "open":
+                    self.opens += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+# ---------- Client ----------
+def estimate_tokens(text: str) -> int:
+    """Cheap prompt-size estimate (~4 chars per token) for rate limiting and request packing."""
+    return max(1, len(text) // 4)
+
+class LLMClient:
+    """
+    Shared, thread-safe front for a generation backend: requests-per-minute
+    and tokens-per-minute buckets (callers queue, bounded by
+    `max_queue_wait_s`), retries on transient errors with exponential
+    backoff and full jitter, and a circuit breaker that fails fast with
+    CircuitOpenError while the model is down.
+    """
+    def __init__(
+        self,
+        backend: Callable[[str, Optional[Dict[str, Any]]], str],
+        *,
+        rpm: float = 15,
+        tpm: float = 1_000_000,
+        output_tokens: int = 1024,
+        max_retries: int = 4,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        breaker_threshold: int = 5,
+        breaker_cooldown_s: float = 30.0,
+        max_queue_wait_s: float = 60.0,
+    ):
+        self.backend = backend
+        self.model = getattr(backend, "model", "")
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.output_tokens = output_tokens
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown_s)
+        self.max_queue_wait_s = max_queue_wait_s
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.max_queued = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.short_circuited = 0
+        self.queue_wait_s = 0.0
+        self.prompt_tokens = 0
+
+    def _wait_turn(self, prompt: str, output_tokens: int) -> None:
+        est = estimate_tokens(prompt) + output_tokens
+        wait = self.requests.reserve(1, self.max_queue_wait_s)
+        try:
+            wait = max(wait, self.tokens.reserve(est, self.max_queue_wait_s))
+        except LLMUnavailableError:
+            self.requests.refund(1)
+            raise
+        if wait > 0:
+            with self._lock:
+                self.queued += 1
+                self.max_queued = max(self.max_queued, self.queued)
+            try:
+                time.sleep(wait)
+            finally:
+                with self._lock:
+                    self.queued -= 1
+                    self.queue_wait_s += wait
+
+    def generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+                 output_tokens: Optional[int] = None) -> str:
+        """Response text; `output_tokens` is the expected reply size reserved against the TPM budget."""
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                with self._lock:
+                    self.short_circuited += 1
+                raise CircuitOpenError("LLM circuit open")
+            try:
+                self._wait_turn(prompt, self.output_tokens if output_tokens is None else output_tokens)
+            except BaseException:
+                self.breaker.release()
+                raise
+            with self._lock:
+                self.in_flight += 1
+                self.calls += 1
+                self.prompt_tokens += estimate_tokens(prompt)
+            try:
+                text = self.backend(prompt, generation_config)
+            except TRANSIENT_ERRORS as e:
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    with self._lock:
+                        self.failures += 1
+                    raise LLMUnavailableError(f"{type(e).__name__}: {e}") from e
+                with self._lock:
+                    self.retries += 1
+                # Exponential backoff with full jitter
+                time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt))))
+                attempt += 1
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+            self.breaker.record_success()
+            return text
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "model": self.model,
+                "queued": self.queued,
+                "max_queued": self.max_queued,
+                "in_flight": self.in_flight,
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "retries": self.retries,
+                "failures": self.failures,
+                "short_circuited": self.short_circuited,
+                "queue_wait_s": round(self.queue_wait_s, 3),
+                "breaker": self.breaker.state,
+                "breaker_opens": self.breaker.opens,
+            }
+
+def client_from_env(model: str | None = None) -> LLMClient:
+    """
+    LLMClient configured from env: LLM_BACKEND (gemini|fake), LLM_RPM,
+    LLM_TPM, LLM_MAX_RETRIES, LLM_BREAKER_THRESHOLD, LLM_BREAKER_COOLDOWN_S,
+    LLM_QUEUE_TIMEOUT_S.
+    """
+    kind = os.getenv("LLM_BACKEND", "gemini").lower()
+    if kind not in GEN_BACKENDS:
+        raise ValueError(f"Unknown LLM_BACKEND '{kind}' (expected one of {sorted(GEN_BACKENDS)})")
+    return LLMClient(
+        GEN_BACKENDS[kind](model),
+        rpm=float(os.getenv("LLM_RPM", "15")),
+        tpm=float(os.getenv("LLM_TPM", "1000000")),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+        breaker_threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+        breaker_cooldown_s=float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30")),
+        max_queue_wait_s=float(os.getenv("LLM_QUEUE_TIMEOUT_S", "60")),
+    )
@@ -0,0 +1,128 @@
+from __future__ import annotations
+import os, re
+from typing import Any, Dict, List, Optional, Tuple
+
+from rag.llm_client import estimate_tokens
+from rag.regex_extractor import default_regex_extractor
+
+# Section header names (lowercased, without the colon) → kind. Kinds listed in
+# RELEVANT_KINDS are always sent to the model; "narrative" sections are sent
+# whole, or thinned to their clinical lines (see NOTE_TRIM_NARRATIVE).
+SECTION_HEADERS: Dict[str, str] = {
+    **{h: "diagnosis" for h in ("assessment", "assessment and plan", "assessment/plan", "a/p", "diagnosis", "diagnoses",
+                                "problem list", "problems", "impression", "active problems")},
+    **{h: "labs" for h in ("labs", "recent labs", "lab results", "laboratory", "laboratory results", "results")},
+    **{h: "meds" for h in ("medications", "meds", "current medications", "medication list", "home medications")},
+    **{h: "vitals" for h in ("vitals", "vital signs")},
+    **{h: "rationale" for h in ("plan", "chief complaint", "reason for visit", "reason for referral", "rationale",
+                                "medical necessity", "request")},
+    **{h: "narrative" for h in ("history of present illness", "hpi", "interval history", "subjective", "social history",
+                                "family history", "past surgical history", "review of systems", "ros", "physical exam",
+                                "exam", "objective", "counseling", "education")},
+}
+# Highest priority first; when the kept text exceeds the budget, sections are
+# dropped from the end of this list, up to but not including the first kind.
+# The preamble (patient header) is always kept.
+RELEVANT_KINDS = ["diagnosis", "labs", "meds", "vitals", "rationale"]
+
+NOTE_TOKEN_BUDGET = int(os.getenv("NOTE_TOKEN_BUDGET", "1500"))
+# "keep": narrative sections are sent whole and only thinned when the note is
+# over budget; "salvage": always thinned to lines mentioning clinical vocabulary
+NOTE_TRIM_NARRATIVE = os.getenv("NOTE_TRIM_NARRATIVE", "keep").lower()
+
+# Stems of anti-diabetic drug classes, so narrative lines about meds the rule
+# files do not name (glipizide, semaglutide, empagliflozin...) are kept
+DRUG_STEMS = [r"\w*(?:formin|gliptin|glutide|gliflozin|glitazone|glinide|tirzepatide|pramlintide)",
+              r"gl[iy](?:pizide|buride|mepiride|clazide)"]
+CLINICAL_TERMS = ["diabet", "hypoglyc", "hyperglyc", "glucose", "a1c", "dka", "ketoacidosis", "cgm", "dexcom", "libre"]
+
+_vocab: Optional[re.Pattern] = None
+
+def clinical_vocabulary() -> re.Pattern:
+    """
+    Pattern for lines worth keeping from narrative: the eligibility rules'
+    diagnosis phrases, med keywords and lab aliases, the lab catalog's names
+    and synonyms, anti-diabetic drug stems and a few general terms.
+    """
+    global _vocab
+    if _vocab is None:
+        from app.lab_catalog import LAB_CATALOG
+        from app.rule_engine import default_rule_engine
+        words = set(default_rule_engine().keywords()) | set(CLINICAL_TERMS)
+        for canonical, entry in LAB_CATALOG.items():
+            words.update(n.lower() for n in [canonical, *entry.get("synonyms", [])])
+        alts = [re.escape(w) for w in sorted(words, key=len, reverse=True)] + DRUG_STEMS
+        _vocab = re.compile(r"\b(?:" + "|".join(alts) + ")", re.I)
+    return _vocab
+
+_HEADER_RE = re.compile(r"^\s*([A-Za-z][A-Za-z /&()\-]{0,40}?)\s*:(.*)$")
+
+def _header_kind(line: str) -> Optional[str]:
+    m = _HEADER_RE.match(line)
+    if m:
+        return SECTION_HEADERS.get(m.group(1).strip().lower())
+    s = line.strip()
+    if s.isupper():  # "HISTORY OF PRESENT ILLNESS"
+        return SECTION_HEADERS.get(s.lower())
+    return None
+
+def segment_note(note_text: str) -> List[Tuple[str, List[str]]]:
+    """
+    Split a note into (kind, lines) sections on recognised header lines. Text
+    before the first header is the "preamble"; headers not in SECTION_HEADERS
+    (e.g. "Patient:", "DOB:") stay inside the current section.
+    """
+    sections: List[Tuple[str, List[str]]] = [("preamble", [])]
+    for line in note_text.splitlines():
+        kind = _header_kind(line)
+        if kind is not None:
+            sections.append((kind, [line]))
+        else:
+            sections[-1][1].append(line)
+    return sections
+
+def trim_note(note_text: str, token_budget: int | None = None, narrative: str | None = None) -> Dict[str, Any]:
+    """
+    The parts of a note worth sending for extraction, in note order, within
+    token_budget. Narrative sections are kept whole (narrative="keep", the
+    default NOTE_TRIM_NARRATIVE) until the note is over budget; then, or
+    always with narrative="salvage", only their lines mentioning an
+    extractor field or clinical_vocabulary() stay. Still over budget, the
+    rationale / vitals / meds / labs sections go in that order; the preamble
+    and diagnoses always stay. Notes without recognised headers are
+    returned whole.
+
+    Returns {"text", "tokens_in", "tokens_out", "dropped"} where dropped lists
+    the header lines of sections left out entirely.
+    """
+    budget = NOTE_TOKEN_BUDGET if token_budget is None else token_budget
+    tokens_in = estimate_tokens(note_text)
+    sections = segment_note(note_text)
+    if len(sections) == 1:
+        return {"text": note_text, "tokens_in": tokens_in, "tokens_out": tokens_in, "dropped": []}
+
+    mentions = default_regex_extractor().mentions
+    vocab = clinical_vocabulary()
+
+    def salvage(lines: List[str]) -> Optional[List[str]]:
+        return [ln for ln in lines if mentions(ln) or vocab.search(ln)] or None
+
+    def size() -> int:
+        return sum(estimate_tokens("\n".join(k)) + 1 for k in kept if k)
+
+    thin_first = (narrative or NOTE_TRIM_NARRATIVE) == "salvage"
+    kept: List[Optional[List[str]]] = [salvage(lines) if kind == "narrative" and thin_first else lines
+                                       for kind, lines in sections]
+    if not thin_first and size() > budget:
+        kept = [salvage(lines) if kind == "narrative" else k for (kind, lines), k in zip(sections, kept)]
+
+    for kind in reversed(RELEVANT_KINDS[1:]):
+        if size() <= budget:
+            break
+        for i, (k, _) in enumerate(sections):
+            if k == kind:
+                kept[i] = None
+
+    dropped = [lines[0].strip() for (kind, lines), k in zip(sections, kept) if k is None and kind != "preamble" and lines]
+    text = "\n".join(ln for k in kept if k for ln in k)
+    return {"text": text, "tokens_in": tokens_in, "tokens_out": estimate_tokens(text), "dropped": dropped}
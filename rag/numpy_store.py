@@ -0,0 +1,471 @@
+from __future__ import annotations
+import os, json, uuid, shutil, threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+# Exact cosine search over memory-mapped NumPy matrices, as a drop-in for the
+# subset of the Chroma client/collection API this repo uses (get/create/delete
+# collection, add/upsert/delete/get/count/query with Chroma-style `where`).
+#
+# On disk, one directory per collection:
+#   manifest.json        collection metadata, dim, quantization, segment list
+#                        (+ deleted row numbers per segment)
+#   <seg>.vec.npy        (n, dim) float32, L2-normalized rows (memory-mapped)
+#   <seg>.q8.npy         optional (n, dim) int8 copy, one scale per row
+#   <seg>.cols.npz       columnar ids / metadata (dictionary-encoded) / doc offsets
+#   <seg>.docs.bin       concatenated UTF-8 documents (memory-mapped)
+# Segments are immutable; writes append a segment and record deletions in the
+# manifest (replaced atomically), and small trailing segments are merged like a
+# binary counter so a collection holds O(log n) segments. One writer process
+# at a time; readers pick up a new manifest on their next call.
+
+RERANK_FACTOR = 4      # int8 scan keeps k * RERANK_FACTOR candidates for exact re-scoring
+_BLOCK_ROWS = 4096     # rows per matmul block (bounds the float32 copy of int8 blocks)
+
+def pack_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    data = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(data) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in data], dtype=np.int64)
+    return np.frombuffer(b"".join(data), dtype=np.uint8), offsets
+
+def unpack_strings(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    raw = blob.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+def encode_column(values: List[Any]) -> Tuple[np.ndarray, List[str]]:
+    """Dictionary-encode one metadata key: int32 codes (-1 = missing) into JSON-encoded distinct values."""
+    lookup: Dict[str, int] = {}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        if v is None:
+            codes[i] = -1
+            continue
+        key = json.dumps(v)  # keeps 1, "1" and true apart
+        codes[i] = lookup.setdefault(key, len(lookup))
+    return codes, list(lookup)
+
+def _normalize(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (mat / norms).astype(np.float32, copy=False)
+
+def _quantize(vecs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8: row ≈ q8 * scale."""
+    scale = np.abs(vecs).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    q8 = np.rint(vecs / scale[:, None]).astype(np.int8)
+    return q8, scale.astype(np.float32)
+
+def _write_segment(root: str, ids: List[str], docs: List[str], metas: List[Dict[str, Any]],
+                   vecs: np.ndarray, quantize: Optional[str]) -> str:
+    name = uuid.uuid4().hex[:12]
+    base = os.path.join(root, name)
+    np.save(base + ".vec.npy", vecs)
+    cols: Dict[str, np.ndarray] = {}
+    if quantize == "int8":
+        q8, cols["scale"] = _quantize(vecs)
+        np.save(base + ".q8.npy", q8)
+    cols["id_blob"], cols["id_off"] = pack_strings(ids)
+    doc_blob, cols["doc_off"] = pack_strings(docs)
+    with open(base + ".docs.bin", "wb") as f:
+        f.write(doc_blob.tobytes())
+    cols.update(pack_columns(metas))
+    np.savez(base + ".cols.npz", **cols)
+    return name
+
+def pack_columns(metas: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Metadata dicts → npz-ready arrays, one dictionary-encoded column per key."""
+    cols: Dict[str, np.ndarray] = {}
+    keys = sorted({k for m in metas for k in m})
+    cols["key_blob"], cols["key_off"] = pack_strings(keys)
+    for i, k in enumerate(keys):
+        codes, vals = encode_column([m.get(k) for m in metas])
+        cols[f"m{i}_codes"] = codes
+        cols[f"m{i}_vblob"], cols[f"m{i}_voff"] = pack_strings(vals)
+    return cols
+
+def unpack_columns(z) -> Dict[str, Tuple[np.ndarray, List[Any]]]:
+    """Inverse of pack_columns: {key: (int32 codes, distinct values)}."""
+    columns: Dict[str, Tuple[np.ndarray, List[Any]]] = {}
+    for i, k in enumerate(unpack_strings(z["key_blob"], z["key_off"])):
+        vals = [json.loads(s) for s in unpack_strings(z[f"m{i}_vblob"], z[f"m{i}_voff"])]
+        columns[k] = (z[f"m{i}_codes"], vals)
+    return columns
+
+def _match(op: str, v: Any, x: Any) -> bool:
+    try:
+        if op == "$eq":
+            return v == x
+        if op == "$ne":
+            return v != x
+        if op == "$in":
+            return v in x
+        if op == "$nin":
+            return v not in x
+        if op == "$gt":
+            return v > x
+        if op == "$gte":
+            return v >= x
+        if op == "$lt":
+            return v < x
+        if op == "$lte":
+            return v <= x
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported where operator {op}")
+
+def where_mask(columns: Dict[str, Tuple[np.ndarray, List[Any]]], n: int, where: Dict[str, Any]) -> np.ndarray:
+    """Row mask for a Chroma-style `where` over dictionary-encoded columns {key: (codes, distinct values)}."""
+    masks = []
+    for key, cond in where.items():
+        if key == "$and":
+            masks.append(np.logical_and.reduce([where_mask(columns, n, w) for w in cond]))
+        elif key == "$or":
+            masks.append(np.logical_or.reduce([where_mask(columns, n, w) for w in cond]))
+        else:
+            if not isinstance(cond, dict):
+                cond = {"$eq": cond}
+            col = columns.get(key)
+            for op, x in cond.items():
+                if col is None:  # key never set in these rows
+                    masks.append(np.zeros(n, dtype=bool))
+                    continue
+                codes, vals = col
+                # Evaluate once per distinct value, then broadcast through the codes (-1 → trailing False)
+                ok = np.array([_match(op, v, x) for v in vals] + [False], dtype=bool)
+                masks.append(ok[codes])
+    return np.logical_and.reduce(masks) if masks else np.ones(n, dtype=bool)
+
+class _Segment:
+    """One immutable batch of rows, opened read-only (vectors and documents stay memory-mapped)."""
+    def __init__(self, root: str, name: str):
+        base = os.path.join(root, name)
+        self.name = name
+        self.vectors = np.load(base + ".vec.npy", mmap_mode="r")
+        self.q8 = np.load(base + ".q8.npy", mmap_mode="r") if os.path.exists(base + ".q8.npy") else None
+        with np.load(base + ".cols.npz") as z:
+            self.ids = unpack_strings(z["id_blob"], z["id_off"])
+            self.doc_off = z["doc_off"]
+            self.scale = z["scale"] if "scale" in z.files else None
+            self.columns = unpack_columns(z)
+        self.docs = (np.memmap(base + ".docs.bin", dtype=np.uint8, mode="r")
+                     if os.path.getsize(base + ".docs.bin") else np.zeros(0, dtype=np.uint8))
+        self.live = np.ones(len(self.ids), dtype=bool)
+        self._masks: Dict[str, np.ndarray] = {}  # where → row mask; segments are immutable, so masks never go stale
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def document(self, i: int) -> str:
+        return self.docs[self.doc_off[i]:self.doc_off[i + 1]].tobytes().decode("utf-8")
+
+    def metadata(self, i: int) -> Dict[str, Any]:
+        return {k: vals[codes[i]] for k, (codes, vals) in self.columns.items() if codes[i] >= 0}
+
+    def where_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        key = json.dumps(where, sort_keys=True)
+        mask = self._masks.get(key)
+        if mask is None:
+            if len(self._masks) >= 64:
+                self._masks.pop(next(iter(self._masks)))
+            mask = self._masks[key] = self._where_mask(where)
+        return mask
+
+    def _where_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        return where_mask(self.columns, len(self), where)
+
+    def _scan(self, mat: np.ndarray, q: np.ndarray) -> np.ndarray:
+        out = np.empty((len(self), q.shape[0]), dtype=np.float32)
+        for s in range(0, len(self), _BLOCK_ROWS):
+            out[s:s + _BLOCK_ROWS] = np.asarray(mat[s:s + _BLOCK_ROWS], dtype=np.float32) @ q.T
+        return out
+
+    def top_k(self, q: np.ndarray, k: int, mask: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Per query row: (row numbers, cosine scores) of up to k best rows allowed by `mask`, unordered."""
+        if self.q8 is not None:
+            scores = self._scan(self.q8, q) * self.scale[:, None]
+            kk = min(len(self), k * RERANK_FACTOR)
+        else:
+            scores = self._scan(self.vectors, q)
+            kk = min(len(self), k)
+        scores[~mask] = -np.inf
+        cand = np.argpartition(-scores, kk - 1, axis=0)[:kk] if kk < len(self) else np.tile(np.arange(len(self))[:, None], (1, q.shape[0]))
+        out = []
+        for j in range(q.shape[0]):
+            rows = cand[:, j]
+            rows = rows[np.isfinite(scores[rows, j])]
+            if self.q8 is not None and len(rows):
+                # Re-score the int8 shortlist exactly; sorted rows keep mmap reads sequential
+                rows = np.sort(rows)
+                exact = np.asarray(self.vectors[rows]) @ q[j]
+                keep = np.argsort(-exact)[:k]
+                out.append((rows[keep], exact[keep]))
+            else:
+                out.append((rows, scores[rows, j]))
+        return out
+
+class NumpyCollection:
+    def __init__(self, root: str, name: str):
+        self.name = name
+        self._dir = os.path.join(root, name)
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._segments: List[_Segment] = []
+        self._by_id: Optional[Dict[str, Tuple[int, int]]] = None
+        self._garbage: List[str] = []  # merged-away segment names, removed after the next manifest save
+        self._load()
+
+    # ---------- state ----------
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self._dir, "manifest.json")
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self._manifest.get("metadata") or {}
+
+    def _load(self) -> None:
+        for _ in range(3):  # a concurrent compaction may remove files between manifest read and open
+            st = os.stat(self._manifest_path)
+            with open(self._manifest_path) as f:
+                manifest = json.load(f)
+            opened = {s.name: s for s in self._segments}
+            try:
+                segs = []
+                for entry in manifest["segments"]:
+                    seg = opened.get(entry["name"]) or _Segment(self._dir, entry["name"])
+                    seg.live = np.ones(len(seg), dtype=bool)
+                    seg.live[entry.get("deleted", [])] = False
+                    segs.append(seg)
+            except FileNotFoundError:
+                continue
+            self._manifest, self._segments, self._by_id = manifest, segs, None
+            self._stamp = (st.st_mtime_ns, st.st_size)
+            return
+        raise RuntimeError(f"Could not open a consistent snapshot of {self._dir}")
+
+    def _refresh(self) -> None:
+        st = os.stat(self._manifest_path)
+        if (st.st_mtime_ns, st.st_size) != self._stamp:
+            self._load()
+
+    def _save(self) -> None:
+        self._manifest["segments"] = [
+            {"name": s.name, "rows": len(s), "deleted": np.flatnonzero(~s.live).tolist()} for s in self._segments
+        ]
+        tmp = self._manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._manifest, f)
+        os.replace(tmp, self._manifest_path)
+        st = os.stat(self._manifest_path)
+        self._stamp = (st.st_mtime_ns, st.st_size)
+
+    def _index(self) -> Dict[str, Tuple[int, int]]:
+        if self._by_id is None:
+            self._by_id = {
+                id_: (si, r) for si, s in enumerate(self._segments) for r, id_ in enumerate(s.ids) if s.live[r]
+            }
+        return self._by_id
+
+    # ---------- writes ----------
+    def _prepare(self, ids, documents, metadatas, embeddings) -> np.ndarray:
+        vecs = np.asarray(embeddings, dtype=np.float32)
+        if vecs.ndim != 2 or len(vecs) != len(ids):
+            raise ValueError(f"Expected {len(ids)} embeddings, got shape {vecs.shape}")
+        dim = self._manifest.get("dim")
+        if dim is None:
+            self._manifest["dim"] = vecs.shape[1]
+        elif vecs.shape[1] != dim:
+            raise ValueError(f"Embedding dimension {vecs.shape[1]} does not match collection dimensionality {dim}")
+        if documents is None or metadatas is None:
+            raise ValueError("NumpyCollection needs documents and metadatas with every write")
+        return _normalize(vecs)
+
+    def _append(self, ids, documents, metadatas, vecs) -> None:
+        name = _write_segment(self._dir, list(ids), list(documents), [m or {} for m in metadatas],
+                              vecs, self._manifest.get("quantize"))
+        self._segments.append(_Segment(self._dir, name))
+        self._merge_tail()
+
+    def _mark_deleted(self, ids) -> None:
+        index = self._index()
+        for id_ in ids:
+            loc = index.pop(id_, None)
+            if loc is not None:
+                self._segments[loc[0]].live[loc[1]] = False
+
+    def _merge_tail(self) -> None:
+        dropped = [s for s in self._segments if not s.live.any()]
+        segs = [s for s in self._segments if s.live.any()]
+        # Binary-counter merging: fold the newest segment into its predecessor while it is at least as large
+        while len(segs) >= 2 and segs[-2].live.sum() <= segs[-1].live.sum():
+            a, b = segs.pop(-2), segs.pop()
+            segs.append(self._merge([a, b]))
+            dropped += [a, b]
+        self._segments, self._by_id = segs, None
+        self._garbage += [s.name for s in dropped]
+
+    def _merge(self, segs: List[_Segment]) -> _Segment:
+        ids, docs, metas, vecs = [], [], [], []
+        for s in segs:
+            rows = np.flatnonzero(s.live)
+            ids += [s.ids[r] for r in rows]
+            docs += [s.document(r) for r in rows]
+            metas += [s.metadata(r) for r in rows]
+            vecs.append(np.asarray(s.vectors[rows]))
+        name = _write_segment(self._dir, ids, docs, metas, np.concatenate(vecs), self._manifest.get("quantize"))
+        return _Segment(self._dir, name)
+
+    def _commit(self) -> None:
+        self._save()
+        # Files of merged-away segments are unreferenced once the new manifest is in place
+        for name in self._garbage:
+            for ext in (".vec.npy", ".q8.npy", ".cols.npz", ".docs.bin"):
+                try:
+                    os.remove(os.path.join(self._dir, name + ext))
+                except FileNotFoundError:
+                    pass
+        self._garbage = []
+
+    def add(self, ids, embeddings, documents=None, metadatas=None) -> None:
+        """Like Chroma, ids that already exist are left untouched."""
+        with self._lock:
+            self._refresh()
+            index = self._index()
+            keep = [i for i, id_ in enumerate(ids) if id_ not in index]
+            if not keep:
+                return
+            vecs = self._prepare(ids, documents, metadatas, embeddings)[keep]
+            self._append([ids[i] for i in keep], [documents[i] for i in keep], [metadatas[i] for i in keep], vecs)
+            self._commit()
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None) -> None:
+        with self._lock:
+            self._refresh()
+            vecs = self._prepare(ids, documents, metadatas, embeddings)
+            self._mark_deleted(ids)
+            self._append(ids, documents, metadatas, vecs)
+            self._commit()
+
+    def delete(self, ids=None) -> None:
+        with self._lock:
+            self._refresh()
+            self._mark_deleted(ids or [])
+            self._merge_tail()
+            self._commit()
+
+    def compact(self) -> None:
+        """Merge every segment into one (e.g. after a large index build)."""
+        with self._lock:
+            self._refresh()
+            if len(self._segments) > 1 or any(not s.live.all() for s in self._segments):
+                old = self._segments
+                self._segments, self._by_id = [self._merge(old)], None
+                self._garbage += [s.name for s in old]
+                self._commit()
+
+    # ---------- reads ----------
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return int(sum(s.live.sum() for s in self._segments))
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None) -> Dict[str, List[Any]]:
+        with self._lock:
+            self._refresh()
+            segs = list(self._segments)
+            if ids is not None:
+                index = self._index()
+                locs = [index[i] for i in ids if i in index]
+            else:
+                locs = [(si, r) for si, s in enumerate(segs)
+                        for r in np.flatnonzero(s.live & s.where_mask(where) if where else s.live)]
+        if offset:
+            locs = locs[offset:]
+        if limit is not None:
+            locs = locs[:limit]
+        include = include or ["metadatas", "documents"]
+        res: Dict[str, List[Any]] = {"ids": [segs[si].ids[r] for si, r in locs]}
+        if "documents" in include:
+            res["documents"] = [segs[si].document(r) for si, r in locs]
+        if "metadatas" in include:
+            res["metadatas"] = [segs[si].metadata(r) for si, r in locs]
+        return res
+
+    def query(self, query_embeddings=None, query_texts=None, n_results: int = 10, where=None, include=None) -> Dict[str, List[List[Any]]]:
+        """Exact cosine top-k (int8 scan + exact re-score when quantized); Chroma-shaped result with cosine distances."""
+        if query_embeddings is None:
+            raise ValueError("NumpyCollection has no embedding function; pass query_embeddings (vector_store.query(..., embedder=...))")
+        q = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        with self._lock:
+            self._refresh()
+            segs = list(self._segments)
+        per_query: List[List[Tuple[float, int, int]]] = [[] for _ in range(len(q))]
+        for si, s in enumerate(segs):
+            mask = s.live & s.where_mask(where) if where else s.live
+            if not mask.any():
+                continue
+            for j, (rows, scores) in enumerate(s.top_k(q, n_results, mask)):
+                per_query[j].extend(zip(scores.tolist(), [si] * len(rows), rows.tolist()))
+        res: Dict[str, List[List[Any]]] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for cands in per_query:
+            best = sorted(cands, key=lambda c: -c[0])[:n_results]
+            res["ids"].append([segs[si].ids[r] for _, si, r in best])
+            res["documents"].append([segs[si].document(r) for _, si, r in best])
+            res["metadatas"].append([segs[si].metadata(r) for _, si, r in best])
+            res["distances"].append([1.0 - sc for sc, _, _ in best])
+        return res
+
+class NumpyClient:
+    """Chroma-client look-alike over a directory of NumpyCollections (one shared instance per name)."""
+    def __init__(self, persist_dir: str, quantize: Optional[str] = None):
+        if quantize not in (None, "", "none", "int8"):
+            raise ValueError(f"Unknown VECTOR_QUANTIZE '{quantize}' (expected int8 or none)")
+        self.persist_dir = persist_dir
+        self.quantize = quantize if quantize == "int8" else None
+        self._collections: Dict[str, NumpyCollection] = {}
+        self._lock = threading.Lock()
+        os.makedirs(persist_dir, exist_ok=True)
+
+    def _exists(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.persist_dir, name, "manifest.json"))
+
+    def get_collection(self, name: str) -> NumpyCollection:
+        with self._lock:
+            if not self._exists(name):
+                self._collections.pop(name, None)
+                raise ValueError(f"Collection {name} does not exist.")
+            col = self._collections.get(name)
+            if col is None:
+                col = self._collections[name] = NumpyCollection(self.persist_dir, name)
+            return col
+
+    def create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> NumpyCollection:
+        with self._lock:
+            if self._exists(name):
+                raise ValueError(f"Collection {name} already exists.")
+            d = os.path.join(self.persist_dir, name)
+            os.makedirs(d, exist_ok=True)
+            metadata = dict(metadata or {})
+            manifest = {"name": name, "metadata": metadata, "dim": metadata.get("embed_dim"),
+                        "quantize": self.quantize, "segments": []}
+            with open(os.path.join(d, "manifest.json"), "w") as f:
+                json.dump(manifest, f)
+            col = self._collections[name] = NumpyCollection(self.persist_dir, name)
+            return col
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> NumpyCollection:
+        try:
+            return self.get_collection(name)
+        except ValueError:
+            return self.create_collection(name, metadata)
+
+    def delete_collection(self, name: str) -> None:
+        with self._lock:
+            if not self._exists(name):
+                raise ValueError(f"Collection {name} does not exist.")
+            self._collections.pop(name, None)
+            shutil.rmtree(os.path.join(self.persist_dir, name))
+
+    def list_collections(self) -> List[str]:
+        return sorted(n for n in os.listdir(self.persist_dir) if self._exists(n))
@@ -0,0 +1,165 @@
+from __future__ import annotations
+import queue, threading, time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+_DONE = object()
+_POLL_S = 0.1  # how often blocked feeder / workers re-check for cancellation
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Group an iterable into lists of `size` (the last one may be shorter) without materializing it."""
+    batch: List[Any] = []
+    for it in items:
+        batch.append(it)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class StageFailure:
+    """Yielded in place of an item whose stage raised; later stages are skipped."""
+    __slots__ = ("item", "stage", "error")
+
+    def __init__(self, item: Any, stage: str, error: BaseException):
+        self.item = item
+        self.stage = stage
+        self.error = error
+
+class StageStats:
+    """Per-stage counters: items processed, failures and time spent inside the stage function."""
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.errors = 0
+        self.busy_s = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.items += 1
+            self.busy_s += seconds
+            if not ok:
+                self.errors += 1
+
+    def as_dict(self, wall_s: float) -> Dict[str, Any]:
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "items": self.items,
+            "errors": self.errors,
+            "busy_s": round(self.busy_s, 3),
+            # Achieved rate over the whole run, and the rate one worker sustains
+            "items_per_s": round(self.items / wall_s, 2) if wall_s > 0 else 0.0,
+            "items_per_worker_s": round(self.items / self.busy_s, 2) if self.busy_s > 0 else 0.0,
+        }
+
+class Stage:
+    def __init__(self, name: str, fn: Callable[[Any], Any], workers: int = 1):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+
+def run_pipeline(
+    items: Iterable[Any],
+    stages: List[Stage],
+    *,
+    queue_size: int = 64,
+    stats: Optional[Dict[str, StageStats]] = None,
+) -> Iterator[Any]:
+    """
+    Stream `items` through `stages`, each served by its own worker threads and
+    connected by bounded queues (so a slow stage applies backpressure instead
+    of buffering the whole input). Results are yielded in completion order.
+    A stage exception turns the item into a StageFailure, which flows through
+    the remaining stages untouched. Fill `stats` to collect StageStats.
+    Closing the returned generator early stops the feeder and workers.
+    """
+    if stats is not None:
+        for st in stages:
+            stats[st.name] = StageStats(st.name, st.workers)
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    # Remaining live workers per stage; the last one out forwards end-of-stream
+    live = [st.workers for st in stages]
+    live_lock = threading.Lock()
+    # Set when the consumer stops early (e.g. a streaming client disconnected):
+    # the feeder and workers give up instead of blocking on full queues
+    stop = threading.Event()
+
+    def put(q: queue.Queue, it: Any) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(it, timeout=_POLL_S)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q: queue.Queue) -> Any:
+        while not stop.is_set():
+            try:
+                return q.get(timeout=_POLL_S)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def feeder():
+        try:
+            for it in items:
+                if not put(queues[0], it):
+                    return
+        except BaseException as e:  # surface iterator errors to the consumer
+            put(queues[0], StageFailure(None, "input", e))
+        for _ in range(stages[0].workers if stages else 1):
+            put(queues[0], _DONE)
+
+    def worker(i: int, st: Stage):
+        q_in, q_out = queues[i], queues[i + 1]
+        rec = stats.get(st.name) if stats is not None else None
+        while True:
+            it = get(q_in)
+            if it is _DONE:
+                break
+            if isinstance(it, StageFailure):
+                put(q_out, it)
+                continue
+            t0 = time.perf_counter()
+            try:
+                out, ok = st.fn(it), True
+            except Exception as e:
+                out, ok = StageFailure(it, st.name, e), False
+            if rec is not None:
+                rec.record(time.perf_counter() - t0, ok)
+            if not put(q_out, out):
+                return
+        with live_lock:
+            live[i] -= 1
+            last = live[i] == 0
+        if last:
+            nxt = stages[i + 1].workers if i + 1 < len(stages) else 1
+            for _ in range(nxt):
+                put(q_out, _DONE)
+
+    threads = [threading.Thread(target=feeder, daemon=True, name="pipeline-feed")]
+    for i, st in enumerate(stages):
+        for w in range(st.workers):
+            threads.append(threading.Thread(target=worker, args=(i, st), daemon=True, name=f"pipeline-{st.name}-{w}"))
+    for t in threads:
+        t.start()
+
+    out_q = queues[-1]
+    try:
+        while True:
+            it = out_q.get()
+            if it is _DONE:
+                break
+            yield it
+    finally:
+        # Closed early (or finished): release every thread still blocked on a queue
+        stop.set()
+        for q in queues:
+            while True:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    break
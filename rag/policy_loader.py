@@ -1,18 +1,145 @@
 from __future__ import annotations
+import logging
 import fitz  # PyMuPDF
-from typing import List, Dict
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+log = logging.getLogger("pa.ingest")
+
+def _normalize(text: str) -> str:
+    # Normalize whitespace a bit
+    return "\n".join(line.rstrip() for line in text.splitlines())
 
 def load_pdf_with_pages(path: str) -> List[Dict]:
     """
     Returns a list of dicts: { 'text': str, 'page': int, 'source': str }
     One item per page, preserving page numbers (0-based).
     """
-    doc = fitz.open(path)
+    return list(iter_pdf_pages(path))
+
+def iter_pdf_pages(path: str) -> Iterator[Dict]:
+    """Lazy variant of load_pdf_with_pages: one page dict at a time, document closed when exhausted."""
+    with fitz.open(path) as doc:
+        for i, page in enumerate(doc):
+            yield {"text": _normalize(page.get_text("text")), "page": i, "source": path}
+
+def page_count(path: str) -> int:
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+def load_pdf_page_range(path: str, start: int, end: int) -> List[Dict]:
+    """Same shape as load_pdf_with_pages, for pages [start, end) only."""
     pages = []
-    for i, page in enumerate(doc):
-        text = page.get_text("text")
-        # Normalize whitespace a bit
-        text = "\n".join(line.rstrip() for line in text.splitlines())
-        pages.append({"text": text, "page": i, "source": path})
-    doc.close()
+    with fitz.open(path) as doc:
+        for i in range(start, min(end, doc.page_count)):
+            text = doc[i].get_text("text")
+            pages.append({"text": _normalize(text), "page": i, "source": path})
     return pages
+
+def load_pdf_first_range(path: str, end: int) -> Tuple[int, List[Dict]]:
+    """(page count, pages [0, end)) in one open, so counting happens in the worker too."""
+    with fitz.open(path) as doc:
+        n = doc.page_count
+    return n, load_pdf_page_range(path, 0, end)
+
+def iter_page_ranges(
+    paths: List[str],
+    workers: int = 4,
+    pages_per_task: int = 32,
+    max_pending: int | None = None,
+) -> Iterator[Tuple[str, Optional[List[Dict]]]]:
+    """
+    Yield (path, pages) for page ranges of at most `pages_per_task` pages,
+    then (path, None) once every range of that file has been yielded. Ranges
+    of one file may arrive out of order when `workers` > 1.
+
+    With workers > 1, ranges are parsed on a process pool so one big manual
+    spreads over several cores; at most `max_pending` ranges are in flight,
+    so parsing cannot run arbitrarily far ahead of a slower consumer. With
+    workers <= 1, pages are read lazily in-process. Unreadable files are
+    logged and skipped: they never get their (path, None).
+    """
+    if workers <= 1:
+        for p in paths:
+            try:
+                group: List[Dict] = []
+                for page in iter_pdf_pages(p):
+                    group.append(page)
+                    if len(group) == pages_per_task:
+                        yield p, group
+                        group = []
+            except Exception as e:
+                log.warning("Skipping unreadable PDF %s: %s", p, e)
+                continue
+            if group:
+                yield p, group
+            yield p, None
+        return
+
+    # Each file starts with one task that also counts its pages; the rest of
+    # its ranges are queued once that count is known. A file that fails to
+    # open or parse is logged and skipped (no end marker, so it is never
+    # recorded as ingested) without stopping the others.
+    max_pending = max_pending or workers * 2
+    first_tasks = iter(paths)
+    todo: deque = deque()  # (path, start) ranges of files already counted
+    remaining: Dict[str, int] = {}
+    failed: set = set()
+    pending = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def fill():
+            while len(pending) < max_pending:
+                if todo:
+                    path, start = todo.popleft()
+                    if path in failed:
+                        continue
+                    pending[pool.submit(load_pdf_page_range, path, start, start + pages_per_task)] = (path, start)
+                    continue
+                path = next(first_tasks, None)
+                if path is None:
+                    return
+                pending[pool.submit(load_pdf_first_range, path, pages_per_task)] = (path, 0)
+
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                path, start = pending.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    if path not in failed:
+                        log.warning("Skipping unreadable PDF %s (pages from %d): %s", path, start, e)
+                        failed.add(path)
+                    fill()
+                    continue
+                if path in failed:
+                    fill()
+                    continue
+                if start == 0:
+                    n, pages = result
+                    rest = list(range(pages_per_task, n, pages_per_task))
+                    remaining[path] = 1 + len(rest)
+                    todo.extend((path, s) for s in rest)
+                else:
+                    pages = result
+                fill()  # keep workers busy while the consumer handles this range
+                yield path, pages
+                remaining[path] -= 1
+                if remaining[path] == 0:
+                    yield path, None
+
+def iter_pdfs_parallel(
+    paths: List[str],
+    workers: int = 4,
+    pages_per_task: int = 32,
+    max_pending: int | None = None,
+) -> Iterator[Tuple[str, List[Dict]]]:
+    """Whole-file view of iter_page_ranges: yield (path, pages in page order) as each file completes."""
+    parts: Dict[str, List[Dict]] = {}
+    for path, pages in iter_page_ranges(paths, workers, pages_per_task, max_pending):
+        if pages is None:
+            yield path, sorted(parts.pop(path, []), key=lambda pg: pg["page"])
+        else:
+            parts.setdefault(path, []).extend(pages)
@@ -0,0 +1,227 @@
+from __future__ import annotations
+import os, re, json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Set
+
+# Services we assess, with the HCPCS/CPT codes and phrases that mark a policy as covering them
+SERVICES: Dict[str, Dict[str, List[str]]] = {
+    "I-CGM": {
+        "codes": ["0446T", "0447T", "0448T"],
+        "aliases": ["implantable continuous glucose", "implantable cgm", "eversense"],
+    },
+    "CGM": {
+        "codes": ["E2102", "E2103", "A4238", "A4239", "K0553", "K0554", "95249", "95250", "95251"],
+        "aliases": ["continuous glucose monitor"],
+    },
+}
+
+# Canonical payer name → patterns seen in policy headers
+PAYERS: Dict[str, List[str]] = {
+    "Medicare": [r"\bmedicare\b", r"\bCMS\b", r"\bLCD\b"],
+    "Medicaid": [r"\bmedicaid\b"],
+    "Aetna": [r"\baetna\b"],
+    "Cigna": [r"\bcigna\b"],
+    "UnitedHealthcare": [r"\bunited\s*health\s*care\b", r"\bUHC\b"],
+    "Humana": [r"\bhumana\b"],
+    "Anthem": [r"\banthem\b"],
+    "Blue Cross Blue Shield": [r"\bblue\s+cross\b", r"\bBCBS\b"],
+    "Kaiser Permanente": [r"\bkaiser\b"],
+}
+_PAYER_RES = [(name, re.compile("|".join(pats), re.I)) for name, pats in PAYERS.items()]
+_KNOWN_PAYERS = {name.lower() for name in PAYERS}
+
+_CODE_RE = re.compile(r"\b(\d{4}[A-Z]|[A-Z]\d{4}|\d{5})\b")
+_POLICY_ID_RE = re.compile(
+    r"\b(?:policy|document|LCD|clinical policy bulletin)\s*(?:number|no\.?|id|#)?\s*[:#]\s*([A-Z0-9][A-Z0-9.\-]{2,})"
+    r"|\b(L\d{5})\b",
+    re.I,
+)
+_DATE = r"(\d{1,2}/\d{1,2}/\d{4}|\d{4}-\d{2}-\d{2}|[A-Z][a-z]+\.? \d{1,2},? \d{4})"
+_EFFECTIVE_RE = re.compile(r"\beffective(?:\s+date)?(?:\s+(?:on|for services (?:on or )?after))?\s*[:\-]?\s*" + _DATE, re.I)
+_DATE_FORMATS = ("%m/%d/%Y", "%Y-%m-%d", "%B %d, %Y", "%B %d %Y", "%b %d, %Y", "%b %d %Y", "%b. %d, %Y")
+
+CATALOG_FILE = "policies.json"
+
+def parse_date(text: str) -> Optional[date]:
+    text = text.strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def load_policy_catalog(pdf_dir: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Optional `policies.json` next to the PDFs, keyed by file name:
+    {"cgm_lcd.pdf": {"payer": "Medicare", "policy_id": "L33822",
+                     "effective_date": "2024-01-01", "services": ["CGM"]}}
+    Entries override whatever is inferred from the document text.
+    """
+    path = os.path.join(pdf_dir, CATALOG_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def infer_policy_metadata(text: str) -> Dict[str, Any]:
+    """Best-effort payer / policy id / effective date / services from a policy's first pages."""
+    meta: Dict[str, Any] = {}
+    for name, rx in _PAYER_RES:
+        if rx.search(text):
+            meta["payer"] = name
+            break
+    m = _POLICY_ID_RE.search(text)
+    if m:
+        meta["policy_id"] = (m.group(1) or m.group(2)).rstrip(".-")
+    m = _EFFECTIVE_RE.search(text)
+    if m and parse_date(m.group(1)):
+        meta["effective_date"] = parse_date(m.group(1)).isoformat()
+    codes = set(_CODE_RE.findall(text))
+    lowered = text.lower()
+    services, found = [], set()
+    for svc, spec in SERVICES.items():
+        hit = codes.intersection(spec["codes"])
+        if hit or any(a in lowered for a in spec["aliases"]):
+            services.append(svc)
+            found |= hit
+    if services:
+        meta["services"] = services
+    if found:
+        meta["service_codes"] = sorted(found)
+    return meta
+
+def policy_metadata(first_pages_text: str, catalog_entry: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Inferred metadata overlaid with the catalog entry, in the shape stored per file in the index manifest."""
+    catalog_entry = catalog_entry or {}
+    meta = infer_policy_metadata(first_pages_text)
+    meta.update(catalog_entry)
+    if "services" in catalog_entry and "service_codes" not in catalog_entry:
+        meta["service_codes"] = sorted({c for s in meta["services"] for c in SERVICES.get(s, {}).get("codes", [])})
+    return meta
+
+def chunk_metadata(meta: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flatten policy metadata into chunk metadata. Vector stores only hold
+    scalars, so lists become comma-joined strings and the effective date also
+    gets a sortable int (effective_ymd) for range filters.
+    """
+    out: Dict[str, Any] = {}
+    for key in ("payer", "policy_id", "effective_date"):
+        if meta.get(key):
+            out[key] = str(meta[key])
+    if meta.get("effective_date"):
+        out["effective_ymd"] = int(str(meta["effective_date"]).replace("-", ""))
+    for key in ("services", "service_codes"):
+        if meta.get(key):
+            out[key] = ",".join(meta[key])
+    return out
+
+# ---------- Query-side filters ----------
+NO_CANDIDATES = {"__no_candidates__": True}
+
+class PolicyFilterIndex:
+    """
+    Per-service / per-payer candidate sets of policy sources, precomputed from
+    the index manifest (scripts/index_policies.py records each file's policy
+    metadata) and rebuilt when the index version changes. where() folds the
+    requested filters into one `source $in [...]` clause for the vector query,
+    picking the latest version of each policy effective on `effective_on`.
+
+    Service and payer filters must name a known value (SERVICES, PAYERS or a
+    payer some indexed policy is tagged with; see unknown_filters()). A known
+    value that no indexed policy is tagged with is ignored (e.g. an index built
+    before metadata was recorded), so it narrows the search but never empties
+    it by accident.
+    """
+    def __init__(self, persist_dir: str | None = None):
+        self.persist_dir = persist_dir
+        self._version: Optional[str] = None
+        self.policies: Dict[str, Dict[str, Any]] = {}
+        self.by_service: Dict[str, Set[str]] = {}
+        self.by_payer: Dict[str, Set[str]] = {}
+
+    def refresh(self) -> None:
+        from rag.index_manifest import load_manifest, manifest_path
+        from rag.vector_store import get_index_version
+        version = get_index_version(self.persist_dir)
+        if version == self._version:
+            return
+        files = load_manifest(manifest_path(self.persist_dir)).get("files", {})
+        policies = {src: e["policy"] for src, e in files.items() if e.get("policy")}
+        by_service: Dict[str, Set[str]] = {}
+        by_payer: Dict[str, Set[str]] = {}
+        for src, meta in policies.items():
+            for svc in meta.get("services", []):
+                by_service.setdefault(svc, set()).add(src)
+            if meta.get("payer"):
+                by_payer.setdefault(meta["payer"].lower(), set()).add(src)
+        self.policies, self.by_service, self.by_payer = policies, by_service, by_payer
+        self._version = version
+
+    def unknown_filters(self, *, service: str | None = None, payer: str | None = None, **_) -> List[str]:
+        """One message per service / payer filter naming a value we do not know; empty when all are known."""
+        self.refresh()
+        errors = []
+        if service and service not in SERVICES and service not in self.by_service:
+            errors.append(f"unknown service '{service}' (known: {', '.join(sorted(set(SERVICES) | set(self.by_service)))})")
+        if payer and payer.lower() not in _KNOWN_PAYERS and payer.lower() not in self.by_payer:
+            known = sorted(set(PAYERS) | {p for p in self.by_payer if p not in _KNOWN_PAYERS})
+            errors.append(f"unknown payer '{payer}' (known: {', '.join(known)})")
+        return errors
+
+    def candidates(self, *, service: str | None = None, payer: str | None = None, policy_id: str | None = None,
+                   effective_on: date | str | None = None) -> Optional[Set[str]]:
+        """Sources allowed by the filters, or None when no filter applies (search everything)."""
+        self.refresh()
+        if not self.policies:
+            return None
+        sets: List[Set[str]] = []
+        if service and service in self.by_service:
+            sets.append(self.by_service[service])
+        if payer and payer.lower() in self.by_payer:
+            sets.append(self.by_payer[payer.lower()])
+        if policy_id:
+            sets.append({s for s, m in self.policies.items() if m.get("policy_id") == policy_id})
+        if effective_on:
+            sets.append(self._effective(effective_on))
+        if not sets:
+            return None
+        return set.intersection(*sets)
+
+    def _effective(self, on: date | str) -> Set[str]:
+        if not isinstance(on, date):
+            parsed = parse_date(str(on))
+            if parsed is None:
+                raise ValueError(f"unrecognised effective_on date: {on!r}")
+            on = parsed
+        # effective_date is stored as ISO YYYY-MM-DD, so string order is date order
+        on = on.isoformat()
+        latest: Dict[str, tuple] = {}
+        undated = set()
+        for src, m in self.policies.items():
+            eff = m.get("effective_date")
+            if not eff:
+                undated.add(src)
+            elif eff <= on:
+                key = m.get("policy_id") or src
+                if key not in latest or eff > latest[key][0]:
+                    latest[key] = (eff, src)
+        return undated | {src for _, src in latest.values()}
+
+    def where(self, **filters) -> Optional[Dict[str, Any]]:
+        """Chroma-style where clause for candidates(**filters); NO_CANDIDATES when nothing can match."""
+        sources = self.candidates(**filters)
+        if sources is None:
+            return None
+        if not sources:
+            return NO_CANDIDATES
+        return {"source": {"$in": sorted(sources)}}
+
+    def stats(self) -> Dict[str, Any]:
+        self.refresh()
+        return {
+            "policies": len(self.policies),
+            "services": {s: len(v) for s, v in sorted(self.by_service.items())},
+            "payers": {p: len(v) for p, v in sorted(self.by_payer.items())},
+        }
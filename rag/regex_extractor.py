@@ -0,0 +1,167 @@
+from __future__ import annotations
+import re
+from typing import Any, Dict, List, Optional
+
+# ---------- Configurable tables ----------
+# Labs: first "<alias>[:\s]* <number> [unit] ... [YYYY-MM-DD on the same line]" per lab.
+# `unit` is both what may follow the number and the default when it is absent.
+LABS: List[Dict[str, Any]] = [
+    {"name": "HbA1c", "aliases": ["HbA1c", "A1C", "Hemoglobin A1c"], "unit": "%"},
+    {"name": "Fasting glucose", "aliases": ["Fasting glucose"], "unit": "mg/dL"},
+]
+
+# Meds: every line mentioning one of the aliases (whole words) becomes one med entry.
+MEDS: List[Dict[str, Any]] = [
+    {"name": "metformin", "aliases": ["metformin"]},
+    {"name": "insulin", "aliases": ["insulin", "glargine", "aspart", "lispro"]},
+]
+
+# Vitals: first match of "<alias><pattern>" per entry; each capturing group in
+# `pattern` is one value, named by `names` in order.
+VITALS: List[Dict[str, Any]] = [
+    {"names": ["BP_systolic", "BP_diastolic"], "aliases": ["BP"], "pattern": r"\s*([0-9]{2,3})/([0-9]{2,3})",
+     "unit": "mmHg", "ignore_case": False},
+    {"names": ["Weight"], "aliases": ["weight"], "pattern": r"\s*([0-9]+(?:\.[0-9]+)?)\s*kg", "unit": "kg"},
+    {"names": ["Height"], "aliases": ["height"], "pattern": r"\s*([0-9]+(?:\.[0-9]+)?)\s*cm", "unit": "cm"},
+]
+
+_NUM = r"([0-9]+(?:\.[0-9]+)?)"
+_ISO = r"(\d{4}-\d{2}-\d{2})"
+
+def _alts(aliases: List[str]) -> str:
+    # Longest first so "Hemoglobin A1c" is not shadowed by a shorter alias at the same position
+    return "(?:" + "|".join(re.escape(a) for a in sorted(aliases, key=len, reverse=True)) + ")"
+
+def _scoped(pattern: str, ignore_case: bool) -> str:
+    return f"(?i:{pattern})" if ignore_case else pattern
+
+class RegexExtractor:
+    """
+    Deterministic note parser built once from the LABS / MEDS / VITALS tables.
+
+    One combined pattern of named keyword alternatives scans the note in a
+    single pass; each hit is dispatched on `lastgroup` and, where a value
+    follows the keyword, an anchored detail pattern is matched at that
+    position. Keywords are short, so scanning past one never hides another
+    field's match. Keywords must start a word ("xHbA1c" is not a lab).
+    """
+    def __init__(self, labs: Optional[List[Dict[str, Any]]] = None, meds: Optional[List[Dict[str, Any]]] = None,
+                 vitals: Optional[List[Dict[str, Any]]] = None):
+        self.labs = LABS if labs is None else labs
+        self.meds = MEDS if meds is None else meds
+        self.vitals = VITALS if vitals is None else vitals
+        parts = [
+            r"(?P<icd>\b[A-TV-Z][0-9][0-9AB](?:\.[0-9A-Za-z]{1,4})?\b)",
+            r"(?P<mrn>\bMRN)",
+            r"(?P<sex>(?i:\bSex:))",
+            r"(?P<dos>Date of service:)",
+            r"(?P<t2dm>(?i:type\s*2\s*diabetes))",
+        ]
+        self._details: Dict[str, re.Pattern] = {
+            "mrn": re.compile(r"MRN\s*([A-Za-z0-9\-]+)"),
+            "sex": re.compile(r"Sex:\s*([A-Za-z])", re.I),
+            "dos": re.compile(r"Date of service:\s*" + _ISO),
+        }
+        for i, spec in enumerate(self.labs):
+            ic = spec.get("ignore_case", True)
+            alts = _alts(spec["aliases"])
+            parts.append(f"(?P<lab{i}>{_scoped(alts, ic)})")
+            unit = re.escape(spec["unit"]) if spec.get("unit") else r"(?!)"
+            self._details[f"lab{i}"] = re.compile(
+                alts + r"[:\s]*" + _NUM + r"\s*(" + unit + r")?(?:.*?" + _ISO + r")?", re.I if ic else 0
+            )
+        for i, spec in enumerate(self.meds):
+            words = r"\b" + _alts(spec["aliases"]) + r"\b"
+            parts.append(f"(?P<med{i}>{_scoped(words, spec.get('ignore_case', True))})")
+        for i, spec in enumerate(self.vitals):
+            ic = spec.get("ignore_case", True)
+            alts = _alts(spec["aliases"])
+            word = r"\b" + alts
+            parts.append(f"(?P<vit{i}>{_scoped(word, ic)})")
+            self._details[f"vit{i}"] = re.compile(alts + spec["pattern"], re.I if ic else 0)
+        # Every keyword starts a word; the guard lets the engine skip mid-word
+        # positions instead of trying each alternative at every character
+        self._scan = re.compile(r"\b(?=[A-Za-z])(?:" + "|".join(parts) + ")")
+        # group name -> (field kind, table index)
+        self._groups = {name: (name.rstrip("0123456789"), int(name[3:]) if name[3:].isdigit() else -1)
+                        for name in self._scan.groupindex}
+
+    def mentions(self, text: str) -> bool:
+        """Whether any field keyword occurs in text (cheap; no detail matching)."""
+        return self._scan.search(text) is not None
+
+    def extract(self, note_text: str) -> Dict[str, Any]:
+        """Unvalidated summary dict in the PatientSummary shape."""
+        details = self._details
+        patient_id = sex = note_date = None
+        found_sex = found_dos = t2dm = False
+        diags: List[Dict[str, Any]] = []
+        labs: Dict[int, Dict[str, Any]] = {}
+        vitals: Dict[int, List[Dict[str, Any]]] = {}
+        med_lines: Dict[int, None] = {}
+        groups = self._groups
+        for m in self._scan.finditer(note_text):
+            kind, i = groups[m.lastgroup]
+            pos = m.start()
+            if kind == "icd":
+                diags.append({"code_system": "ICD-10", "code": m.group(), "description": None})
+            elif kind == "med":  # remember the line it is on
+                med_lines[note_text.rfind("\n", 0, pos) + 1] = None
+            elif kind == "lab":
+                if i not in labs:
+                    d = details[m.lastgroup].match(note_text, pos)
+                    if d:
+                        labs[i] = {"name": self.labs[i]["name"], "value": float(d.group(1)),
+                                   "unit": d.group(2) or self.labs[i]["unit"], "collected_date": d.group(3)}
+            elif kind == "vit":
+                if i not in vitals:
+                    d = details[m.lastgroup].match(note_text, pos)
+                    if d:
+                        spec = self.vitals[i]
+                        vitals[i] = [{"name": n, "value": float(v), "unit": spec.get("unit")}
+                                     for n, v in zip(spec["names"], d.groups())]
+            elif kind == "mrn":
+                if patient_id is None:
+                    d = details["mrn"].match(note_text, pos)
+                    if d:
+                        patient_id = d.group(1)
+            elif kind == "sex":
+                if not found_sex:
+                    d = details["sex"].match(note_text, pos)
+                    if d:
+                        found_sex = True
+                        sex = {"m": "male", "f": "female"}.get(d.group(1).lower())
+            elif kind == "dos":
+                if not found_dos:
+                    d = details["dos"].match(note_text, pos)
+                    if d:
+                        found_dos = True
+                        note_date = d.group(1)
+            elif kind == "t2dm":
+                t2dm = True
+        if not diags and t2dm:
+            diags.append({"code_system": None, "code": None, "description": "Type 2 diabetes mellitus"})
+        meds = []
+        for start in med_lines:
+            end = note_text.find("\n", start)
+            line = note_text[start:] if end == -1 else note_text[start:end]
+            meds.append({"name": line.strip(), "dose": None, "route": None, "frequency": None,
+                         "start_date": None, "end_date": None, "status": "active"})
+        return {
+            "patient_id": patient_id,
+            "age": None,  # not reliably stated in notes; left to the LLM path
+            "sex": sex,
+            "diagnoses": diags,
+            "labs": [labs[i] for i in sorted(labs)],
+            "meds": meds,
+            "vitals": [v for i in sorted(vitals) for v in vitals[i]],
+            "note_date": note_date,
+        }
+
+_default: Optional[RegexExtractor] = None
+
+def default_regex_extractor() -> RegexExtractor:
+    global _default
+    if _default is None:
+        _default = RegexExtractor()
+    return _default
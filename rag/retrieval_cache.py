@@ -0,0 +1,92 @@
+from __future__ import annotations
+import os, json, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+def normalize_question(q: str) -> str:
+    return " ".join(q.lower().split())
+
+def make_key(question: str, top_k: int, where: Optional[Dict[str, Any]], version: str) -> Tuple[str, int, str, str]:
+    return (normalize_question(question), int(top_k), json.dumps(where, sort_keys=True) if where else "", version)
+
+class RetrievalCache:
+    """
+    TTL + LRU cache of raw vector-query results, keyed on
+    (normalized question, top_k, where filter, index version).
+    Seeing a new index version drops every entry, so results never outlive a
+    re-index (scripts/index_policies.py bumps the version on every write).
+    """
+    def __init__(self, max_items: Optional[int] = None, ttl_s: Optional[float] = None):
+        self.max_items = max_items or int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+        self.ttl_s = ttl_s if ttl_s is not None else float(os.getenv("RETRIEVAL_CACHE_TTL_S", "3600"))
+        self._data: "OrderedDict[tuple, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version_locked(self, version: str) -> None:
+        if version != self._version:
+            if self._version is not None and self._data:
+                self.invalidations += 1
+            self._data.clear()
+            self._version = version
+
+    def get(self, key: tuple) -> Optional[Any]:
+        with self._lock:
+            self._check_version_locked(key[-1])
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value: Any) -> None:
+        with self._lock:
+            self._check_version_locked(key[-1])
+            self._data[key] = (time.monotonic() + self.ttl_s, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "items": len(self._data),
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "index_version": self._version,
+        }
+
+_default_cache: Optional[RetrievalCache] = None
+_default_lock = threading.Lock()
+
+def default_retrieval_cache() -> Optional[RetrievalCache]:
+    """Process-wide cache; RETRIEVAL_CACHE=0 disables it."""
+    global _default_cache
+    if os.getenv("RETRIEVAL_CACHE", "1").lower() in ("0", "false", "no"):
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = RetrievalCache()
+        return _default_cache
@@ -1,12 +1,30 @@
 from __future__ import annotations
-import os
+import os, uuid
 from typing import List, Dict, Any, Optional
 import chromadb
 from chromadb.config import Settings
 
+from rag.retrieval_cache import RetrievalCache, make_key
+
+def _persist_dir(persist_dir: str | None = None) -> str:
+    return persist_dir or os.getenv("CHROMA_DIR", ".chroma")
+
+VECTOR_BACKENDS = ("chroma", "numpy")
+
+def vector_backend() -> str:
+    """VECTOR_BACKEND = chroma (default) | numpy (memory-mapped exact search, see rag/numpy_store.py)."""
+    backend = os.getenv("VECTOR_BACKEND", "chroma").lower()
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown VECTOR_BACKEND '{backend}' (expected one of {list(VECTOR_BACKENDS)})")
+    return backend
+
 def get_client(persist_dir: str | None = None):
-    persist_dir = persist_dir or os.getenv("CHROMA_DIR", ".chroma")
+    persist_dir = _persist_dir(persist_dir)
     os.makedirs(persist_dir, exist_ok=True)
+    if vector_backend() == "numpy":
+        from rag.numpy_store import NumpyClient
+        # VECTOR_QUANTIZE=int8 only applies to collections created from now on
+        return NumpyClient(os.path.join(persist_dir, "numpy"), quantize=os.getenv("VECTOR_QUANTIZE"))
     # Silence telemetry noise
     os.environ.setdefault("CHROMA_TELEMETRY_IMPLEMENTATION", "none")
     os.environ.setdefault("CHROMA_ANONYMIZED_TELEMETRY", "False")
@@ -19,24 +37,167 @@ def get_client(persist_dir: str | None = None):
     ))
     return client
 
-def get_or_create_collection(client, name: str = "policies"):
-    # Dimension is inferred on first add; keep same collection name for consistency
-    return client.get_or_create_collection(
-        name=name,
-        metadata={"hnsw:space": "cosine"}
-    )
+def get_or_create_collection(client, name: str = "policies", embedder=None):
+    """
+    Without `embedder`, the dimension is inferred on first add. With it, a new
+    collection records embed_model / embed_dim in its metadata, and an
+    existing one is checked against the embedder so indexing and querying
+    cannot silently use different models.
+    """
+    if embedder is None:
+        return client.get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
+    try:
+        col = client.get_collection(name=name)
+    except Exception:  # missing collection (ValueError / NotFoundError depending on Chroma version)
+        return client.create_collection(
+            name=name,
+            metadata={"hnsw:space": "cosine", "embed_model": embedder.model, "embed_dim": embedder.dim},
+        )
+    check_embedder(col, embedder)
+    return col
 
-def add_documents(collection, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]], embeddings: List[List[float]]):
+def check_embedder(collection, embedder) -> None:
+    meta = collection.metadata or {}
+    if "embed_model" not in meta:
+        return  # collection predates model tracking; nothing to compare against
+    if meta["embed_model"] != embedder.model or int(meta.get("embed_dim", embedder.dim)) != embedder.dim:
+        raise ValueError(
+            f"Collection '{collection.name}' was indexed with {meta['embed_model']} "
+            f"(dim {meta.get('embed_dim')}) but the embedder is {embedder.model} (dim {embedder.dim}). "
+            "Re-index with scripts/index_policies.py --force or set EMBED_BACKEND/EMBED_MODEL to match."
+        )
+
+# ---------- Index version (invalidates query caches across processes) ----------
+_version_cache: Dict[str, tuple] = {}
+
+def get_index_version(persist_dir: str | None = None) -> str:
+    """Current index version token; changes whenever documents are written. Costs one stat() when unchanged."""
+    path = os.path.join(_persist_dir(persist_dir), "index_version")
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return "0"
+    cached = _version_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path) as f:
+        version = f.read().strip() or "0"
+    _version_cache[path] = (mtime, version)
+    return version
+
+def bump_index_version(persist_dir: str | None = None) -> str:
+    d = _persist_dir(persist_dir)
+    os.makedirs(d, exist_ok=True)
+    version = uuid.uuid4().hex
+    tmp = os.path.join(d, f".index_version.{os.getpid()}")
+    with open(tmp, "w") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(d, "index_version"))
+    return version
+
+def add_documents(collection, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]], embeddings: List[List[float]], *, persist_dir: str | None = None):
     collection.add(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
+    bump_index_version(persist_dir)
+
+def upsert_documents(collection, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]], embeddings: List[List[float]], *, persist_dir: str | None = None):
+    collection.upsert(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
+    bump_index_version(persist_dir)
+
+def delete_documents(collection, ids: List[str], *, persist_dir: str | None = None):
+    if not ids:
+        return
+    collection.delete(ids=ids)
+    bump_index_version(persist_dir)
 
-def query(collection, text: str, n_results: int = 5, *, embedder=None):
+def query(collection, text: str, n_results: int = 5, *, embedder=None, where: Optional[Dict[str, Any]] = None, cache: Optional[RetrievalCache] = None, persist_dir: str | None = None):
     """
     Query using the SAME embedder as indexing to avoid dimension mismatches.
     If `embedder` is provided, we send `query_embeddings` instead of `query_texts`.
+    With `cache`, repeated (question, n_results, where) lookups against an
+    unchanged index skip both the embedding call and the vector search.
     """
-    if embedder is None:
-        # Fallback (may trigger Chroma's default 384-dim model; not recommended)
-        return collection.query(query_texts=[text], n_results=n_results)
+    return query_many(collection, [text], n_results, embedder=embedder, where=where, cache=cache, persist_dir=persist_dir)[0]
+
+# Per-question keys of a Chroma query result; anything else (e.g. "included") is copied as-is
+_RESULT_LISTS = ("ids", "documents", "metadatas", "distances", "embeddings", "uris", "data")
+
+def query_many(collection, texts: List[str], n_results: int = 5, *, embedder=None, where: Optional[Dict[str, Any]] = None, cache: Optional[RetrievalCache] = None, persist_dir: str | None = None) -> List[Dict[str, Any]]:
+    """
+    Multi-question form of query(): the questions not already cached are
+    embedded in one batched call and searched with a single multi-embedding
+    collection query. Returns one single-question result per text, in order
+    (the same shape query() returns, and sharing its cache entries).
+    """
+    keys: List[Any] = [None] * len(texts)
+    out: List[Any] = [None] * len(texts)
+    if cache is not None:
+        version = get_index_version(persist_dir)
+        for i, t in enumerate(texts):
+            keys[i] = make_key(t, n_results, where, version)
+            out[i] = cache.get(keys[i])
+
+    # Search each distinct missing question once
+    missing: Dict[Any, str] = {}
+    for i, t in enumerate(texts):
+        if out[i] is None:
+            missing.setdefault(keys[i] if cache is not None else t, t)
+    if missing:
+        qs = list(missing.values())
+        if embedder is None:
+            # Fallback (may trigger Chroma's default 384-dim model; not recommended)
+            res = collection.query(query_texts=qs, n_results=n_results, where=where)
+        else:
+            res = collection.query(query_embeddings=embedder.embed_texts(qs), n_results=n_results, where=where)
+        fresh = {}
+        for j, mk in enumerate(missing):
+            fresh[mk] = {k: ([v[j]] if k in _RESULT_LISTS and v is not None else v) for k, v in res.items()}
+            if cache is not None:
+                cache.put(mk, fresh[mk])
+        for i, t in enumerate(texts):
+            if out[i] is None:
+                out[i] = fresh[keys[i] if cache is not None else t]
+    return out
+
+def to_hits(res) -> List[Dict[str, Any]]:
+    """Flatten a single-question query result into [{id, document, metadata}]."""
+    out: List[Dict[str, Any]] = []
+    for i in range(len(res["ids"][0])):
+        out.append({
+            "id": res["ids"][0][i],
+            "document": res["documents"][0][i],
+            "metadata": res["metadatas"][0][i],
+        })
+    return out
+
+# Candidates taken from each of the vector and BM25 rankings before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+
+def retrieve(collection, embedder, question: str, top_k: int = 5, *, where: Optional[Dict[str, Any]] = None, cache: Optional[RetrievalCache] = None, lexical=None) -> List[Dict[str, Any]]:
+    if lexical is not None:
+        return retrieve_many(collection, embedder, [question], top_k, where=where, cache=cache, lexical=lexical)[0]
+    return to_hits(query(collection, question, n_results=top_k, embedder=embedder, where=where, cache=cache))
+
+def retrieve_many(collection, embedder, questions: List[str], top_k: int = 5, *, where: Optional[Dict[str, Any]] = None, cache: Optional[RetrievalCache] = None, lexical=None) -> List[List[Dict[str, Any]]]:
+    """
+    Hits per question, in order, from one batched embed + query (see query_many).
+    With a `lexical` index (rag.lexical_index), vector and BM25 candidates are
+    merged by reciprocal-rank fusion, so exact tokens (codes, thresholds) the
+    embedding misses still surface without raising top_k.
+    """
+    if lexical is None:
+        return [to_hits(r) for r in query_many(collection, questions, n_results=top_k, embedder=embedder, where=where, cache=cache)]
+    n_cand = max(top_k * 4, HYBRID_CANDIDATES)
+    vec = [to_hits(r) for r in query_many(collection, questions, n_results=n_cand, embedder=embedder, where=where, cache=cache)]
+    return [_fuse(collection, hits, lexical.search(q, n_cand, where=where), top_k) for q, hits in zip(questions, vec)]
 
-    q_emb = embedder.embed_texts([text])  # shape: [1, dim]
-    return collection.query(query_embeddings=q_emb, n_results=n_results)
+def _fuse(collection, vec_hits: List[Dict[str, Any]], lex_hits, top_k: int) -> List[Dict[str, Any]]:
+    from rag.lexical_index import rrf_fuse
+    fused = rrf_fuse([[h["id"] for h in vec_hits], [i for i, _ in lex_hits]])[:top_k]
+    by_id = {h["id"]: h for h in vec_hits}
+    missing = [i for i, _ in fused if i not in by_id]
+    if missing:  # lexical-only hits: fetch their text and metadata
+        got = collection.get(ids=missing, include=["documents", "metadatas"])
+        for i, d, m in zip(got["ids"], got["documents"], got["metadatas"]):
+            by_id[i] = {"id": i, "document": d, "metadata": m}
+    # Ids deleted since the lexical index was built are dropped
+    return [by_id[i] for i, _ in fused if i in by_id]
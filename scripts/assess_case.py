@@ -1,5 +1,6 @@
 from __future__ import annotations
 import sys, os, json, argparse
+from datetime import date
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -8,34 +9,112 @@ sys.path.append(str(ROOT))
 from dotenv import load_dotenv
 load_dotenv(ROOT / ".env")
 
-from rag.embedder import Embedder
-from rag.vector_store import get_client, get_or_create_collection
-from rag.clinical_extractor import extract_patient_summary
+from rag.embedder import get_embedder
+from rag.vector_store import get_client, get_or_create_collection, retrieve_many
+from rag.retrieval_cache import default_retrieval_cache
+from rag.policy_metadata import NO_CANDIDATES, PolicyFilterIndex
+from rag.lexical_index import load_lexical_index
+from rag.clinical_extractor import extract_patient_summary, extract_patient_summaries
 from app.validators import validate_and_normalize
-from app.eligibility import evaluate_icgm
+from app.eligibility import evaluate_eligibility
 from app.justification import build_justification_letter
+from app.batch import BatchAssessor, DEFAULT_QUESTION, DEFAULT_SERVICE, iter_cases_from_dir, iter_cases_from_jsonl
 
-def _retrieve_policy(question: str, top_k: int = 5):
-    client = get_client()
-    col = get_or_create_collection(client, name="policies")
-    embedder = Embedder()
-    q_emb = embedder.embed_texts([question])
-    res = col.query(query_embeddings=q_emb, n_results=top_k)
-    out = []
-    for i in range(len(res["ids"][0])):
-        out.append({
-            "id": res["ids"][0][i],
-            "document": res["documents"][0][i],
-            "metadata": res["metadatas"][0][i],
-        })
-    return out
+_resources = {}
+
+def _load_resources():
+    # Build client/collection/embedder once per process (batch mode calls this repeatedly)
+    if "embedder" not in _resources:
+        _resources["embedder"] = get_embedder()
+        _resources["col"] = get_or_create_collection(get_client(), name="policies", embedder=_resources["embedder"])
+        _filter_index()
+    return _resources
+
+def _filter_index() -> PolicyFilterIndex:
+    # Built before the embedder so bad --service / --payer values fail fast
+    if "filters" not in _resources:
+        _resources["filters"] = PolicyFilterIndex()
+    return _resources["filters"]
+
+def _retrieve_policy(question: str, top_k: int = 5, filters=None):
+    return _retrieve_policies([question], top_k, filters)[0]
+
+def _retrieve_policies(questions, top_k: int = 5, filters=None):
+    r = _load_resources()
+    where = r["filters"].where(**filters) if filters else None
+    if where is NO_CANDIDATES:
+        return [[] for _ in questions]
+    return retrieve_many(r["col"], r["embedder"], questions, top_k, where=where, cache=default_retrieval_cache(),
+                         lexical=load_lexical_index())
+
+def _filters(args):
+    return {"service": args.service, "payer": args.payer, "effective_on": args.date_of_service}
+
+def run_batch(args):
+    if args.input_dir:
+        cases = iter_cases_from_dir(ROOT / args.input_dir, pattern=args.pattern)
+    else:
+        cases = iter_cases_from_jsonl(ROOT / args.jsonl)
+
+    out_path = ROOT / args.out
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    filters = _filters(args)
+    runner = BatchAssessor(
+        lambda q, k: _retrieve_policy(q, k, filters),
+        retrieve_many=lambda qs, k: _retrieve_policies(qs, k, filters),
+        question=args.question,
+        service=args.service or DEFAULT_SERVICE,
+        extract_many=None if args.no_pack else (
+            lambda notes: extract_patient_summaries(notes, workers=args.extract_workers, return_exceptions=True)
+        ),
+        extract_workers=args.extract_workers,
+        retrieve_workers=args.retrieve_workers,
+        assess_workers=args.assess_workers,
+    )
+
+    print(f"📦 Batch assessing → {out_path}")
+    n_ok = n_err = 0
+    with open(out_path, "w") as f:
+        for res in runner.run(cases):
+            f.write(json.dumps(res) + "\n")
+            if res["ok"]:
+                n_ok += 1
+            else:
+                n_err += 1
+                print(f"   ⚠️ {res['case_id']}: {res['stage']} failed — {res['error']}")
+
+    print(f"\n🎉 {n_ok} assessed, {n_err} failed in {runner.wall_s:.1f}s")
+    print("\nStage throughput:")
+    for r in runner.stage_report():
+        print(f" - {r['stage']:<9} workers={r['workers']:<3} items={r['items']:<6} errors={r['errors']:<4} "
+              f"{r['items_per_s']:>8.2f}/s overall  {r['items_per_worker_s']:>8.2f}/s per worker")
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--note", default="data/examples/note1.txt")
     ap.add_argument("--summary-json", default=None)
-    ap.add_argument("--question", default="I-CGM coverage medical necessity criteria and documentation requirements")
+    ap.add_argument("--question", default=DEFAULT_QUESTION)
+    ap.add_argument("--service", default=DEFAULT_SERVICE, help="Only search policies tagged with this service; its rules in app/rules decide eligibility.")
+    ap.add_argument("--payer", default=None, help="Only search this payer's policies (e.g. Medicare).")
+    ap.add_argument("--date-of-service", type=date.fromisoformat, default=None, help="YYYY-MM-DD; use the policy versions in effect then.")
+    batch = ap.add_argument_group("batch mode (writes one JSON line per case)")
+    src = batch.add_mutually_exclusive_group()
+    src.add_argument("--input-dir", default=None, help="Directory of note files, one case per file.")
+    src.add_argument("--jsonl", default=None, help="JSONL of {case_id, note_text | summary_json}.")
+    batch.add_argument("--pattern", default="*.txt", help="Glob for --input-dir.")
+    batch.add_argument("--out", default="data/processed/assessments.jsonl")
+    batch.add_argument("--extract-workers", type=int, default=4)
+    batch.add_argument("--no-pack", action="store_true", help="One LLM request per note instead of packing several per request.")
+    batch.add_argument("--retrieve-workers", type=int, default=1)
+    batch.add_argument("--assess-workers", type=int, default=2)
     args = ap.parse_args()
+    errors = _filter_index().unknown_filters(**_filters(args))
+    if errors:
+        ap.error("; ".join(errors))
+
+    if args.input_dir or args.jsonl:
+        run_batch(args)
+        return
 
     if args.summary_json:
         data = json.loads(Path(args.summary_json).read_text())
@@ -49,10 +128,10 @@ def main():
         data, _ = validate_and_normalize(raw)
 
     print("🔎 Retrieving relevant policy passages…")
-    hits = _retrieve_policy(args.question, top_k=5)
+    hits = _retrieve_policy(args.question, top_k=5, filters=_filters(args))
 
     print("✅ Evaluating eligibility rules (demo I-CGM)…")
-    meets, missing = evaluate_icgm(data)
+    meets, missing = evaluate_eligibility(data, args.service or DEFAULT_SERVICE)
     letter = build_justification_letter(data, meets, missing, hits)
 
     out_dir = ROOT / "data" / "processed"
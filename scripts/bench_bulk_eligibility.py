@@ -0,0 +1,58 @@
+from __future__ import annotations
+import sys, time, random, argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from app.rule_engine import RuleEngine, load_rules
+from app.schemas import PatientSummary
+from bench_eligibility_rules import synthetic_policies, synthetic_summaries
+
+def main():
+    ap = argparse.ArgumentParser(description="Bulk (columnar, vectorized) eligibility vs the per-summary path: parity and throughput.")
+    ap.add_argument("--summaries", type=int, default=100_000)
+    ap.add_argument("--policies", type=int, default=50)
+    ap.add_argument("--models", type=int, default=2000, help="Summaries also checked as PatientSummary models.")
+    args = ap.parse_args()
+
+    rng = random.Random(1)
+    policies = synthetic_policies(args.policies, rng) + load_rules()
+    summaries = synthetic_summaries(args.summaries, rng)
+    engine = RuleEngine(policies)
+
+    t0 = time.perf_counter()
+    scalar = [engine.evaluate_all(s) for s in summaries]
+    scalar_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    cols = engine.columns(summaries)
+    columns_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    bulk = engine.evaluate_bulk(cols)
+    vector_s = time.perf_counter() - t0
+
+    mismatches = 0
+    for svc, (ok, missing) in bulk.items():
+        for i, row in enumerate(scalar):
+            expect_ok, expect_missing = row[svc]
+            if bool(ok[i]) != expect_ok or engine.missing_items(svc, missing[i]) != expect_missing:
+                mismatches += 1
+
+    models = [PatientSummary(**s) for s in summaries[: args.models]]
+    model_bulk = engine.evaluate_bulk(models)
+    model_mismatches = sum(int((model_bulk[svc][1] != missing[: len(models)]).sum()) for svc, (_, missing) in bulk.items())
+
+    n_evals = len(summaries) * len(policies)
+    print(f"{len(policies)} policies x {len(summaries)} summaries = {n_evals} evaluations; "
+          f"mismatches vs scalar: {mismatches} (dicts), {model_mismatches} (PatientSummary x {len(models)})\n")
+    print(f"{'path':<28} {'s':>8} {'evals/s':>12}")
+    print(f"{'scalar evaluate_all':<28} {scalar_s:>8.2f} {n_evals / scalar_s:>12.0f}")
+    print(f"{'bulk: columns()':<28} {columns_s:>8.2f}")
+    print(f"{'bulk: evaluate_bulk()':<28} {vector_s:>8.2f} {n_evals / vector_s:>12.0f}")
+    total = columns_s + vector_s
+    print(f"{'bulk total':<28} {total:>8.2f} {n_evals / total:>12.0f}  ({scalar_s / total:.1f}x)")
+    sys.exit(1 if mismatches or model_mismatches else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+from __future__ import annotations
+import sys, re, time, random, argparse
+from pathlib import Path
+from collections import Counter
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from rag.chunker import iter_chunks, iter_chunk_spans, count_tokens
+
+FILLER = [
+    "This policy applies to commercial and Medicare Advantage members unless otherwise stated.",
+    "Benefit coverage is subject to the terms of the member's plan document.",
+    "Requests are reviewed by a licensed clinician using the criteria below.",
+    "Prior authorization is required before the device is dispensed.",
+    "Documentation must be submitted with the request and kept in the medical record.",
+]
+DEVICES = ["continuous glucose monitor", "insulin pump", "implantable CGM", "glucose sensor", "CGM receiver"]
+
+def synthetic_pages(n_pages: int, seed: int = 7):
+    """Policy-like pages (numbered headings, prose, code tables) plus the criterion sentences planted in them."""
+    rng = random.Random(seed)
+    pages, facts = [], []
+    sec = 1
+    for p in range(n_pages):
+        lines = []
+        for _ in range(3):
+            lines.append(f"{sec}. {rng.choice(['COVERAGE CRITERIA', 'DOCUMENTATION', 'LIMITATIONS', 'DEFINITIONS'])}")
+            sec += 1
+            para = [rng.choice(FILLER) for _ in range(rng.randint(3, 8))]
+            a1c = round(rng.uniform(7.0, 10.0), 1)
+            fact = (f"The {rng.choice(DEVICES)} is medically necessary when HbA1c is at least {a1c}% "
+                    f"and the member performs SMBG {rng.randint(3, 6)} or more times daily (criterion {p}-{sec}).")
+            para.insert(rng.randrange(len(para) + 1), fact)
+            facts.append(fact)
+            # Wrap prose the way PDF text extraction does (~90 chars per line)
+            lines.extend(re.findall(r".{1,90}(?:\s|$)", " ".join(para)))
+            lines.append("")
+            if rng.random() < 0.4:
+                lines.append("HCPCS    Description              Units")
+                for _ in range(rng.randint(3, 8)):
+                    lines.append(f"{rng.choice('AEK')}{rng.randint(1000, 9999)}    {rng.choice(DEVICES):<24} {rng.randint(1, 90)}")
+                lines.append("")
+        pages.append({"text": "\n".join(l.rstrip() for l in lines), "page": p, "source": "synthetic.pdf"})
+    return pages, facts
+
+_TOK = re.compile(r"\w+")
+
+def lexical_rank(query: str, texts: list, df: Counter) -> list:
+    q = set(_TOK.findall(query.lower()))
+    scores = []
+    for i, t in enumerate(texts):
+        toks = set(_TOK.findall(t.lower()))
+        scores.append((sum(1.0 / df[w] for w in q & toks), i))
+    return [i for _, i in sorted(scores, reverse=True)]
+
+def evaluate(name, chunk_fn, pages, facts):
+    t0 = time.perf_counter()
+    chunks = list(chunk_fn(pages))
+    texts = [c["text"] for c in chunks]
+    dt = time.perf_counter() - t0
+    norm = [" ".join(t.split()) for t in texts]
+    intact = sum(any(f in t for t in norm) for f in facts) / len(facts)
+    df = Counter(w for t in texts for w in set(_TOK.findall(t.lower())))
+    hit1 = hit3 = 0
+    for f in facts:
+        ranked = lexical_rank(f, texts, df)[:3]
+        hits = [f in norm[i] for i in ranked]
+        hit1 += hits[0]
+        hit3 += any(hits)
+    toks = [count_tokens(t) for t in texts]
+    print(f"{name:<11} {len(chunks):>7} {sum(toks) / len(toks):>10.0f} {max(toks):>8} {dt * 1000:>9.1f} "
+          f"{intact:>8.1%} {hit1 / len(facts):>7.1%} {hit3 / len(facts):>7.1%}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare the character-window chunker with the structure-aware chunker.")
+    ap.add_argument("--pages", type=int, default=200)
+    ap.add_argument("--max-tokens", type=int, default=600)
+    ap.add_argument("--overlap", type=int, default=100)
+    args = ap.parse_args()
+
+    pages, facts = synthetic_pages(args.pages)
+    print(f"{args.pages} synthetic pages, {len(facts)} planted criteria, max_tokens={args.max_tokens}\n")
+    print(f"{'chunker':<11} {'chunks':>7} {'avg tok':>10} {'max tok':>8} {'ms':>9} {'intact':>8} {'hit@1':>7} {'hit@3':>7}")
+    evaluate("chars", lambda p: iter_chunks(p, args.max_tokens, args.overlap), pages, facts)
+    count_tokens.cache_clear()
+    evaluate("structured", lambda p: iter_chunk_spans(p, args.max_tokens, args.overlap), pages, facts)
+    print("\nintact = criteria sentences contained whole in some chunk; hit@k = a lexical query for the"
+          "\ncriterion ranks a chunk containing all of it in the top k.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+from __future__ import annotations
+import sys, time, random, argparse, operator
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from app.compact import to_record
+from app.rule_engine import RuleEngine, load_rules
+
+ICD_PREFIXES = ["E08", "E09", "E10", "E11", "E13", "E16", "E66", "I10", "I25", "I50", "N18", "G47.3", "J44", "J45",
+                "F32", "M17", "C50", "Z79.4", "R73", "E78"]
+DX_PHRASES = ["diabetes", "hypoglycemia", "obesity", "hypertension", "heart failure", "sleep apnea", "copd", "asthma",
+              "chronic kidney disease", "depression", "osteoarthritis", "neuropathy"]
+MED_WORDS = ["insulin", "glargine", "lispro", "aspart", "metformin", "semaglutide", "liraglutide", "empagliflozin",
+             "lisinopril", "atorvastatin", "albuterol", "sertraline", "apixaban", "furosemide", "tirzepatide"]
+LABS = ["hba1c", "ldl", "egfr", "bmi", "fev1", "ahi"]
+
+def synthetic_policies(n: int, rng: random.Random):
+    """n service policies shaped like app/rules/*.json, over a shared vocabulary."""
+    policies = []
+    for i in range(n):
+        lab = rng.choice(LABS)
+        policies.append({
+            "service": f"SVC-{i:02d}",
+            "lab_aliases": {"hba1c": ["a1c", "hemoglobin a1c"], "egfr": ["gfr"]},
+            "definitions": {
+                "dx": {"any": [{"dx_code_prefix": rng.sample(ICD_PREFIXES, rng.randint(1, 4))},
+                               {"dx_text": rng.sample(DX_PHRASES, rng.randint(1, 3))}]},
+                "tx": {"med": rng.sample(MED_WORDS, rng.randint(1, 4))},
+            },
+            "criteria": [
+                {"id": "dx", "check": {"ref": "dx"}, "missing": "Qualifying diagnosis."},
+                {"id": "lab_or_tx", "check": {"any": [{"lab_present": lab}, {"ref": "tx"}]}, "missing": f"Recent {lab} or therapy."},
+                {"id": "lab_threshold", "when": {"lab_present": lab},
+                 "check": {"any": [{"lab": {"name": lab, "op": ">=", "value": round(rng.uniform(5, 40), 1)}}, {"ref": "tx"}]},
+                 "missing": f"{lab} above threshold or therapy."},
+                {"id": "tried", "check": {"med": rng.sample(MED_WORDS, 2), "active": False}, "missing": "Prior therapy tried."},
+                {"id": "adult", "check": {"age": {"op": ">=", "value": 18}}, "missing": "Adult patient."},
+            ],
+        })
+    return policies
+
+def synthetic_summaries(n: int, rng: random.Random):
+    out = []
+    for _ in range(n):
+        out.append({
+            "age": rng.randint(5, 90),
+            "diagnoses": [{"code": f"{rng.choice(ICD_PREFIXES)}.{rng.randint(0, 9)}",
+                           "description": f"{rng.choice(DX_PHRASES)} {rng.choice(['controlled', 'uncontrolled', 'with complications'])}"}
+                          for _ in range(rng.randint(0, 4))],
+            "labs": [{"name": rng.choice(["HbA1c", "A1C", "LDL", "GFR", "BMI", "FEV1", "AHI"]), "value": round(rng.uniform(3, 45), 1)}
+                     for _ in range(rng.randint(0, 3))],
+            "meds": [{"name": f"{rng.choice(MED_WORDS).title()} {rng.choice([5, 10, 20, 500])} mg daily",
+                      "status": rng.choice(["active", "active", "discontinued", None])}
+                     for _ in range(rng.randint(0, 5))],
+        })
+    return out
+
+# ---------- Reference: interpret the rule tree directly, rescanning the summary per leaf ----------
+_OPS = {">=": operator.ge, ">": operator.gt, "<=": operator.le, "<": operator.lt, "==": operator.eq, "!=": operator.ne}
+
+def _first_lab(summary, name, lab_name):
+    for lab in summary.get("labs", []):
+        if lab_name(lab.get("name") or "") == lab_name(name):
+            try:
+                return float(lab.get("value"))
+            except Exception:
+                pass
+    return None
+
+def naive_eval(node, summary, defs, aliases):
+    if "ref" in node:
+        return naive_eval(defs[node["ref"]], summary, defs, aliases)
+    if "all" in node:
+        return all(naive_eval(n, summary, defs, aliases) for n in node["all"])
+    if "any" in node:
+        return any(naive_eval(n, summary, defs, aliases) for n in node["any"])
+    if "not" in node:
+        return not naive_eval(node["not"], summary, defs, aliases)
+    if "dx_code_prefix" in node:
+        return any((d.get("code") or "").upper().startswith(p.upper()) for d in summary.get("diagnoses", []) for p in node["dx_code_prefix"])
+    if "dx_text" in node:
+        return any(p.lower() in (d.get("description") or "").lower() for d in summary.get("diagnoses", []) for p in node["dx_text"])
+    if "med" in node:
+        for m in summary.get("meds", []):
+            n = (m.get("name") or "").lower()
+            if any(k.lower() in n for k in node["med"]):
+                if not node.get("active", True) or (m.get("status") or "active").lower() in ("active", "current", "ongoing"):
+                    return True
+        return False
+    if "lab_present" in node:
+        return _first_lab(summary, node["lab_present"], aliases) is not None
+    if "lab" in node:
+        v = _first_lab(summary, node["lab"]["name"], aliases)
+        return v is not None and _OPS[node["lab"]["op"]](v, node["lab"]["value"])
+    if "age" in node:
+        return summary.get("age") is not None and _OPS[node["age"]["op"]](summary["age"], node["age"]["value"])
+    raise ValueError(node)
+
+def naive_evaluate_all(policies, summary, aliases):
+    out = {}
+    for p in policies:
+        defs = p.get("definitions", {})
+        missing = [c["missing"] for c in p["criteria"]
+                   if (not c.get("when") or naive_eval(c["when"], summary, defs, aliases))
+                   and not naive_eval(c["check"], summary, defs, aliases)]
+        out[p["service"]] = (not missing, missing)
+    return out
+
+# ---------- Baseline: the hand-written I-CGM checks the rule engine replaced ----------
+LEGACY_INSULIN = {"insulin", "glargine", "aspart", "lispro"}
+LEGACY_METFORMIN = {"metformin"}
+LEGACY_A1C_NAMES = {"hba1c", "a1c", "hemoglobin a1c"}
+
+def _legacy_on(summary, keywords):
+    for m in summary.get("meds", []):
+        n = (m.get("name") or "").lower()
+        if any(k in n for k in keywords) and (m.get("status") or "active").lower() in ("active", "current", "ongoing"):
+            return True
+    return False
+
+def legacy_evaluate_icgm(summary):
+    missing = []
+    dx = False
+    for d in summary.get("diagnoses", []):
+        code = (d.get("code") or "").upper()
+        desc = (d.get("description") or "").lower()
+        if code.startswith("E10") or code.startswith("E11") or "type 1 diabetes" in desc or "type 2 diabetes" in desc:
+            dx = True
+            break
+    if not dx:
+        missing.append("Diabetes diagnosis (ICD-10 E10/E11).")
+    a1c = None
+    for lab in summary.get("labs", []):
+        if (lab.get("name") or "").lower().strip() in LEGACY_A1C_NAMES:
+            try:
+                a1c = float(lab.get("value"))
+                break
+            except Exception:
+                pass
+    insulin = _legacy_on(summary, LEGACY_INSULIN)
+    if a1c is None and not insulin:
+        missing.append("Recent HbA1c value OR active insulin therapy.")
+    elif a1c is not None and a1c < 8.5 and not insulin:
+        missing.append("HbA1c ≥ 8.5% or active insulin therapy.")
+    if not _legacy_on(summary, LEGACY_INSULIN | LEGACY_METFORMIN):
+        missing.append("At least one active anti-diabetic medication (e.g., insulin or metformin).")
+    return (len(missing) == 0, missing)
+
+def best_of(fn, items, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for x in items:
+            fn(x)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def single_service(summaries, repeat):
+    """I-CGM alone (the /assess path): shipped rules vs the hand-written checks they replaced."""
+    engine = RuleEngine(load_rules())
+    records = [to_record(s) for s in summaries]
+    mismatches = sum(engine.evaluate(s, "I-CGM") != legacy_evaluate_icgm(s) for s in summaries)
+    legacy_s = best_of(legacy_evaluate_icgm, summaries, repeat)
+    dict_s = best_of(lambda s: engine.evaluate(s, "I-CGM"), summaries, repeat)
+    rec_s = best_of(lambda r: engine.evaluate(r, "I-CGM"), records, repeat)
+    n = len(summaries)
+    print(f"\nI-CGM only, {n} summaries; mismatches vs hand-written checks: {mismatches}")
+    print(f"{'evaluator':<22} {'total s':>9} {'µs/summary':>12}")
+    print(f"{'hand-written (before)':<22} {legacy_s:>9.3f} {legacy_s / n * 1e6:>12.2f}")
+    print(f"{'engine, dicts':<22} {dict_s:>9.3f} {dict_s / n * 1e6:>12.2f}  ({legacy_s / dict_s:.2f}x)")
+    print(f"{'engine, records':<22} {rec_s:>9.3f} {rec_s / n * 1e6:>12.2f}  ({legacy_s / rec_s:.2f}x)")
+    return mismatches
+
+def main():
+    ap = argparse.ArgumentParser(description="Eligibility rules: compiled engine vs direct rule-tree interpretation over many summaries x services.")
+    ap.add_argument("--summaries", type=int, default=100_000)
+    ap.add_argument("--policies", type=int, default=50)
+    ap.add_argument("--naive-sample", type=int, default=5000, help="Summaries timed with the reference interpreter (extrapolated).")
+    ap.add_argument("--single", type=int, default=50_000, help="Summaries for the I-CGM-only comparison against the hand-written checks.")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    policies = synthetic_policies(args.policies, rng) + load_rules()  # plus the shipped I-CGM / CGM rules
+    summaries = synthetic_summaries(args.summaries, rng)
+
+    t0 = time.perf_counter()
+    engine = RuleEngine(policies)
+    compile_ms = (time.perf_counter() - t0) * 1000
+    aliases = engine.lab_name  # resolve lab spellings as the engine does
+
+    sample = summaries[: args.naive_sample]
+    mismatches = sum(engine.evaluate_all(s) != naive_evaluate_all(policies, s, aliases) for s in sample)
+
+    t0 = time.perf_counter()
+    for s in sample:
+        naive_evaluate_all(policies, s, aliases)
+    naive_s = (time.perf_counter() - t0) * len(summaries) / max(1, len(sample))
+
+    t0 = time.perf_counter()
+    passed = 0
+    for s in summaries:
+        passed += sum(ok for ok, _ in engine.evaluate_all(s).values())
+    engine_s = time.perf_counter() - t0
+
+    n_evals = len(summaries) * len(policies)
+    print(f"{len(policies)} policies compiled in {compile_ms:.1f} ms ({len(engine._bits)} leaf facts); "
+          f"{len(summaries)} summaries → {n_evals} evaluations, {passed} passing; "
+          f"mismatches vs reference on {len(sample)}: {mismatches}\n")
+    print(f"{'evaluator':<22} {'total s':>9} {'evals/s':>12}")
+    print(f"{'reference (extrap.)':<22} {naive_s:>9.1f} {n_evals / naive_s:>12.0f}")
+    print(f"{'compiled engine':<22} {engine_s:>9.1f} {n_evals / engine_s:>12.0f}  ({naive_s / engine_s:.1f}x)")
+
+    mismatches += single_service(summaries[: args.single], args.repeat)
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+from __future__ import annotations
+import sys, time, argparse, statistics
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from dotenv import load_dotenv
+load_dotenv(ROOT / ".env")
+
+from rag.embedder import BACKENDS, FakeEmbedBackend, get_embedder, Embedder
+
+QUESTION = "Is prior authorization required for CGM in a type 1 diabetic on insulin with hypoglycemia?"
+
+def make(kind: str, model: str | None) -> Embedder:
+    if kind == "fake":
+        # Roughly a remote API: ~80 ms per request plus a little per text
+        return Embedder(backend=FakeEmbedBackend(dim=768, latency_s=0.08, per_text_s=0.0002), task_type="retrieval_query")
+    return get_embedder(kind, model, task_type="retrieval_query", cache=False)
+
+def bench(emb: Embedder, queries: int, chunks: int) -> dict:
+    emb.embed_texts(["warmup"])  # model load / connection setup is not query latency
+    lat = []
+    for i in range(queries):
+        t0 = time.perf_counter()
+        emb.embed_texts([f"{QUESTION} ({i})"])
+        lat.append((time.perf_counter() - t0) * 1000)
+    lat.sort()
+    texts = [f"policy chunk {i}: continuous glucose monitors are covered when " * 8 for i in range(chunks)]
+    t0 = time.perf_counter()
+    emb.embed_texts(texts)
+    dt = time.perf_counter() - t0
+    return {
+        "dim": emb.dim,
+        "p50_ms": statistics.median(lat),
+        "p95_ms": lat[min(len(lat) - 1, int(len(lat) * 0.95))],
+        "chunks_per_s": chunks / dt,
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Single-query latency and batch throughput per embedding backend.")
+    ap.add_argument("--backends", default="fake,local,gemini", help=f"Comma-separated subset of {sorted(BACKENDS)}.")
+    ap.add_argument("--model", default=None, help="Override the backend's default model.")
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("--chunks", type=int, default=500)
+    args = ap.parse_args()
+
+    print(f"{'backend':<8} {'model':<42} {'dim':>5} {'p50 ms':>8} {'p95 ms':>8} {'chunks/s':>10}")
+    for kind in args.backends.split(","):
+        try:
+            emb = make(kind, args.model)
+            r = bench(emb, args.queries, args.chunks)
+        except Exception as e:  # missing API key / sentence-transformers not installed
+            print(f"{kind:<8} skipped: {e}")
+            continue
+        print(f"{kind:<8} {emb.model:<42} {r['dim']:>5} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['chunks_per_s']:>10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+from __future__ import annotations
+import sys, time, argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from rag.embedder import Embedder, FakeEmbedBackend
+
+def run(n_chunks: int, batch_size: int, workers: int, latency_ms: float, dim: int) -> float:
+    backend = FakeEmbedBackend(dim=dim, latency_s=latency_ms / 1000.0, per_text_s=0.0002)
+    emb = Embedder(backend=backend, batch_size=batch_size, max_workers=workers, backoff_base=0.01)
+    texts = [f"policy chunk {i} " * 20 for i in range(n_chunks)]
+    t0 = time.perf_counter()
+    out = emb.embed_texts(texts)
+    dt = time.perf_counter() - t0
+    assert len(out) == n_chunks
+    return n_chunks / dt
+
+def main():
+    ap = argparse.ArgumentParser(description="Embedding throughput (chunks/sec) vs. batch size and concurrency, against a fake backend.")
+    ap.add_argument("--chunks", type=int, default=2000)
+    ap.add_argument("--latency-ms", type=float, default=80.0, help="Simulated round-trip per request.")
+    ap.add_argument("--dim", type=int, default=64)
+    ap.add_argument("--batch-sizes", default="1,10,50,100")
+    ap.add_argument("--workers", default="1,2,4,8")
+    args = ap.parse_args()
+
+    batch_sizes = [int(x) for x in args.batch_sizes.split(",")]
+    workers = [int(x) for x in args.workers.split(",")]
+
+    print(f"{args.chunks} chunks, {args.latency_ms:.0f} ms simulated latency per request\n")
+    print("batch \\ workers " + "".join(f"{w:>10}" for w in workers))
+    for b in batch_sizes:
+        n = args.chunks if b > 1 else min(args.chunks, 200)  # serial mode is slow; sample it
+        row = [run(n, b, w, args.latency_ms, args.dim) for w in workers]
+        print(f"{b:>15} " + "".join(f"{r:>10.0f}" for r in row))
+    print("\n(values are chunks/sec)")
+
+if __name__ == "__main__":
+    main()
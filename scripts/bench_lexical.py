@@ -0,0 +1,72 @@
+from __future__ import annotations
+import sys, os, time, argparse, tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+import numpy as np
+from rag.lexical_index import LexicalIndex
+
+CODES = ["E2102", "E2103", "A4238", "A4239", "K0553", "K0554", "95249", "95250", "95251", "0446T", "0447T", "0448T"]
+QUERY_WORDS = ["hba1c", "8.5", "insulin", "hypoglycemia", "coverage", "criteria", "documentation", "medical", "necessity"]
+
+def make_corpus(n: int, words_per_chunk: int, n_sources: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vocab = [f"w{i}" for i in range(20000)] + QUERY_WORDS + CODES
+    # Zipf-ish term frequencies, like real policy prose
+    p = 1.0 / np.arange(1, len(vocab) + 1)
+    p /= p.sum()
+    perm = rng.permutation(len(vocab))
+    draws = rng.choice(len(vocab), size=(n, words_per_chunk), p=p)
+    texts = [" ".join(vocab[perm[j]] for j in row) for row in draws]
+    ids = [f"policy_{i % n_sources}.pdf::p{i // n_sources}::c0" for i in range(n)]
+    metas = [{"source": f"policy_{i % n_sources}.pdf", "page": i // n_sources} for i in range(n)]
+    return ids, texts, metas
+
+def pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * q))]
+
+def main():
+    ap = argparse.ArgumentParser(description="BM25 lexical index: build time, size and per-query latency against a 1 ms budget.")
+    ap.add_argument("--chunks", type=int, default=30000)
+    ap.add_argument("--words", type=int, default=120, help="Tokens per chunk.")
+    ap.add_argument("--sources", type=int, default=200)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=20)
+    ap.add_argument("--budget-ms", type=float, default=1.0)
+    args = ap.parse_args()
+
+    ids, texts, metas = make_corpus(args.chunks, args.words, args.sources)
+    t0 = time.perf_counter()
+    idx = LexicalIndex.build(ids, texts, metas)
+    build_s = time.perf_counter() - t0
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "lexical_index.npz")
+        idx.save(path)
+        size_mb = os.path.getsize(path) / 1e6
+        t0 = time.perf_counter()
+        idx = LexicalIndex.load(path)
+        load_ms = (time.perf_counter() - t0) * 1000
+
+    rng = np.random.default_rng(1)
+    queries = [" ".join(rng.choice(QUERY_WORDS, 5).tolist() + rng.choice(CODES, 1).tolist() + [f"w{rng.integers(0, 2000)}"])
+               for _ in range(args.queries)]
+    where = {"source": {"$in": [f"policy_{i}.pdf" for i in range(0, args.sources, 20)]}}
+
+    print(f"{args.chunks} chunks x {args.words} tokens: built in {build_s:.1f}s, {size_mb:.1f} MB on disk, "
+          f"loaded in {load_ms:.0f} ms, {len(idx.term_ids)} terms, {len(idx.postings)} postings\n")
+    print(f"{'mode':<16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  budget")
+    for label, w in (("unfiltered", None), ("source filter", where)):
+        idx.search(queries[0], args.k, where=w)  # warm the where-mask cache
+        lat = []
+        for q in queries:
+            t0 = time.perf_counter()
+            idx.search(q, args.k, where=w)
+            lat.append((time.perf_counter() - t0) * 1000)
+        ok = "OK" if pct(lat, 0.95) <= args.budget_ms else "OVER"
+        print(f"{label:<16} {pct(lat, 0.5):>8.3f} {pct(lat, 0.95):>8.3f} {pct(lat, 0.99):>8.3f}  {ok} (p95 vs {args.budget_ms} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+from __future__ import annotations
+import sys, glob, time, argparse, tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+import fitz  # PyMuPDF
+from rag.policy_loader import iter_pdfs_parallel
+
+def make_synthetic_pdfs(out_dir: Path, n_files: int, pages: int) -> list:
+    para = ("Continuous glucose monitors are considered medically necessary when the member has "
+            "diabetes mellitus, HbA1c >= 8.5% or uses insulin, and performs SMBG at least 4 times daily. ") * 10
+    paths = []
+    for j in range(n_files):
+        doc = fitz.open()
+        for i in range(pages):
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(36, 36, 560, 800), f"Policy {j} page {i}. " + para, fontsize=8)
+        p = out_dir / f"synthetic_{j}.pdf"
+        doc.save(str(p))
+        doc.close()
+        paths.append(str(p))
+    return paths
+
+def main():
+    ap = argparse.ArgumentParser(description="PDF parsing throughput (pages/sec) vs. worker count.")
+    ap.add_argument("--pdf-dir", default=None, help="Benchmark real PDFs instead of synthetic ones.")
+    ap.add_argument("--files", type=int, default=8)
+    ap.add_argument("--pages", type=int, default=150)
+    ap.add_argument("--workers", default="1,2,4,8")
+    ap.add_argument("--pages-per-task", type=int, default=32)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.pdf_dir:
+            paths = sorted(glob.glob(str(ROOT / args.pdf_dir / "*.pdf")))
+        else:
+            print(f"Generating {args.files} synthetic PDFs × {args.pages} pages…")
+            paths = make_synthetic_pdfs(Path(tmp), args.files, args.pages)
+
+        print(f"\n{'workers':>8} {'pages':>8} {'seconds':>9} {'pages/s':>9}")
+        for w in (int(x) for x in args.workers.split(",")):
+            t0 = time.perf_counter()
+            n = sum(len(pages) for _, pages in iter_pdfs_parallel(paths, workers=w, pages_per_task=args.pages_per_task))
+            dt = time.perf_counter() - t0
+            print(f"{w:>8} {n:>8} {dt:>9.2f} {n / dt:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+from __future__ import annotations
+import sys, re, time, random, argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from rag.regex_extractor import RegexExtractor
+
+FILLER = [
+    "Patient reports good adherence to diet and exercise counseling.",
+    "Discussed hypoglycemia awareness and sick-day rules.",
+    "No acute distress. Lungs clear to auscultation bilaterally.",
+    "Follow up in three months or sooner if symptoms worsen.",
+    "Continues to monitor fingersticks four times daily with frequent lows overnight.",
+    "Retinal exam up to date; foot exam without ulceration.",
+]
+DIAGNOSES = ["E11.65", "E11.9", "E10.65", "I10", "E78.5", "G62.9", "N18.3", "Z79.4"]
+MEDS = ["Metformin ER 1000 mg PO BID", "Insulin glargine 20 units SC nightly", "Insulin lispro sliding scale with meals",
+        "Lisinopril 10 mg PO daily", "Atorvastatin 40 mg PO nightly", "Empagliflozin 10 mg PO daily"]
+
+def synthetic_note(rng: random.Random) -> str:
+    y, m, d = 2025, rng.randint(1, 12), rng.randint(1, 28)
+    lines = [f"Patient: Test Patient (MRN {rng.randint(10000, 99999)})",
+             f"DOB: 19{rng.randint(40, 99)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}   Sex: {rng.choice('FM')}",
+             f"Date of service: {y}-{m:02d}-{d:02d}", ""]
+    lines += [rng.choice(FILLER) for _ in range(rng.randint(2, 6))]
+    lines += ["", "Assessment:"]
+    for code in rng.sample(DIAGNOSES, rng.randint(0, 3)):
+        lines.append(f"Diagnosis on problem list (ICD-10 {code}).")
+    if rng.random() < 0.3:
+        lines.append("Type 2 diabetes, long-standing, on basal insulin.")
+    lines += [rng.choice(FILLER) for _ in range(rng.randint(2, 8))]
+    lines += ["", "Recent labs:"]
+    if rng.random() < 0.9:
+        lines.append(f"{rng.choice(['HbA1c', 'A1C', 'Hemoglobin A1c'])}: {rng.uniform(6, 11):.1f}% (collected {y}-{m:02d}-{d:02d})")
+    if rng.random() < 0.6:
+        lines.append(f"Fasting glucose: {rng.randint(90, 260)} mg/dL")
+    lines += ["", "Medications:"] + rng.sample(MEDS, rng.randint(1, 4))
+    lines += ["", "Vitals:", f"BP {rng.randint(100, 160)}/{rng.randint(60, 95)} mmHg, weight {rng.randint(50, 130)} kg, "
+              f"height {rng.randint(150, 195)} cm"]
+    lines += [rng.choice(FILLER) for _ in range(rng.randint(0, 10))]
+    return "\n".join(lines)
+
+def legacy_extract(note_text: str):
+    """The multi-pass extractor this replaced, kept here as the parity and speed baseline."""
+    m_id = re.search(r"\bMRN\s*([A-Za-z0-9\-]+)", note_text)
+    patient_id = m_id.group(1) if m_id else None
+    m_sex = re.search(r"\bSex:\s*([A-Za-z])", note_text, re.I)
+    sex = {"m": "male", "f": "female"}.get((m_sex.group(1).lower() if m_sex else ""), None)
+    diags = []
+    for m in re.finditer(r"\b([A-TV-Z][0-9][0-9AB](?:\.[0-9A-Za-z]{1,4})?)\b", note_text):
+        diags.append({"code_system": "ICD-10", "code": m.group(1), "description": None})
+    if not diags:
+        if re.search(r"type\s*2\s*diabetes", note_text, re.I):
+            diags.append({"code_system": None, "code": None, "description": "Type 2 diabetes mellitus"})
+    labs = []
+    m_a1c = re.search(r"(HbA1c|A1C|Hemoglobin A1c)[:\s]*([0-9]+(?:\.[0-9]+)?)\s*%?(?:.*?(\d{4}-\d{2}-\d{2}))?", note_text, re.I)
+    if m_a1c:
+        labs.append({"name": "HbA1c", "value": float(m_a1c.group(2)), "unit": "%", "collected_date": (m_a1c.group(3) or None)})
+    m_glu = re.search(r"(Fasting glucose)[:\s]*([0-9]+(?:\.[0-9]+)?)\s*(mg/dL)?(?:.*?(\d{4}-\d{2}-\d{2}))?", note_text, re.I)
+    if m_glu:
+        labs.append({"name": "Fasting glucose", "value": float(m_glu.group(2)), "unit": (m_glu.group(3) or "mg/dL"), "collected_date": (m_glu.group(4) or None)})
+    meds = []
+    for line in note_text.splitlines():
+        if re.search(r"\bmetformin\b", line, re.I) or re.search(r"\binsulin\b|\bglargine\b|\baspart\b|\blispro\b", line, re.I):
+            meds.append({"name": line.strip(), "dose": None, "route": None, "frequency": None, "start_date": None, "end_date": None, "status": "active"})
+    vitals = []
+    m_bp = re.search(r"\bBP\s*([0-9]{2,3})/([0-9]{2,3})", note_text)
+    if m_bp:
+        vitals.append({"name": "BP_systolic", "value": float(m_bp.group(1)), "unit": "mmHg"})
+        vitals.append({"name": "BP_diastolic", "value": float(m_bp.group(2)), "unit": "mmHg"})
+    m_wt = re.search(r"\bweight\s*([0-9]+(?:\.[0-9]+)?)\s*kg", note_text, re.I)
+    if m_wt:
+        vitals.append({"name": "Weight", "value": float(m_wt.group(1)), "unit": "kg"})
+    m_ht = re.search(r"\bheight\s*([0-9]+(?:\.[0-9]+)?)\s*cm", note_text, re.I)
+    if m_ht:
+        vitals.append({"name": "Height", "value": float(m_ht.group(1)), "unit": "cm"})
+    m_nd = re.search(r"Date of service:\s*(\d{4}-\d{2}-\d{2})", note_text)
+    return {"patient_id": patient_id, "age": None, "sex": sex, "diagnoses": diags, "labs": labs,
+            "meds": meds, "vitals": vitals, "note_date": m_nd.group(1) if m_nd else None}
+
+def run(fn, notes, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for n in notes:
+            fn(n)
+        best = min(best, time.perf_counter() - t0)
+    return len(notes) / best
+
+def main():
+    ap = argparse.ArgumentParser(description="Regex fallback extractor: notes/sec, single-pass vs the previous multi-pass version.")
+    ap.add_argument("--notes", type=int, default=5000)
+    ap.add_argument("--rounds", type=int, default=3, help="Timed passes over the corpus; the best is reported.")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    notes = [synthetic_note(rng) for _ in range(args.notes)]
+    notes.append((ROOT / "data" / "examples" / "note1.txt").read_text())
+    ex = RegexExtractor()
+
+    mismatches = sum(ex.extract(n) != legacy_extract(n) for n in notes)
+    avg_chars = sum(map(len, notes)) / len(notes)
+    print(f"{len(notes)} notes, avg {avg_chars:.0f} chars; output mismatches vs previous extractor: {mismatches}\n")
+    base = run(legacy_extract, notes, args.rounds)
+    new = run(ex.extract, notes, args.rounds)
+    print(f"{'extractor':<14} {'notes/sec':>10}")
+    print(f"{'multi-pass':<14} {base:>10.0f}")
+    print(f"{'single-pass':<14} {new:>10.0f}  ({new / base:.2f}x)")
+
+if __name__ == "__main__":
+    main()
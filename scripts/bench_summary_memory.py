@@ -0,0 +1,92 @@
+from __future__ import annotations
+import sys, gc, json, time, random, argparse, tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from app.compact import record_to_dict, to_record
+from app.eligibility import evaluate_eligibility
+from app.justification import build_justification_letter
+from app.schemas import PatientSummary
+from app.validators import validate_and_normalize
+from bench_validation import raw_summary
+
+HITS = [{"document": "Policy text " * 40, "metadata": {"source": "policy.pdf", "page": 3}}]
+
+def assess_dict(summary):
+    """Assess path on summary dicts (before)."""
+    s, errors = validate_and_normalize(summary)
+    meets, missing = evaluate_eligibility(s, "I-CGM")
+    letter = build_justification_letter(s, meets, missing, HITS)
+    return {"summary": s, "validation_errors": errors, "meets": meets, "missing": missing, "letter": letter}
+
+def assess_record(rec):
+    """Assess path on SummaryRecords, dict built for the output only (after)."""
+    s, errors = validate_and_normalize(rec)
+    meets, missing = evaluate_eligibility(s, "I-CGM")
+    letter = build_justification_letter(s, meets, missing, HITS)
+    return {"summary": record_to_dict(s), "validation_errors": errors, "meets": meets, "missing": missing, "letter": letter}
+
+def held_bytes(lines, load):
+    """Bytes allocated to keep every case of a batch in memory at once (as queued between stages)."""
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    held = [load(line) for line in lines]
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del held
+    return used
+
+def per_request(items, fn):
+    """(mean peak bytes allocated while assessing one case, µs per case)."""
+    gc.collect()
+    tracemalloc.start()
+    peaks = 0
+    for x in items:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        out = fn(x)
+        peaks += tracemalloc.get_traced_memory()[1] - base
+        del out
+    tracemalloc.stop()
+    t0 = time.perf_counter()
+    for x in items:
+        fn(x)
+    return peaks / len(items), (time.perf_counter() - t0) / len(items) * 1e6
+
+def main():
+    ap = argparse.ArgumentParser(description="Memory and per-request allocation of the assess path: summary dicts vs compact SummaryRecords.")
+    ap.add_argument("--cases", type=int, default=20000)
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    lines = [json.dumps({"case_id": str(i), "summary_json": PatientSummary.model_validate(raw_summary(rng)).model_dump()})
+             for i in range(args.cases)]
+
+    def load_dict(line):
+        return json.loads(line)
+
+    def load_record(line):
+        case = json.loads(line)
+        case["_summary"] = to_record(case.pop("summary_json"))
+        return case
+
+    dicts = [json.loads(line)["summary_json"] for line in lines]
+    records = [to_record(d) for d in dicts]
+    mismatches = sum(assess_dict(d) != assess_record(r) for d, r in zip(dicts, records))
+
+    hd, hr = held_bytes(lines, load_dict), held_bytes(lines, load_record)
+    pd, td = per_request(dicts, assess_dict)
+    pr, tr = per_request(records, assess_record)
+    n = len(lines)
+    print(f"{n} cases; output mismatches dict vs record path: {mismatches}\n")
+    print(f"{'':<34} {'dicts':>10} {'records':>10} {'saved':>7}")
+    print(f"{'held per queued case (bytes)':<34} {hd / n:>10.0f} {hr / n:>10.0f} {100 * (1 - hr / hd):>6.1f}%")
+    print(f"{'peak alloc per assessed case (B)':<34} {pd:>10.0f} {pr:>10.0f} {100 * (1 - pr / pd):>6.1f}%")
+    print(f"{'assess time per case (µs)':<34} {td:>10.1f} {tr:>10.1f} {100 * (1 - tr / td):>6.1f}%")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+from __future__ import annotations
+import sys, json, time, copy, random, argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from app.schemas import PatientSummary
+from app.validators import validate_and_normalize
+
+LAB_NAMES = ["HbA1c", "A1C", "hba1c", "Hemoglobin A1c", " HbA1c ", "LDL", "Fasting glucose", "eGFR"]
+UNITS = [None, "", "percent", "Percent", "%", "mg/dL", "mmol/mol"]
+
+def raw_summary(rng: random.Random) -> dict:
+    """Shaped like an LLM reply before schema validation."""
+    return {
+        "patient_id": f"P{rng.randint(1000, 9999)}", "age": rng.choice([None, rng.randint(18, 90)]),
+        "sex": rng.choice(["M", "f", "female", None]),
+        "diagnoses": [{"code_system": "ICD-10", "code": rng.choice(["E11.65", "E10.9", "I10"]), "description": "dx"}
+                      for _ in range(rng.randint(0, 3))],
+        "labs": [{"name": rng.choice(LAB_NAMES), "value": round(rng.uniform(2, 25), 1), "unit": rng.choice(UNITS),
+                  "collected_date": "2025-03-01"} for _ in range(rng.randint(0, 5))],
+        "meds": [{"name": rng.choice(["Insulin glargine", "Metformin"]), "dose": "10 mg", "route": None, "frequency": "daily",
+                  "start_date": None, "end_date": None, "status": rng.choice(["active", None])} for _ in range(rng.randint(0, 4))],
+        "vitals": [{"name": "weight", "value": 80.0, "unit": "kg", "measured_date": None}],
+        "note_date": "2025-03-01",
+    }
+
+# ---------- Legacy path (before the single-pass validator), kept for comparison ----------
+LEGACY_SAFE_RANGES = {"HbA1c": (3.0, 20.0), "A1C": (3.0, 20.0), "Hemoglobin A1c": (3.0, 20.0)}
+LEGACY_UNIT_NORMALIZE = {"hba1c": "%", "a1c": "%", "hemoglobin a1c": "%"}
+
+def legacy_normalize_units(summary):
+    out = dict(summary)
+    for lab in out.get("labs", []):
+        name = (lab.get("name") or "").strip()
+        unit = lab.get("unit")
+        low_name = name.lower()
+        if unit in (None, "", "percent", "Percent", "%"):
+            if low_name in LEGACY_UNIT_NORMALIZE:
+                lab["unit"] = "%"
+        if not lab.get("unit") and 0.0 < float(lab.get("value", 0)) <= 20.0:
+            if any(k.lower() == low_name for k in LEGACY_UNIT_NORMALIZE.keys()):
+                lab["unit"] = "%"
+    return out
+
+def legacy_validate_and_normalize(summary):
+    s2 = legacy_normalize_units(summary)
+    errors = [] if s2.get("diagnoses") else ["At least one diagnosis should be present."]
+    for lab in s2.get("labs", []):
+        name = (lab.get("name") or "").strip()
+        value = lab.get("value")
+        if value is not None and name in LEGACY_SAFE_RANGES:
+            lo, hi = LEGACY_SAFE_RANGES[name]
+            if not (lo <= float(value) <= hi):
+                errors.append(f"Lab '{name}' value {value} out of safe range [{lo}, {hi}].")
+    return s2, errors
+
+def before(raw):
+    data = json.loads(PatientSummary.model_validate(raw).model_dump_json())
+    return legacy_validate_and_normalize(data)
+
+def after(raw):
+    return validate_and_normalize(PatientSummary.model_validate(raw).model_dump())
+
+def typed(raw):
+    return validate_and_normalize(PatientSummary.model_validate(raw))
+
+def bench(fn, raws, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for r in raws:
+            fn(r)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(raws) * 1e6
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-summary cost of schema validation + normalization: JSON round-trip path vs single pass.")
+    ap.add_argument("--summaries", type=int, default=5000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    raws = [raw_summary(rng) for _ in range(args.summaries)]
+
+    mismatches = aliased = legacy_diffs = 0
+    for r in raws:
+        snapshot = copy.deepcopy(r)
+        old = before(copy.deepcopy(r))
+        new = after(r)
+        model, model_errors = typed(r)
+        mismatches += new != (model.model_dump(), model_errors)
+        legacy_diffs += old != new
+        aliased += r != snapshot
+    # The legacy path differs where the lab catalog converts units (mmol/mol A1c)
+    # or range-checks spellings the old exact-case table missed
+    print(f"{len(raws)} summaries: {mismatches} dict/typed mismatches, {aliased} inputs modified, "
+          f"{legacy_diffs} differ from legacy (lab catalog conversions)\n")
+
+    rows = [("model_validate → dump_json → loads → normalize (before)", bench(before, raws, args.repeat)),
+            ("model_validate → model_dump → single pass (after)", bench(after, raws, args.repeat)),
+            ("model_validate → single pass on the model (typed)", bench(typed, raws, args.repeat))]
+    base = rows[0][1]
+    for name, us in rows:
+        print(f"{name:<58} {us:>8.1f} µs/summary  ({base / us:.2f}x)")
+    sys.exit(1 if mismatches or aliased else 0)
+
+if __name__ == "__main__":
+    main()
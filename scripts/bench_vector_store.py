@@ -0,0 +1,117 @@
+from __future__ import annotations
+import sys, os, json, time, argparse, tempfile, subprocess, statistics
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+import numpy as np
+
+# Each backend is built and then queried in its own fresh process, so startup
+# time and resident memory are not polluted by the other backends.
+BACKENDS = {"chroma": ("chroma", None), "numpy": ("numpy", None), "numpy-int8": ("numpy", "int8")}
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def make_data(data_dir: str, n: int, dim: int, queries: int, k: int, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    # Clustered vectors (like chunks of the same policy) are harder for ANN than uniform noise
+    centers = rng.normal(size=(max(1, n // 200), dim))
+    X = (centers[rng.integers(0, len(centers), n)] + 0.6 * rng.normal(size=(n, dim))).astype(np.float32)
+    Q = (centers[rng.integers(0, len(centers), queries)] + 0.6 * rng.normal(size=(queries, dim))).astype(np.float32)
+    Xn = X / np.linalg.norm(X, axis=1, keepdims=True)
+    Qn = Q / np.linalg.norm(Q, axis=1, keepdims=True)
+    truth = np.argsort(-(Qn @ Xn.T), axis=1)[:, :k]
+    np.save(os.path.join(data_dir, "X.npy"), X)
+    np.save(os.path.join(data_dir, "Q.npy"), Q)
+    np.save(os.path.join(data_dir, "truth.npy"), truth)
+
+def child(mode: str, name: str, data_dir: str, k: int) -> dict:
+    backend, quant = BACKENDS[name]
+    os.environ["VECTOR_BACKEND"] = backend
+    if quant:
+        os.environ["VECTOR_QUANTIZE"] = quant
+    from rag.vector_store import get_client
+    store_dir = os.path.join(data_dir, name)
+    base_rss = rss_mb()
+    t0 = time.perf_counter()
+    col = get_client(store_dir).get_or_create_collection("policies", metadata={"hnsw:space": "cosine"})
+    n = col.count()
+    startup_s = time.perf_counter() - t0
+
+    if mode == "build":
+        X = np.load(os.path.join(data_dir, "X.npy"))
+        t0 = time.perf_counter()
+        for s in range(0, len(X), 1000):
+            ids = [f"c{i}" for i in range(s, min(len(X), s + 1000))]
+            col.upsert(ids=ids, embeddings=X[s:s + 1000].tolist(),
+                       documents=[f"policy chunk {i}" for i in range(s, s + len(ids))],
+                       metadatas=[{"source": f"policy_{i % 40}.pdf", "page": i % 300} for i in range(s, s + len(ids))])
+        return {"build_s": time.perf_counter() - t0}
+
+    Q = np.load(os.path.join(data_dir, "Q.npy"))
+    truth = np.load(os.path.join(data_dir, "truth.npy"))
+    lat, recall = [], []
+    for j, q in enumerate(Q):
+        t0 = time.perf_counter()
+        res = col.query(query_embeddings=[q.tolist()], n_results=k)
+        lat.append((time.perf_counter() - t0) * 1000)
+        got = {int(i[1:]) for i in res["ids"][0]}
+        recall.append(len(got & set(truth[j].tolist())) / k)
+    lat.sort()
+    return {
+        "rows": n,
+        "startup_ms": startup_s * 1000,
+        "p50_ms": statistics.median(lat),
+        "p95_ms": lat[min(len(lat) - 1, int(len(lat) * 0.95))],
+        "recall": float(np.mean(recall)),
+        "rss_mb": rss_mb() - base_rss,
+    }
+
+def run_child(mode: str, name: str, data_dir: str, k: int) -> dict:
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", mode, "--backend", name, "--data", data_dir, "--k", str(k)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    ap = argparse.ArgumentParser(description="Recall@k, query latency, startup time and RSS: Chroma vs NumPy vector store.")
+    ap.add_argument("--n", type=int, default=30000, help="Vectors in the synthetic corpus.")
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--backends", default=",".join(BACKENDS))
+    ap.add_argument("--child", choices=["build", "query"], help=argparse.SUPPRESS)
+    ap.add_argument("--backend", help=argparse.SUPPRESS)
+    ap.add_argument("--data", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    os.environ.setdefault("CHROMA_TELEMETRY_IMPLEMENTATION", "none")
+    os.environ.setdefault("CHROMA_ANONYMIZED_TELEMETRY", "False")
+    if args.child:
+        print(json.dumps(child(args.child, args.backend, args.data, args.k)))
+        return
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        make_data(data_dir, args.n, args.dim, args.queries, args.k)
+        print(f"{args.n} vectors x {args.dim} dims, {args.queries} queries, recall@{args.k} vs exact search\n")
+        print(f"{'backend':<11} {'build s':>8} {'startup ms':>11} {'p50 ms':>8} {'p95 ms':>8} {'recall':>7} {'RSS MB':>8}")
+        for name in args.backends.split(","):
+            b = run_child("build", name, data_dir, args.k)
+            r = run_child("query", name, data_dir, args.k)
+            print(f"{name:<11} {b['build_s']:>8.1f} {r['startup_ms']:>11.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+                  f"{r['recall']:>7.3f} {r['rss_mb']:>8.1f}")
+        print("\n(RSS MB = resident memory added by opening the store and serving the queries)")
+
+if __name__ == "__main__":
+    main()
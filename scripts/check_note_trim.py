@@ -0,0 +1,84 @@
+from __future__ import annotations
+import sys, os, random, argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+from dotenv import load_dotenv
+load_dotenv(ROOT / ".env")
+
+from rag.note_sections import trim_note
+from rag.regex_extractor import default_regex_extractor
+from bench_regex_extract import synthetic_note
+
+NARRATIVE = {
+    "History of Present Illness": [
+        "Patient is a pleasant adult with long-standing diabetes presenting for follow up.",
+        "Reports increasing difficulty recognizing low blood sugars, especially overnight.",
+        "Has been on insulin for several years with variable adherence to fingerstick checks.",
+        "Describes two episodes of confusion last month that resolved with juice.",
+        "Works night shifts, which makes meal timing irregular.",
+        "Glipizide was stopped last year after a fall; semaglutide weekly since March.",
+        "Has had type 1 diabetes since childhood.",
+    ],
+    "Social History": ["Lives with spouse. Former smoker, quit 10 years ago.", "Drinks alcohol socially, 1-2 drinks per week."],
+    "Family History": ["Mother with type 2 diabetes and hypertension.", "Father deceased, myocardial infarction at 64."],
+    "Review of Systems": ["Negative for chest pain, shortness of breath, fever.", "Positive for fatigue and occasional blurred vision."],
+    "Physical Exam": ["General: alert, oriented, no acute distress.", "Feet: monofilament sensation decreased bilaterally.",
+                      "Skin: no lipohypertrophy at injection sites."],
+}
+
+def long_note(rng: random.Random) -> str:
+    """A synthetic note with narrative sections spliced in before the assessment."""
+    base = synthetic_note(rng)
+    head, sep, tail = base.partition("\nAssessment:")
+    parts = [head]
+    for title, lines in NARRATIVE.items():
+        parts.append(f"\n{title}:")
+        parts.extend(rng.choice(lines) for _ in range(rng.randint(3, 12)))
+    return "\n".join(parts) + sep + tail
+
+def main():
+    ap = argparse.ArgumentParser(description="Check that trimming notes to relevant sections leaves extraction output unchanged, and report the input-token savings.")
+    ap.add_argument("--synthetic", type=int, default=200, help="Synthetic long notes checked besides data/examples.")
+    ap.add_argument("--budget", type=int, default=None, help="Token budget (default NOTE_TOKEN_BUDGET).")
+    ap.add_argument("--narrative", choices=["keep", "salvage"], default=None, help="Narrative handling (default NOTE_TRIM_NARRATIVE).")
+    ap.add_argument("--llm", action="store_true", help="Also compare the configured LLM's output on full vs trimmed sample notes.")
+    args = ap.parse_args()
+
+    samples = [(p.name, p.read_text()) for p in sorted((ROOT / "data" / "examples").glob("*.txt"))]
+    rng = random.Random(0)
+    synthetic = [(f"synthetic_{i}", long_note(rng)) for i in range(args.synthetic)]
+    ex = default_regex_extractor()
+
+    failures = 0
+    tin = tout = 0
+    for name, text in samples + synthetic:
+        t = trim_note(text, args.budget, args.narrative)
+        tin += t["tokens_in"]
+        tout += t["tokens_out"]
+        same = ex.extract(text) == ex.extract(t["text"])
+        failures += not same
+        if not name.startswith("synthetic_") or not same:
+            saved = 100.0 * (1 - t["tokens_out"] / t["tokens_in"]) if t["tokens_in"] else 0.0
+            print(f"{'OK  ' if same else 'DIFF'} {name:<24} {t['tokens_in']:>6} → {t['tokens_out']:>6} tokens "
+                  f"({saved:4.1f}% saved)  dropped: {', '.join(t['dropped']) or '-'}")
+
+    if args.llm:
+        import rag.clinical_extractor as ce
+        for name, text in samples:
+            os.environ["NOTE_TRIM"] = "0"
+            full = ce._llm_extract(text)
+            os.environ["NOTE_TRIM"] = "1"
+            trimmed = ce._llm_extract(text)
+            same = full == trimmed
+            failures += not same
+            print(f"{'OK  ' if same else 'DIFF'} {name:<24} LLM output full vs trimmed")
+
+    n = len(samples) + len(synthetic)
+    print(f"\n{n} notes: {tin} → {tout} estimated input tokens ({100.0 * (1 - tout / max(1, tin)):.1f}% saved), "
+          f"{failures} with changed extraction output")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
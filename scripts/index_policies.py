@@ -1,5 +1,5 @@
 from __future__ import annotations
-import sys, os, glob
+import sys, os, glob, time, argparse
 from pathlib import Path
 
 # --- Make project imports work no matter where you run this from ---
@@ -10,48 +10,174 @@ sys.path.append(str(ROOT))
 from dotenv import load_dotenv
 load_dotenv(ROOT / ".env")
 
-from rag.policy_loader import load_pdf_with_pages
-from rag.chunker import chunk_pages
-from rag.embedder import Embedder
-from rag.vector_store import get_client, get_or_create_collection, add_documents
+from rag.chunker import CHUNKERS
+from rag.ingest import ingest_pdfs
+from rag.pipeline import StageFailure
+from rag.embedder import get_embedder, configured_backend
+from rag.vector_store import get_client, get_or_create_collection, upsert_documents, delete_documents, bump_index_version, vector_backend
+from rag.index_manifest import manifest_path, load_manifest, save_manifest, diff_manifest, file_entry
+from rag.policy_loader import load_pdf_page_range
+from rag.lexical_index import build_lexical_index, lexical_index_path
+from rag.policy_metadata import load_policy_catalog, policy_metadata, chunk_metadata
 
-def index_directory(pdf_dir: str = "data/raw_policies"):
+MAX_TOKENS = 600
+OVERLAP = 100
+META_PAGES = 2  # pages read up front to infer payer / policy id / effective date / services
+
+def index_directory(pdf_dir: str = "data/raw_policies", *, dry_run: bool = False, force: bool = False,
+                    workers: int = 4, embed_workers: int = 2, batch_size: int = 256, chunker: str = "chars"):
     pdf_dir_path = ROOT / pdf_dir
     pdfs = sorted(glob.glob(str(pdf_dir_path / "*.pdf")))
-    if not pdfs:
-        print(f"⚠️  No PDFs found in {pdf_dir_path}. Add policy PDFs and rerun.")
-        return
 
     # Optional: silence Chroma telemetry noise
     os.environ.setdefault("CHROMA_TELEMETRY_IMPLEMENTATION", "none")
     os.environ.setdefault("CHROMA_ANONYMIZED_TELEMETRY", "False")
 
+    mpath = manifest_path()
+    manifest = load_manifest(mpath)
+    kind, model = configured_backend()
+    params = {"chunker": chunker, "max_tokens": MAX_TOKENS, "overlap": OVERLAP, "embed_model": f"{kind}:{model}",
+              "policy_meta": 1}
+    if vector_backend() != "chroma":
+        params["vector_backend"] = vector_backend()
+    diff = diff_manifest(manifest, pdfs, params)
+    # Editing a file's policies.json entry changes its chunks' metadata, so re-index it
+    catalog = load_policy_catalog(str(pdf_dir_path))
+    recatalogued = [s for s in diff["unchanged"]
+                    if manifest["files"][s].get("catalog") != catalog.get(os.path.basename(s))]
+    diff["changed"] += recatalogued
+    diff["unchanged"] = [s for s in diff["unchanged"] if s not in recatalogued]
+    if force:
+        diff["changed"] += diff["unchanged"]
+        diff["unchanged"] = []
+
+    print(f"🗂  {len(diff['new'])} new, {len(diff['changed'])} changed, "
+          f"{len(diff['unchanged'])} unchanged, {len(diff['deleted'])} deleted")
+    for label, sym in (("new", "+"), ("changed", "~"), ("deleted", "-")):
+        for src in diff[label]:
+            print(f"   {sym} {src}")
+    if dry_run:
+        return diff
+    if not pdfs and not diff["deleted"]:
+        print(f"⚠️  No PDFs found in {pdf_dir_path}. Add policy PDFs and rerun.")
+        return diff
+
     client = get_client()
-    col = get_or_create_collection(client, name="policies")
-    embedder = Embedder()  # uses GEMINI_API_KEY + text-embedding-004
+    embedder = get_embedder()
+    if force:
+        # A full rebuild may switch embedding model/dimension, which an existing collection cannot hold
+        try:
+            client.delete_collection("policies")
+        except Exception:
+            pass
+        bump_index_version()
+        for src in diff["changed"]:
+            manifest["files"].pop(src, None)
+    col = get_or_create_collection(client, name="policies", embedder=embedder)
+    files = manifest["files"]
 
-    total_chunks = 0
-    for path in pdfs:
-        print(f"📄 Processing: {path}")
-        pages = load_pdf_with_pages(path)
-        chunks = chunk_pages(pages, max_tokens=600, overlap=100)
+    # Drop chunks of removed documents
+    for src in diff["deleted"]:
+        delete_documents(col, files[src].get("chunk_ids", []))
+        del files[src]
+        save_manifest(mpath, manifest)
+        print(f"🗑  Removed: {src}")
 
-        if not chunks:
-            print("   ⚠️ No text extracted; skipping.")
-            continue
+    # Touched-but-identical files: refresh size/mtime so the next run skips hashing
+    for src in diff["unchanged"]:
+        st = os.stat(src)
+        files[src]["size"], files[src]["mtime_ns"] = st.st_size, st.st_mtime_ns
+    save_manifest(mpath, manifest)
 
-        ids = [c["id"] for c in chunks]
-        texts = [c["text"] for c in chunks]
-        metadatas = [c["metadata"] for c in chunks]
+    todo = diff["new"] + diff["changed"]
+    if not todo:
+        print("✅ Index is up to date.")
+        if diff["deleted"] or not os.path.exists(lexical_index_path()):
+            index_lexical(col)
+        return diff
+
+    doc_meta = {}
+    for path in todo:
+        first = load_pdf_page_range(path, 0, META_PAGES)
+        doc_meta[path] = policy_metadata("\n".join(p["text"] for p in first), catalog.get(os.path.basename(path)))
+
+    def chunk(pages):
+        extra = chunk_metadata(doc_meta[pages[0]["source"]]) if pages else None
+        return CHUNKERS[chunker](pages, max_tokens=MAX_TOKENS, overlap=OVERLAP, extra_metadata=extra)
+
+    def write(path, chunks, embs):
+        upsert_documents(col, [c["id"] for c in chunks], [c["text"] for c in chunks], [c["metadata"] for c in chunks], embs)
+
+    def finish(path, n_pages, ids):
+        # Chunks the new version no longer produces (e.g. the document got shorter)
+        stale = sorted(set(files.get(path, {}).get("chunk_ids", [])) - set(ids))
+        delete_documents(col, stale)
+        # Record after every file so an interrupted run resumes where it stopped
+        files[path] = {**file_entry(path, params, ids), "policy": doc_meta[path],
+                       "catalog": catalog.get(os.path.basename(path))}
+        save_manifest(mpath, manifest)
+        return path, n_pages, len(ids), len(stale)
+
+    print(f"📄 Processing {len(todo)} PDF(s) with {workers} parse worker(s)…")
+    t0 = time.perf_counter()
+    stats = {}
+    total_pages = total_chunks = 0
+    for res in ingest_pdfs(
+        todo,
+        chunk_fn=chunk,
+        embedder=embedder,
+        write_fn=write,
+        finish_fn=finish,
+        parse_workers=workers,
+        embed_workers=embed_workers,
+        batch_size=batch_size,
+        stats=stats,
+    ):
+        if isinstance(res, StageFailure):
+            src = res.item.get("path") if isinstance(res.item, dict) else "?"
+            print(f"   ❌ {src}: {res.stage} failed — {res.error}")
+            continue
+        path, n_pages, n_chunks, n_stale = res
+        total_pages += n_pages
+        total_chunks += n_chunks
+        if n_chunks:
+            meta = doc_meta[path]
+            tags = [str(meta[k]) for k in ("payer", "policy_id", "effective_date") if meta.get(k)] + meta.get("services", [])
+            print(f"   ✅ {path}: {n_chunks} chunks from {n_pages} pages" + (f", removed {n_stale} stale." if n_stale else ".")
+                  + (f" [{', '.join(tags)}]" if tags else ""))
+        else:
+            print(f"   ⚠️ {path}: no text extracted; skipping.")
 
-        print(f"   → {len(chunks)} chunks. Embedding…")
-        embs = embedder.embed_texts(texts)
+    dt = time.perf_counter() - t0
+    print(f"🎉 Done. Total chunks indexed: {total_chunks} ({total_pages / dt:.1f} pages/s)")
+    for name in ("parse", "embed", "write"):
+        if name in stats:
+            r = stats[name].as_dict(dt)
+            print(f"   {name:<6} items={r['items']:<5} busy={r['busy_s']:>8.2f}s errors={r['errors']}")
+    index_lexical(col)
+    return diff
 
-        add_documents(col, ids, texts, metadatas, embs)
-        total_chunks += len(chunks)
-        print(f"   ✅ Indexed {len(chunks)} chunks.")
+def index_lexical(col):
+    """Rebuild the BM25 index from the collection so it matches the vectors exactly."""
+    t0 = time.perf_counter()
+    idx = build_lexical_index(col)
+    size_mb = os.path.getsize(lexical_index_path()) / 1e6
+    print(f"🔤 Lexical index: {len(idx)} chunks, {len(idx.term_ids)} terms, {size_mb:.1f} MB in {time.perf_counter() - t0:.1f}s")
 
-    print(f"🎉 Done. Total chunks indexed: {total_chunks}")
+def main():
+    ap = argparse.ArgumentParser(description="Incrementally index policy PDFs into the vector store.")
+    ap.add_argument("--pdf-dir", default="data/raw_policies")
+    ap.add_argument("--dry-run", action="store_true", help="Only print what would be added, re-indexed or removed.")
+    ap.add_argument("--force", action="store_true", help="Rebuild the collection from scratch (also needed after switching EMBED_BACKEND/EMBED_MODEL).")
+    ap.add_argument("--workers", type=int, default=4, help="PDF parsing processes (1 = parse in-process).")
+    ap.add_argument("--embed-workers", type=int, default=2, help="Chunk batches embedded concurrently.")
+    ap.add_argument("--batch-size", type=int, default=256, help="Chunks per embed/upsert batch.")
+    ap.add_argument("--chunker", choices=sorted(CHUNKERS), default="chars",
+                    help="chars: fixed character windows; structured: heading/paragraph/sentence-aware, token-measured.")
+    args = ap.parse_args()
+    index_directory(args.pdf_dir, dry_run=args.dry_run, force=args.force,
+                    workers=args.workers, embed_workers=args.embed_workers, batch_size=args.batch_size,
+                    chunker=args.chunker)
 
 if __name__ == "__main__":
-    index_directory()
+    main()
@@ -10,8 +10,11 @@ from dotenv import load_dotenv
 load_dotenv(ROOT / ".env")
 
 # Local imports
-from rag.embedder import Embedder
-from rag.vector_store import get_client, get_or_create_collection
+from rag.embedder import get_embedder
+from rag.vector_store import get_client, get_or_create_collection, retrieve_many as retrieve_hits
+from rag.lexical_index import load_lexical_index
+from rag.retrieval_cache import default_retrieval_cache
+from rag.policy_metadata import NO_CANDIDATES, PolicyFilterIndex
 from rag.clinical_extractor import extract_patient_summary
 from app.validators import validate_and_normalize
 from app.justification import build_justification_letter
@@ -20,25 +23,32 @@ OUT_DIR = ROOT / "data" / "finetune"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 OUT_PATH = OUT_DIR / "pa_examples.jsonl"
 
-def retrieve(question: str, top_k: int = 3):
-    client = get_client()
-    col = get_or_create_collection(client, name="policies")
-    emb = Embedder()
-    q = emb.embed_texts([question])
-    res = col.query(query_embeddings=q, n_results=top_k)
-    chunks = []
-    for i in range(len(res["ids"][0])):
-        chunks.append({
-            "text": res["documents"][0][i],
-            "metadata": res["metadatas"][0][i],
-        })
-    return chunks
-
-def make_row(note_path: Path, service="I-CGM"):
+POLICY_QUESTION = "{service} coverage medical necessity criteria and documentation requirements"
+
+_resources = {}
+
+def retrieve_many(questions, top_k: int = 3, service=None):
+    """Passages per question, in order, from one batched hybrid (vector + BM25) retrieval, limited to `service`'s policies."""
+    if not _resources:
+        _resources["emb"] = get_embedder()
+        _resources["col"] = get_or_create_collection(get_client(), name="policies", embedder=_resources["emb"])
+        _resources["filters"] = PolicyFilterIndex()
+    where = _resources["filters"].where(service=service) if service else None
+    if where is NO_CANDIDATES:
+        return [[] for _ in questions]
+    results = retrieve_hits(_resources["col"], _resources["emb"], questions, top_k, where=where,
+                            cache=default_retrieval_cache(), lexical=load_lexical_index())
+    return [[{"text": h["document"], "metadata": h["metadata"]} for h in hits] for hits in results]
+
+def retrieve(question: str, top_k: int = 3, service=None):
+    return retrieve_many([question], top_k, service)[0]
+
+def make_row(note_path: Path, service="I-CGM", passages=None):
     note = note_path.read_text()
     summary_raw = extract_patient_summary(note)
     summary, _ = validate_and_normalize(summary_raw)
-    passages = retrieve("I-CGM coverage medical necessity criteria and documentation requirements", top_k=3)
+    if passages is None:
+        passages = retrieve(POLICY_QUESTION.format(service=service), top_k=3, service=service)
 
     # Bootstrap: use current template letter as target output
     letter = build_justification_letter(
@@ -62,9 +72,17 @@ def main():
         print(f"⚠️ No notes found in {notes_dir}. Add .txt notes and re-run.")
         return
 
+    # Retrieval for every note in one pass per service
+    services = ["I-CGM"] * len(txts)
+    passages = [None] * len(txts)
+    for svc in dict.fromkeys(services):
+        idx = [i for i, s in enumerate(services) if s == svc]
+        for i, ps in zip(idx, retrieve_many([POLICY_QUESTION.format(service=svc)] * len(idx), top_k=3, service=svc)):
+            passages[i] = ps
+
     with open(OUT_PATH, "w") as f:
-        for p in txts:
-            row = make_row(p)
+        for p, service, ps in zip(txts, services, passages):
+            row = make_row(p, service, ps)
             f.write(json.dumps(row) + "\n")
             print("added:", p.name)
 
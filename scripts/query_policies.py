@@ -11,12 +11,12 @@ from dotenv import load_dotenv
 load_dotenv(ROOT / ".env")
 
 from rag.vector_store import get_client, get_or_create_collection, query
-from rag.embedder import Embedder
+from rag.embedder import get_embedder
 
 def main():
     client = get_client()
-    col = get_or_create_collection(client, name="policies")
-    embedder = Embedder()  # Gemini text-embedding-004
+    embedder = get_embedder()  # EMBED_BACKEND: gemini (default) | local
+    col = get_or_create_collection(client, name="policies", embedder=embedder)
 
     try:
         question = input("Type a policy question (e.g., HbA1c threshold for CGM): ").strip()
@@ -0,0 +1,74 @@
+import threading, time
+
+from app.batch import BatchAssessor, iter_cases_from_jsonl
+from rag.llm_client import LLMUnavailableError
+from rag.pipeline import Stage, run_pipeline
+
+SUMMARY = {"diagnoses": [{"code": "E11.65"}], "labs": [{"name": "HbA1c", "value": 9.1, "unit": "%"}],
+           "meds": [{"name": "Insulin glargine", "status": "active"}]}
+
+def _runner(**kw):
+    return BatchAssessor(lambda q, k: [], extract=lambda note: SUMMARY, **kw)
+
+def test_malformed_jsonl_line_does_not_drop_later_cases(tmp_path):
+    path = tmp_path / "cases.jsonl"
+    path.write_text('{"case_id": "a", "note_text": "n1"}\n{not json\n[1, 2]\n{"case_id": "d", "note_text": "n4"}\n')
+    results = {r["case_id"]: r for r in _runner().run(iter_cases_from_jsonl(path))}
+    assert set(results) == {"a", "2", "3", "d"}
+    assert results["a"]["ok"] and results["d"]["ok"]
+    assert results["2"]["stage"] == "input" and "line 2" in results["2"]["error"]
+    assert results["3"]["stage"] == "input" and not results["3"]["ok"]
+
+def _pipeline_threads():
+    return [t for t in threading.enumerate() if t.name.startswith("pipeline-")]
+
+def test_closing_pipeline_early_releases_threads():
+    stages = [Stage("slow", lambda x: x, workers=2), Stage("next", lambda x: x, workers=2)]
+    results = run_pipeline(iter(range(10_000)), stages, queue_size=2)
+    assert next(results) is not None
+    results.close()
+    deadline = time.time() + 5
+    while _pipeline_threads() and time.time() < deadline:
+        time.sleep(0.05)
+    assert not _pipeline_threads()
+
+def test_pipeline_yields_everything_when_drained():
+    out = sorted(run_pipeline(range(500), [Stage("double", lambda x: 2 * x, workers=3)], queue_size=4))
+    assert out == [2 * i for i in range(500)]
+
+def test_packed_extraction_runs_off_the_feeder():
+    extracted = []
+    def extract_many(notes):
+        time.sleep(0.3)
+        return [SUMMARY for _ in notes]
+    def extract(note):
+        extracted.append(note)
+        return SUMMARY
+    runner = BatchAssessor(lambda q, k: [], extract=extract, extract_many=extract_many,
+                           prefetch_size=2, pack_windows=4)
+    cases = [{"case_id": str(i), "note_text": f"note {i}"} for i in range(8)]
+    t0 = time.perf_counter()
+    results = list(runner.run(cases))
+    # Four windows packed concurrently, not one after another on the feeder thread
+    assert time.perf_counter() - t0 < 0.9
+    assert len(results) == 8 and all(r["ok"] for r in results)
+    assert not extracted
+
+def test_unavailable_model_fails_packed_cases_without_per_note_retries():
+    extracted = []
+    def extract(note):
+        extracted.append(note)
+        return SUMMARY
+    def extract_many(notes):
+        if notes[0] == "note 0":
+            raise LLMUnavailableError("quota exhausted")
+        if notes[0] == "note 2":
+            return [LLMUnavailableError("circuit open"), ValueError("bad reply")]
+        return [SUMMARY]  # one result short: the second note is extracted on its own
+    runner = BatchAssessor(lambda q, k: [], extract=extract, extract_many=extract_many, prefetch_size=2)
+    results = {r["case_id"]: r for r in runner.run({"case_id": str(i), "note_text": f"note {i}"} for i in range(6))}
+    for cid in ("0", "1", "2"):
+        assert not results[cid]["ok"] and results[cid]["stage"] == "extract"
+        assert results[cid]["error"].startswith("LLMUnavailableError")
+    assert all(results[cid]["ok"] for cid in ("3", "4", "5"))
+    assert sorted(extracted) == ["note 3", "note 5"]
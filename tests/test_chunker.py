@@ -0,0 +1,27 @@
+import pytest
+
+from rag.chunker import count_tokens, split_spans
+
+CASES = [
+    "Header:\n" + "x" * 3000 + " " + "y " * 500,
+    "Run-on sentence " + ", ".join(f"clause {i} with words" for i in range(400)) + ".",
+    "TABLE\n" + "\n".join(f"E11.{i} | code {i} | covered  yes  note {i}" for i in range(200)),
+    "1. Coverage\n" + " ".join(f"Sentence {i} about continuous glucose monitors." for i in range(300)),
+]
+
+@pytest.mark.parametrize("text", CASES)
+@pytest.mark.parametrize("max_tokens,overlap", [(100, 20), (37, 5), (400, 50)])
+def test_spans_never_exceed_max_tokens(text, max_tokens, overlap):
+    spans = split_spans(text, max_tokens=max_tokens, overlap=overlap)
+    assert spans
+    assert all(count_tokens(text[s:e]) <= max_tokens for s, e in spans)
+
+def test_hard_split_covers_the_whole_unit():
+    text = "Run-on " + " ".join(f"w{i}" for i in range(1000))
+    spans = split_spans(text, max_tokens=50, overlap=10)
+    covered = set()
+    for s, e in spans:
+        covered.update(range(s, e))
+    assert all(i in covered for i, ch in enumerate(text) if not ch.isspace())
+    # consecutive windows overlap
+    assert all(b[0] < a[1] for a, b in zip(spans, spans[1:]))
@@ -0,0 +1,82 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+import rag.clinical_extractor as ce
+import rag.extraction_cache as ec
+from rag.llm_client import FakeLLMBackend, LLMClient
+
+NOTES = [
+    "Patient: 54-year-old male with type 2 diabetes (E11.65). HbA1c 9.2% on 2025-02-10. Insulin glargine 20 units nightly.",
+    "Patient: 61-year-old female with type 1 diabetes (E10.9). A1C 8.1 %. Insulin lispro with meals.",
+]
+
+EXAMPLES = sorted((Path(__file__).resolve().parents[1] / "data" / "examples").glob("*.txt"))
+
+def _use_backend(monkeypatch, tmp_path, backend):
+    monkeypatch.setenv("LLM_BACKEND", "fake")
+    monkeypatch.setenv("EXTRACT_CACHE", "1")
+    monkeypatch.setenv("EXTRACT_CACHE_PATH", str(tmp_path / "extractions.sqlite"))
+    monkeypatch.setattr(ec, "_default_cache", None)
+    monkeypatch.setattr(ce, "_client", LLMClient(backend, rpm=6000, max_retries=0))
+    return backend
+
+@pytest.fixture
+def fake_llm(monkeypatch, tmp_path):
+    """Extractor wired to a FakeLLMBackend and a fresh extraction cache in tmp_path."""
+    return _use_backend(monkeypatch, tmp_path, FakeLLMBackend())
+
+def _echo(prompt):
+    """A 'model' whose summary is the note text it was sent, so any trimmed line shows up as a change."""
+    return json.dumps({"diagnoses": [{"description": prompt.rsplit("CLINICAL NOTE:\n", 1)[-1].strip()}]})
+
+def test_packed_results_serve_single_extraction(fake_llm):
+    packed = ce.extract_patient_summaries(NOTES)
+    calls = fake_llm.calls
+    assert [ce.extract_patient_summary(n) for n in NOTES] == packed
+    assert fake_llm.calls == calls  # both answered from the packed results' cache entries
+
+def test_single_results_serve_packed_extraction(fake_llm):
+    single = [ce.extract_patient_summary(n) for n in NOTES]
+    calls = fake_llm.calls
+    assert ce.extract_patient_summaries(NOTES) == single
+    assert fake_llm.calls == calls
+
+NARRATIVE_NOTE = """Patient: John Roe (MRN 555)
+
+History of Present Illness:
+Has had type 1 diabetes since childhood.
+Glipizide was stopped after a fall; semaglutide weekly since March.
+
+Assessment:
+Type 1 diabetes mellitus (E10.9).
+"""
+
+@pytest.mark.parametrize("note", [p.read_text() for p in EXAMPLES] + [NARRATIVE_NOTE],
+                         ids=[p.name for p in EXAMPLES] + ["narrative"])
+def test_note_trim_leaves_extraction_unchanged(monkeypatch, tmp_path, note):
+    _use_backend(monkeypatch, tmp_path, FakeLLMBackend(respond=_echo))
+    monkeypatch.setenv("EXTRACT_CACHE", "0")
+    monkeypatch.setenv("NOTE_TRIM", "0")
+    full = ce.extract_patient_summary(note)
+    monkeypatch.setenv("NOTE_TRIM", "1")
+    assert ce.extract_patient_summary(note) == full
+
+def test_cache_hits_are_independent_copies(fake_llm):
+    first = ce.extract_patient_summary(NOTES[0])
+    first["labs"][0]["value"] = -1
+    first["meds"].clear()
+    again = ce.extract_patient_summary(NOTES[0])
+    assert again["labs"][0]["value"] == 9.2 and again["meds"]
+    assert fake_llm.calls == 1
+
+def test_merged_callers_get_their_own_copy(monkeypatch, tmp_path):
+    backend = _use_backend(monkeypatch, tmp_path, FakeLLMBackend(latency_s=0.2))
+    monkeypatch.setenv("EXTRACT_CACHE", "0")
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(ce.extract_patient_summary, [NOTES[0]] * 4))
+    assert backend.calls == 1
+    assert all(r == results[0] for r in results)
+    assert len({id(r) for r in results}) == 4 and len({id(r["labs"]) for r in results}) == 4
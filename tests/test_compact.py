@@ -0,0 +1,38 @@
+from app.compact import record_to_dict, record_to_model, to_record
+from app.justification import build_justification_letter
+from app.schemas import PatientSummary
+
+SUMMARY = {
+    "patient_id": "P-17", "age": 61, "sex": "female",
+    "diagnoses": [{"code_system": "ICD-10", "code": "E11.65", "description": "Type 2 diabetes"}],
+    "labs": [{"name": "HbA1c", "value": 9.2, "unit": "%", "collected_date": "2025-09-30", "flag": "H"}],
+    "meds": [{"name": "metformin", "dose": "1000 mg", "route": "PO", "frequency": "BID", "start_date": None,
+              "end_date": None, "status": "active"}],
+    "vitals": [{"name": "Weight", "value": 88.0, "unit": "kg", "measured_date": None}],
+    "note_date": "2025-10-01",
+    "encounter_id": "ENC-9",
+}
+
+def test_record_round_trip_keeps_fields_outside_the_schema():
+    rec = to_record(SUMMARY)
+    assert record_to_dict(rec) == SUMMARY
+    assert rec.get("encounter_id") == "ENC-9" and rec.labs[0].get("flag") == "H"
+    assert record_to_model(rec) == PatientSummary.model_validate(SUMMARY)
+    assert record_to_dict(to_record(PatientSummary.model_validate(SUMMARY))) == PatientSummary.model_validate(SUMMARY).model_dump()
+
+def test_record_get_treats_none_as_missing():
+    rec = to_record({"diagnoses": [{"code": "E11.9"}]})
+    assert rec.get("patient_id", "Patient") == "Patient" and rec.get("age") is None
+    assert rec.diagnoses[0].get("description", "") == "" and rec.get("missing", 1) == 1
+
+def test_letter_from_record_matches_letter_from_sparse_dict():
+    sparse = {"diagnoses": [{"code": "E11.65"}], "labs": [{"name": "HbA1c", "value": 9.0, "unit": "%"}]}
+    letter = build_justification_letter(to_record(sparse), True, [], [])
+    assert "Patient: Patient | Sex: unknown | Age: unknown" in letter
+    assert letter == build_justification_letter(sparse, True, [], [])
+
+def test_letter_reads_explicit_none_as_missing():
+    dumped = PatientSummary.model_validate({"diagnoses": [{"code": "E11.65"}]}).model_dump()
+    letter = build_justification_letter(dumped, False, ["HbA1c"], [])
+    assert "Patient: Patient | Sex: unknown | Age: unknown" in letter
+    assert letter == build_justification_letter(to_record(dumped), False, ["HbA1c"], [])
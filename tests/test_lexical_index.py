@@ -0,0 +1,34 @@
+import numpy as np
+
+from rag.lexical_index import LexicalIndex, build_lexical_index, lexical_index_path
+from rag.numpy_store import NumpyClient
+
+TEXTS = [f"Policy {i}: HbA1c above {7 + i % 3}.5% with insulin therapy, HCPCS E210{i % 4}." for i in range(23)]
+
+def test_paged_build_matches_one_shot(tmp_path):
+    col = NumpyClient(str(tmp_path)).get_or_create_collection("policies", metadata={"embed_dim": 4})
+    ids = [f"c{i}" for i in range(len(TEXTS))]
+    metas = [{"source": f"p{i % 3}.pdf", "page": i} for i in range(len(TEXTS))]
+    col.add(ids=ids, embeddings=np.random.default_rng(0).random((len(ids), 4)).tolist(), documents=TEXTS, metadatas=metas)
+
+    reads = []
+    get = col.get
+    def spy(**kw):
+        res = get(**kw)
+        reads.append(len(res["ids"]))
+        return res
+    col.get = spy
+
+    paged = build_lexical_index(col, str(tmp_path), page_size=5)
+    assert max(reads) <= 5 and sum(reads) == len(TEXTS)
+    whole = LexicalIndex.build(ids, TEXTS, metas)
+    assert paged.ids == whole.ids
+    for q in ["hba1c 8.5", "insulin e2103", "policy"]:
+        assert paged.search(q, 10) == whole.search(q, 10)
+        assert paged.search(q, 10, where={"source": "p1.pdf"}) == whole.search(q, 10, where={"source": "p1.pdf"})
+    assert LexicalIndex.load(lexical_index_path(str(tmp_path))).search("insulin", 5) == whole.search("insulin", 5)
+
+def test_empty_collection(tmp_path):
+    col = NumpyClient(str(tmp_path)).get_or_create_collection("policies", metadata={"embed_dim": 4})
+    idx = build_lexical_index(col, str(tmp_path), page_size=5)
+    assert len(idx) == 0 and idx.search("insulin") == []
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+from rag.llm_client import CircuitOpenError, FakeLLMBackend, LLMClient, LLMUnavailableError
+
+def client(backend, **kw):
+    opts = dict(rpm=6000, max_retries=1, backoff_base=0.0, breaker_threshold=2, breaker_cooldown_s=0.05)
+    opts.update(kw)
+    return LLMClient(backend, **opts)
+
+def test_breaker_opens_probes_and_closes():
+    llm = client(FakeLLMBackend(outage_s=0.3, respond=lambda p: "ok"))
+    with pytest.raises(LLMUnavailableError):
+        llm.generate("x")
+    assert llm.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        llm.generate("x")
+    time.sleep(0.06)
+    with pytest.raises(LLMUnavailableError):  # half-open probe fails during the outage: re-open
+        llm.generate("x")
+    assert llm.breaker.state == "open" and llm.breaker.opens == 2
+    time.sleep(0.3)
+    assert llm.generate("x") == "ok"
+    assert llm.breaker.state == "closed"
+
+def test_non_transient_probe_error_releases_half_open():
+    replies = iter([ValueError("bad request"), "ok"])
+    def respond(prompt):
+        r = next(replies)
+        if isinstance(r, Exception):
+            raise r
+        return r
+    llm = client(FakeLLMBackend(respond=respond))
+    llm.breaker.record_failure()
+    llm.breaker.record_failure()
+    time.sleep(0.06)
+    with pytest.raises(ValueError):
+        llm.generate("x")
+    assert llm.breaker.state == "half_open"
+    assert llm.generate("x") == "ok"  # next caller probes instead of being short-circuited forever
+    assert llm.breaker.state == "closed"
+
+def test_queue_timeout_raises_unavailable_and_releases_probe():
+    llm = client(FakeLLMBackend(respond=lambda p: "ok"), rpm=1, max_queue_wait_s=0.1)
+    assert llm.generate("x") == "ok"
+    llm.breaker.record_failure()
+    llm.breaker.record_failure()
+    time.sleep(0.06)
+    with pytest.raises(LLMUnavailableError, match="rate limit queue wait") as e:
+        llm.generate("x")
+    assert not isinstance(e.value, CircuitOpenError)
+    llm.requests.refund(1)
+    assert llm.generate("x") == "ok"
+    assert llm.breaker.state == "closed"
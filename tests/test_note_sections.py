@@ -0,0 +1,37 @@
+from rag.note_sections import trim_note
+
+NOTE = """Patient: John Roe (MRN 555)
+Sex: M
+
+History of Present Illness:
+Pleasant man presenting for follow up.
+Has had type 1 diabetes since childhood.
+Glipizide was stopped after a fall; semaglutide weekly since March.
+Works night shifts.
+
+Social History:
+Lives with spouse.
+
+Assessment:
+Type 1 diabetes mellitus (E10.9).
+
+Medications:
+Insulin lispro with meals (active)
+"""
+
+CLINICAL = ["type 1 diabetes since childhood", "Glipizide", "semaglutide"]
+
+def test_narrative_kept_whole_within_budget():
+    assert trim_note(NOTE)["text"] == NOTE.rstrip("\n")
+
+def test_salvage_keeps_clinical_narrative_lines():
+    t = trim_note(NOTE, narrative="salvage")
+    assert all(c in t["text"] for c in CLINICAL)
+    assert "night shifts" not in t["text"] and "Social History:" in t["dropped"]
+    assert t["tokens_out"] < t["tokens_in"]
+
+def test_over_budget_thins_narrative_before_sections():
+    t = trim_note(NOTE, token_budget=75)
+    assert all(c in t["text"] for c in CLINICAL)
+    assert "Lives with spouse" not in t["text"]
+    assert "Insulin lispro" in t["text"] and "E10.9" in t["text"]
@@ -0,0 +1,57 @@
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api.server as server
+from rag.policy_metadata import PolicyFilterIndex
+
+POLICIES = {
+    "lcd_2023.pdf": {"payer": "Medicare", "policy_id": "L33822", "effective_date": "2023-01-01", "services": ["CGM"]},
+    "lcd_2025.pdf": {"payer": "Medicare", "policy_id": "L33822", "effective_date": "2025-11-01", "services": ["CGM"]},
+    "acme.pdf": {"payer": "Acme Health", "services": ["I-CGM"]},
+}
+
+@pytest.fixture
+def index(monkeypatch):
+    idx = PolicyFilterIndex()
+    monkeypatch.setattr(idx, "refresh", lambda: None)
+    idx.policies = POLICIES
+    idx.by_service = {"CGM": {"lcd_2023.pdf", "lcd_2025.pdf"}, "I-CGM": {"acme.pdf"}}
+    idx.by_payer = {"medicare": {"lcd_2023.pdf", "lcd_2025.pdf"}, "acme health": {"acme.pdf"}}
+    return idx
+
+def test_effective_on_compares_dates_not_strings(index):
+    assert index.candidates(effective_on=date(2025, 10, 20)) == {"lcd_2023.pdf", "acme.pdf"}
+    # US-style dates are parsed, not compared lexically against ISO dates
+    assert index.candidates(effective_on="10/20/2025") == {"lcd_2023.pdf", "acme.pdf"}
+    with pytest.raises(ValueError):
+        index.candidates(effective_on="someday")
+
+def test_unknown_filters(index):
+    assert index.unknown_filters(service="CGM", payer="aetna") == []  # known, even if nothing is tagged with it
+    assert index.unknown_filters(payer="ACME health") == []  # payer from indexed policy metadata
+    errors = index.unknown_filters(service="XYZ", payer="Nobody")
+    assert len(errors) == 2 and "XYZ" in errors[0] and "Nobody" in errors[1]
+
+@pytest.fixture
+def client(monkeypatch, index):
+    class Resources:
+        policy_filters = index
+    def broken():
+        raise RuntimeError("no index in tests")
+    monkeypatch.setattr(server, "PolicyResources", broken)
+    server.app.dependency_overrides[server.get_resources] = lambda: Resources()
+    with TestClient(server.app) as c:
+        yield c
+    server.app.dependency_overrides.clear()
+
+def test_api_rejects_bad_filters(client):
+    r = client.post("/query-policies", json={"question": "q", "date_of_service": "10/20/2025"})
+    assert r.status_code == 422
+    r = client.post("/query-policies", json={"question": "q", "payer": "Nobody"})
+    assert r.status_code == 400 and "Nobody" in r.json()["detail"]
+    r = client.post("/assess", json={"summary_json": {"diagnoses": []}, "payer": "Nobody"})
+    assert r.status_code == 400
+    r = client.post("/assess/batch", json={"cases": [], "payer": "Nobody"})
+    assert r.status_code == 400
@@ -0,0 +1,29 @@
+import fitz
+import pytest
+
+from rag.policy_loader import iter_page_ranges
+
+def _pdf(path, pages):
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"{path.stem} page {i}")
+    doc.save(str(path))
+    return str(path)
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_corrupt_pdf_is_skipped_without_stopping_ingest(tmp_path, workers):
+    good_a = _pdf(tmp_path / "a.pdf", 5)
+    bad = tmp_path / "bad.pdf"
+    bad.write_bytes(b"%PDF-1.7 definitely not a pdf")
+    good_b = _pdf(tmp_path / "b.pdf", 3)
+
+    pages, finished = {}, []
+    for path, group in iter_page_ranges([good_a, str(bad), good_b], workers=workers, pages_per_task=2):
+        if group is None:
+            finished.append(path)
+        else:
+            pages.setdefault(path, []).extend(p["page"] for p in group)
+    assert sorted(finished) == sorted([good_a, good_b])
+    assert sorted(pages[good_a]) == list(range(5))
+    assert sorted(pages[good_b]) == list(range(3))
+    assert str(bad) not in pages
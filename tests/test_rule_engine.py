@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from app.compact import to_record
+from app.eligibility import evaluate_icgm
+from app.rule_engine import SMALL_KEYWORD_SET, KeywordMatcher, RuleEngine, load_rules
+from app.validators import validate_and_normalize
+
+WORDS = ["insulin", "insulin glargine", "glargine", "lispro", "aspart", "metformin", "met", "type 1 diabetes",
+         "diabetes", "diabetes mellitus", "hypoglycemia", "glycemia", "semaglutide", "tide"]
+
+@pytest.mark.parametrize("extra", [0, SMALL_KEYWORD_SET])  # `in` tests, then the regex alternation
+def test_keyword_matcher_matches_every_occurring_keyword(extra):
+    words = WORDS + [f"filler{i}" for i in range(extra)]
+    keywords = {w: 1 << i for i, w in enumerate(words)}
+    matcher = KeywordMatcher(keywords)
+    assert (matcher._re is not None) == (len(keywords) > SMALL_KEYWORD_SET)
+    rng = random.Random(0)
+    for _ in range(500):
+        text = " ".join(rng.choice(WORDS + ["mg", "daily", "x"]) for _ in range(rng.randint(0, 6)))
+        expected = 0
+        for w, b in keywords.items():
+            if w in text:
+                expected |= b
+        assert matcher.search(text) == expected, text
+
+PARITY_POLICY = {
+    "service": "TEST",
+    "lab_aliases": {"hba1c": ["a1c"]},
+    "definitions": {"dm": {"any": [{"dx_code_prefix": ["E10", "E11"]}, {"dx_text": ["type 2 diabetes"]}]},
+                    "insulin": {"med": ["insulin", "glargine"]}},
+    "criteria": [
+        {"id": "dx", "check": {"ref": "dm"}, "missing": "dx"},
+        {"id": "a1c", "when": {"lab_present": "hba1c"},
+         "check": {"any": [{"lab": {"name": "hba1c", "op": ">=", "value": 8.5}}, {"ref": "insulin"}]}, "missing": "a1c"},
+        {"id": "tried", "check": {"med": ["metformin"], "active": False}, "missing": "tried"},
+        {"id": "adult", "when": {"not": {"ref": "insulin"}}, "check": {"age": {"op": ">=", "value": 18}}, "missing": "adult"},
+        {"id": "ldl", "check": {"all": [{"lab_present": "ldl"}, {"not": {"lab": {"name": "ldl", "op": ">", "value": 190}}}]},
+         "missing": "ldl"},
+    ],
+}
+
+def _summary(rng):
+    return {
+        "age": rng.choice([None, 12, 45, "45", "17", "n/a", float("nan")]),
+        "diagnoses": [{"code": rng.choice(["E11.65", "E10.9", "I10", None]), "description": rng.choice([None, "Type 2 diabetes", "htn"])}
+                      for _ in range(rng.randint(0, 2))],
+        "labs": [{"name": rng.choice(["HbA1c", "A1C", "LDL", "Hgb A1c"]), "value": rng.choice([7.0, 9.1, 200, None, float("nan"), "8.6"])}
+                 for _ in range(rng.randint(0, 3))],
+        "meds": [{"name": rng.choice(["Insulin glargine", "Metformin 500 mg", "Lisinopril"]),
+                  "status": rng.choice(["active", "discontinued", "Current", None])} for _ in range(rng.randint(0, 3))],
+    }
+
+@pytest.mark.parametrize("as_record", [False, True])
+def test_evaluate_bulk_matches_evaluate_row_by_row(as_record):
+    engine = RuleEngine(load_rules() + [PARITY_POLICY])
+    rng = random.Random(0)
+    summaries = [_summary(rng) for _ in range(2000)]
+    if as_record:
+        summaries = [to_record(s) for s in summaries]
+    bulk = engine.evaluate_bulk(summaries)
+    for svc, (meets, missing) in bulk.items():
+        for i, s in enumerate(summaries):
+            assert engine.evaluate(s, svc) == (bool(meets[i]), engine.missing_items(svc, missing[i])), (svc, s)
+
+def test_evaluate_bulk_empty_and_string_age():
+    engine = RuleEngine([PARITY_POLICY])
+    meets, missing = engine.evaluate_bulk([])["TEST"]
+    assert meets.shape == (0,) and missing.shape == (0,)
+    s = {"age": "45", "diagnoses": [{"code": "E11.9"}], "labs": [{"name": "LDL", "value": 100}],
+         "meds": [{"name": "metformin", "status": "stopped"}]}
+    assert engine.evaluate(s, "TEST") == (True, [])
+    meets, missing = engine.evaluate_bulk([s])["TEST"]
+    assert meets.tolist() == [True] and missing.tolist() == [0]
+
+@pytest.mark.parametrize("name,value,unit", [("Hgb-A1c", 75, "mmol/mol"), ("HbA1c (%)", 9.0, "%"), ("A1c:", 9.0, None)])
+def test_validated_lab_synonyms_reach_the_rules(name, value, unit):
+    summary = {"patient_name": "Pat", "sex": "F", "age": 52,
+               "diagnoses": [{"code": "E11.65", "description": "Type 2 diabetes with hyperglycemia"}],
+               "labs": [{"name": name, "value": value, "unit": unit}],
+               "meds": [{"name": "Metformin 1000 mg", "status": "active"}]}
+    normalized, errors = validate_and_normalize(summary)
+    assert not errors
+    assert evaluate_icgm(normalized) == (True, [])
+    assert evaluate_icgm(to_record(normalized)) == (True, [])
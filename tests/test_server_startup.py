@@ -0,0 +1,15 @@
+from fastapi.testclient import TestClient
+
+import api.server as server
+
+def test_health_reports_degraded_when_resources_fail(monkeypatch):
+    def broken():
+        raise RuntimeError("GEMINI_API_KEY not set")
+    monkeypatch.setattr(server, "PolicyResources", broken)
+    with TestClient(server.app) as client:
+        health = client.get("/health")
+        assert health.status_code == 200
+        assert health.json()["status"] == "degraded"
+        assert "GEMINI_API_KEY" in health.json()["error"]
+        r = client.post("/assess", json={"summary_json": {"diagnoses": [{"code": "E11.9"}]}})
+        assert r.status_code == 503
@@ -0,0 +1,41 @@
+import pytest
+
+from app.compact import record_to_dict, to_record
+from app.lab_catalog import default_lab_catalog
+from app.validators import validate_and_normalize
+
+def _summary(*labs):
+    return {"diagnoses": [{"code": "E11.65"}], "labs": [dict(lab) for lab in labs]}
+
+@pytest.mark.parametrize("as_record", [False, True])
+@pytest.mark.parametrize("lab", [
+    {"name": "Fasting glucose", "value": "175 mg/dL", "unit": "mg/dL"},
+    {"name": "Potassium", "value": "high", "unit": "mEq/L"},
+    {"name": "HbA1c", "value": "n/a", "unit": "mmol/mol"},
+    {"name": "A1C", "value": "~9", "unit": None},
+])
+def test_non_numeric_lab_value_is_reported_not_raised(lab, as_record):
+    summary = to_record(_summary(lab)) if as_record else _summary(lab)
+    out, errors = validate_and_normalize(summary)
+    out_lab = (record_to_dict(out) if as_record else out)["labs"][0]
+    assert (out_lab["value"], out_lab["unit"]) == (lab["value"], lab["unit"])
+    assert errors == [f"Lab '{lab['name']}': non-numeric value {lab['value']!r}; not converted or range-checked."]
+
+@pytest.mark.parametrize("as_record", [False, True])
+def test_numeric_string_lab_value_is_converted(as_record):
+    summary = _summary({"name": "Glucose", "value": "10", "unit": "mmol/L"}, {"name": "Potassium", "value": "4.1", "unit": "mEq/L"})
+    out, errors = validate_and_normalize(to_record(summary) if as_record else summary)
+    labs = (record_to_dict(out) if as_record else out)["labs"]
+    assert not errors
+    assert (labs[0]["value"], labs[0]["unit"]) == (180.16, "mg/dL")
+    assert labs[1]["unit"] == "mmol/L"
+
+def test_meq_is_only_a_potassium_unit():
+    catalog = default_lab_catalog()
+    assert catalog.normalize("K", 4.0, "mEq/L") == (4.0, "mmol/L", catalog.spec("K"), True)
+    assert catalog.normalize("Glucose", 5.0, "mEq/L") == (5.0, "mEq/L", catalog.spec("Glucose"), False)
+
+def test_unitless_hba1c_outside_percent_range_keeps_no_unit():
+    out, errors = validate_and_normalize(_summary({"name": "HbA1c", "value": 53, "unit": None}, {"name": "HbA1c", "value": 9.1}))
+    assert [(lab["value"], lab.get("unit")) for lab in out["labs"]] == [(53, None), (9.1, "%")]
+    assert not errors